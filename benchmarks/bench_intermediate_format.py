@@ -0,0 +1,49 @@
+"""
+Compara los formatos intermedios de los rangos scrapeados: tamaño en disco, tiempo de escritura,
+tiempo de lectura completa y tiempo de lectura de la columna 'request_number'.
+
+Uso: python -m benchmarks.bench_intermediate_format --records 200000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from benchmarks.synthetic_data import generate_records
+from src.utils.constants import INTERMEDIATE_FORMATS
+from src.utils.intermediate_format import read_column, read_records, write_records
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def run(records, formats):
+    data = generate_records(records)
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for fmt in formats:
+            base_path = os.path.join(folder, f"bench_{fmt}")
+            try:
+                write_seconds, file_path = _timed(lambda: write_records(base_path, data, fmt=fmt))
+            except RuntimeError as e:
+                results.append({"format": fmt, "skipped": str(e)})
+                continue
+            read_seconds, read_back = _timed(lambda: read_records(file_path))
+            column_seconds, _ = _timed(lambda: read_column(file_path, "request_number"))
+            results.append({
+                "format": fmt,
+                "size_bytes": os.path.getsize(file_path),
+                "write_seconds": round(write_seconds, 4),
+                "read_seconds": round(read_seconds, 4),
+                "read_request_number_seconds": round(column_seconds, 4),
+                "records_read": len(read_back)
+            })
+    return {"records": records, "formats": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the intermediate range file formats.")
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--formats", nargs="+", default=list(INTERMEDIATE_FORMATS["extensions"]))
+    args = parser.parse_args()
+    print(json.dumps(run(args.records, args.formats), indent=2))
@@ -0,0 +1,58 @@
+"""
+Compara la normalización registro a registro (normalize_single_file) con el modo columnar
+(normalize_single_file_columns) y verifica que ambas producen exactamente la misma salida.
+
+Uso: python -m benchmarks.bench_normalizer --records 100000 --repeat 3
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from benchmarks.synthetic_data import generate_records
+from src.utils.data_normalizer import DataNormalizer
+from src.utils.intermediate_format import write_records
+
+def _columns_to_records(columns):
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+
+def _best_time(func, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(records, repeat):
+    logger = logging.getLogger("bench_normalizer")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = write_records(os.path.join(folder, "01_01_2019_07_01_2019_ACTIVE"), generate_records(records), fmt="json")
+
+        row_seconds, row_output = _best_time(lambda: DataNormalizer(folder, logger).normalize_single_file(file_path), repeat)
+        columnar_seconds, columnar_output = _best_time(lambda: DataNormalizer(folder, logger).normalize_single_file_columns(file_path), repeat)
+
+    row_output = [record.to_dict() for record in row_output]
+    columnar_records = _columns_to_records(columnar_output)
+    for row in row_output + columnar_records:
+        row.pop("updated_at")
+    identical = json.dumps(row_output, ensure_ascii=False) == json.dumps(columnar_records, ensure_ascii=False)
+    return {
+        "records": records,
+        "row_seconds": round(row_seconds, 4),
+        "columnar_seconds": round(columnar_seconds, 4),
+        "speedup": round(row_seconds / columnar_seconds, 2) if columnar_seconds else None,
+        "identical_output": identical
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of DataNormalizer row vs columnar modes.")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.records, args.repeat), indent=2))
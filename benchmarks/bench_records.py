@@ -0,0 +1,92 @@
+"""
+Memoria retenida por millón de registros en cada forma que toman a lo largo del pipeline, antes
+(dicts y columnas 'object' con un str por valor) y después (registros con __slots__, campos internados
+y columnas 'category'):
+- raw: filas del scraper / de los archivos de rangos (dict vs ScrapedRecord);
+- normalized: salida de normalize_single_file (dict de 13 claves vs TrademarkRecord);
+- frame: DataFrame del lote (columnas 'object' vs categóricas para las de poca cardinalidad).
+
+Uso: python -m benchmarks.bench_records --records 200000
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import tempfile
+import tracemalloc
+import pandas as pd
+from benchmarks.synthetic_data import generate_records
+from src.functions.etl_functions import _format_date_columns
+from src.utils.data_normalizer import DataNormalizer
+from src.utils.intermediate_format import read_records, write_records
+from src.utils.trademark_record import ScrapedRecord, encode_categoricals
+
+def _retained_mb(build):
+    """MB que siguen reservados tras construir (y conservar) el resultado de build()."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1024 / 1024
+
+def _frame(columns, categorical):
+    df = pd.DataFrame(columns).set_index("request_number")
+    _format_date_columns(df)
+    return encode_categoricals(df) if categorical else df
+
+def run(records):
+    logger = logging.getLogger("bench_records")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = write_records(os.path.join(folder, "01_01_2019_07_01_2019_ACTIVE"), generate_records(records), fmt="ndjson")
+        normalizer = DataNormalizer(folder, logger)
+
+        def legacy_normalized():
+            # Como antes: un dict por registro, con niza_class y gazette_number tal como salen del JSON.
+            raw = read_records(file_path)
+            return [{**record.to_dict(), "niza_class": entry.get("niza_class", ""), "gazette_number": entry.get("gazette_number", "")}
+                    for record, entry in zip(normalizer.normalize_single_file(file_path), raw)]
+
+        def legacy_frame():
+            raw = read_records(file_path)
+            columns = normalizer.normalize_single_file_columns(file_path)
+            columns["niza_class"] = [entry.get("niza_class", "") for entry in raw]
+            columns["gazette_number"] = [entry.get("gazette_number", "") for entry in raw]
+            return _frame(columns, categorical=False)
+
+        measurements = {
+            "raw": {
+                "dict": _retained_mb(lambda: read_records(file_path)),
+                "slotted": _retained_mb(lambda: [ScrapedRecord.from_dict(entry) for entry in read_records(file_path)])
+            },
+            "normalized": {
+                "dict": _retained_mb(legacy_normalized),
+                "slotted": _retained_mb(lambda: normalizer.normalize_single_file(file_path))
+            },
+            "frame": {
+                "object": _retained_mb(legacy_frame),
+                "categorical": _retained_mb(lambda: _frame(normalizer.normalize_single_file_columns(file_path), categorical=True))
+            }
+        }
+
+    scale = 1_000_000 / records
+    report = {"records": records}
+    for stage, variants in measurements.items():
+        (before_name, before), (after_name, after) = variants.items()
+        report[stage] = {
+            f"{before_name}_mb_per_million": round(before * scale, 1),
+            f"{after_name}_mb_per_million": round(after * scale, 1),
+            "reduction": round(1 - after / before, 3) if before else None
+        }
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory per million records: dicts/object columns vs slotted records/categoricals.")
+    parser.add_argument("--records", type=int, default=200000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.records), indent=2))
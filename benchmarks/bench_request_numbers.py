@@ -0,0 +1,81 @@
+"""
+Compara los conjuntos de 'request_number' como sets de strings frente a arrays int64 de RequestNumberCodec:
+memoria retenida, tiempo de codificación y la comparación JSON vs. BD (faltantes en la BD activos que no
+están en los JSON), con set difference frente a np.setdiff1d / búsqueda binaria sobre códigos ordenados.
+
+Uso: python -m benchmarks.bench_request_numbers --keys 1000000 --irregular-rate 0.01
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+import numpy as np
+from benchmarks.synthetic_data import request_number
+from src.utils.request_number_codec import RequestNumberCodec, isin_sorted, sorted_unique
+
+def _retained_mb(build):
+    """MB que siguen reservados tras construir (y conservar) el resultado de build()."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1024 / 1024
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def _keys(count, irregular_rate, seed):
+    rng = random.Random(seed)
+    # Strings nuevos en cada llamada, como los que salen de leer un archivo o de la BD.
+    return [f"{index:09d}-IRREGULAR" if rng.random() < irregular_rate else "".join(request_number(index, rng)) for index in range(count)]
+
+def run(keys, irregular_rate, db_overlap):
+    json_keys = _keys(keys, irregular_rate, seed=1)
+    # La BD tiene una parte de los mismos registros más otros que faltan en los JSON.
+    db_keys = sorted(json_keys[:int(keys * db_overlap)] + _keys(keys // 10, irregular_rate, seed=2)[: keys // 10])
+    db_keys = [key.replace("-IRREGULAR", "-DB") if i % 2 else key for i, key in enumerate(db_keys)]
+
+    # Memoria: el set conserva los strings; del array de códigos solo quedan los irregulares en la tabla de respaldo.
+    set_mb = _retained_mb(lambda: set(_keys(keys, irregular_rate, seed=1)))
+    codes_mb = _retained_mb(lambda: sorted_unique(RequestNumberCodec().encode_many(_keys(keys, irregular_rate, seed=1))))
+
+    codec = RequestNumberCodec()
+    set_seconds, json_set = _timed(lambda: set(json_keys))
+    codes_seconds, json_codes = _timed(lambda: sorted_unique(codec.encode_many(json_keys)))
+
+    set_compare_seconds, missing_set = _timed(lambda: [key for key in db_keys if key not in json_set])
+    codes_compare_seconds, missing_mask = _timed(lambda: ~isin_sorted(json_codes, codec.encode_many(db_keys, extend=False)))
+    missing_codes = [key for key, missing in zip(db_keys, missing_mask) if missing]
+    setdiff_seconds, setdiff_codes = _timed(lambda: np.setdiff1d(sorted_unique(codec.encode_many(db_keys, extend=False)), json_codes, assume_unique=True))
+
+    return {
+        "keys": keys,
+        "irregular_keys": codec.fallback_size,
+        "build": {
+            "set_seconds": round(set_seconds, 4), "set_mb": round(set_mb, 1),
+            "codes_seconds": round(codes_seconds, 4), "codes_mb": round(codes_mb, 1)
+        },
+        "compare": {
+            "db_keys": len(db_keys),
+            "set_seconds": round(set_compare_seconds, 4),
+            "isin_sorted_seconds": round(codes_compare_seconds, 4),
+            "setdiff1d_seconds": round(setdiff_seconds, 4),
+            "missing": len(missing_set),
+            "identical_result": missing_set == missing_codes and len(setdiff_codes) <= len(missing_set)
+        }
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of request_number sets of strings vs int64 codec arrays.")
+    parser.add_argument("--keys", type=int, default=1000000)
+    parser.add_argument("--irregular-rate", type=float, default=0.01)
+    parser.add_argument("--db-overlap", type=float, default=0.9)
+    args = parser.parse_args()
+    print(json.dumps(run(args.keys, args.irregular_rate, args.db_overlap), indent=2))
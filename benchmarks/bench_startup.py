@@ -0,0 +1,69 @@
+"""
+Mide el arranque de los workers de scraping con cada método de inicio de multiprocessing:
+tiempo hasta que el worker está listo para ejecutar _scrape_worker_N, tiempo de importación dentro
+del worker, memoria (RSS y privada) y qué módulos pesados acaba cargando.
+
+El proceso padre importa lo mismo que el handler real antes de lanzar los workers.
+
+Uso: python -m benchmarks.bench_startup --workers 2 --methods fork spawn forkserver
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from src.utils.process_context import WORKER_START_METHODS, get_worker_context
+
+HEAVY_MODULES = ("pandas", "numpy", "boto3", "psycopg2", "rollbar", "requests", "pyarrow", "playwright")
+
+def _memory_mb():
+    """RSS y memoria privada (no compartida con el padre) del proceso actual, en MB (solo Linux)."""
+    memory = {}
+    for path, fields in (("/proc/self/status", ("VmRSS",)), ("/proc/self/smaps_rollup", ("Private_Clean", "Private_Dirty"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    if name in fields:
+                        memory[name] = int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return {
+        "rss_mb": round(memory["VmRSS"], 1) if "VmRSS" in memory else None,
+        "private_mb": round(memory.get("Private_Clean", 0) + memory.get("Private_Dirty", 0), 1) if "Private_Dirty" in memory else None
+    }
+
+def _worker_probe(started_at, results):
+    import_start = time.perf_counter()
+    from src.functions.sync_orchestrator import _scrape_worker_1  # lo que necesita el worker real
+    import_seconds = time.perf_counter() - import_start
+    results.put({
+        "ready_seconds": round(time.time() - started_at, 4),
+        "import_seconds": round(import_seconds, 4),
+        **_memory_mb(),
+        "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules]
+    })
+
+def run(workers, methods):
+    import src.services.sync_colombia_trademarks.main  # noqa: F401  mismo grafo que el proceso principal real
+    report = {"parent": {**_memory_mb(), "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules]}}
+    for method in methods:
+        os.environ["WORKER_START_METHOD"] = method
+        context = get_worker_context()
+        results = context.Queue()
+        start = time.perf_counter()
+        processes = [context.Process(target=_worker_probe, args=(time.time(), results), name=f"Probe-{i + 1}") for i in range(workers)]
+        for process in processes:
+            process.start()
+        samples = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        report[method] = {"wall_seconds": round(time.perf_counter() - start, 4), "workers": samples}
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of scraping worker startup time and memory per start method.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--methods", nargs="+", choices=WORKER_START_METHODS, default=list(WORKER_START_METHODS))
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.methods), indent=2))
@@ -0,0 +1,93 @@
+"""
+Levanta un PostgreSQL local y desechable para los benchmarks de escritura.
+Si BENCH_PG_DSN está definido se usa esa base en su lugar (p. ej. un contenedor ya iniciado).
+"""
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    "id" text PRIMARY KEY,
+    "request_number" text NOT NULL UNIQUE,
+    "registry_number" text,
+    "denomination" text,
+    "logo_url" text,
+    "logo" text,
+    "filing_date" date,
+    "expiration_date" date,
+    "status" text,
+    "holder" text,
+    "niza_class" text,
+    "gazette_number" text,
+    "updated_at" timestamp,
+    "badger_country" text
+);
+"""
+
+def _find_binary(name):
+    found = shutil.which(name)
+    if found:
+        return found
+    candidates = sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}"), reverse=True)
+    return candidates[0] if candidates else None
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _params_from_dsn(dsn):
+    import psycopg2.extensions
+    params = psycopg2.extensions.parse_dsn(dsn)
+    params["database"] = params.pop("dbname", None)
+    return params
+
+class LocalPostgres:
+    """Context manager de un PostgreSQL temporal con la tabla de benchmarks creada; lanza RuntimeError si no hay binarios."""
+    def __init__(self, table_name="bench_trademarks"):
+        self.table_name = table_name
+        self.data_dir = None
+        self.pg_ctl = None
+
+    def __enter__(self):
+        dsn = os.getenv("BENCH_PG_DSN")
+        if dsn:
+            params = _params_from_dsn(dsn)
+        else:
+            initdb, self.pg_ctl = _find_binary("initdb"), _find_binary("pg_ctl")
+            if not initdb or not self.pg_ctl:
+                raise RuntimeError("PostgreSQL binaries (initdb, pg_ctl) not found and BENCH_PG_DSN is not set.")
+            self.data_dir = tempfile.mkdtemp(prefix="bench_pg_")
+            port = _free_port()
+            subprocess.run([initdb, "-D", self.data_dir, "-U", "bench", "--auth=trust"], check=True, capture_output=True)
+            subprocess.run(
+                [self.pg_ctl, "-D", self.data_dir, "-o", f"-p {port} -k {self.data_dir} -c fsync=off", "-l", os.path.join(self.data_dir, "server.log"), "-w", "start"],
+                check=True, capture_output=True
+            )
+            params = {"user": "bench", "password": "bench", "host": "127.0.0.1", "port": str(port), "database": "postgres"}
+        self.db_params = params
+        self.reset_table()
+        return self
+
+    def reset_table(self):
+        """Vuelve a crear la tabla de benchmarks vacía."""
+        import psycopg2
+        conn = psycopg2.connect(**self.db_params)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {self.table_name};")
+                cur.execute(TABLE_DDL.format(table=self.table_name))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.data_dir:
+            subprocess.run([self.pg_ctl, "-D", self.data_dir, "-m", "immediate", "stop"], capture_output=True)
+            time.sleep(0.2)
+            shutil.rmtree(self.data_dir, ignore_errors=True)
@@ -0,0 +1,183 @@
+"""
+Suite de benchmarks del ETL sobre datos sintéticos con la forma de SIPI.
+
+Mide, para cada tamaño de corpus: la normalización (registro a registro y columnar), el paso de
+comparación (diff_batch) y, si hay un PostgreSQL disponible, las rutas de escritura de DatabaseManager.
+Los resultados se escriben en JSON para comparar regresiones entre commits.
+
+Uso: python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000 --output bench_results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from benchmarks.local_postgres import LocalPostgres
+from benchmarks.synthetic_data import db_frame_from_batch, write_corpus
+from src.functions.etl_functions import BatchWriter, _format_date_columns, build_batch_frame, diff_batch
+from src.gateways.database_gateway import DatabaseManager
+from src.utils.batch_assembler import BatchAssembler
+from src.utils.data_normalizer import DataNormalizer
+from src.utils.dedup_index import RequestNumberIndex, sort_files_by_precedence
+
+def _silent_logger():
+    logger = logging.getLogger("benchmarks")
+    logger.handlers = [logging.NullHandler()]
+    logger.propagate = False
+    return logger
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _stage(seconds, rows):
+    return {"seconds": round(seconds, 4), "rows": rows, "rows_per_second": round(rows / seconds) if seconds else None}
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def bench_normalize(file_paths, folder, logger):
+    results = {}
+    for mode in ("row", "columnar"):
+        normalizer = DataNormalizer(folder, logger)
+        normalize = normalizer.normalize_single_file_columns if mode == "columnar" else normalizer.normalize_single_file
+        seconds, outputs = _timed(lambda: [normalize(path) for path in file_paths])
+        rows = sum(len(out["request_number"]) if mode == "columnar" else len(out) for out in outputs if out)
+        results[mode] = _stage(seconds, rows)
+    return results
+
+def build_batches(file_paths, folder, batch_size, logger):
+    normalizer = DataNormalizer(folder, logger)
+    frames = ((path, build_batch_frame(path, normalizer, columnar=True)) for path in file_paths)
+    index = RequestNumberIndex()
+    batches = [index.filter_new(df) for df, _ in BatchAssembler(batch_size).iter_batches((p, df) for p, df in frames if df is not None)]
+    return [df for df in batches if not df.empty], index.duplicates_dropped
+
+def bench_diff(batches, change_rate):
+    db_frames = []
+    for i, df_new in enumerate(batches):
+        df_db = db_frame_from_batch(df_new, change_rate=change_rate, seed=i)
+        _format_date_columns(df_db)
+        db_frames.append(df_db)
+    seconds, outputs = _timed(lambda: [diff_batch(df_new, df_db) for df_new, df_db in zip(batches, db_frames)])
+    return {
+        **_stage(seconds, sum(len(df) for df in batches)),
+        "inserts": sum(len(out[1]) for out in outputs),
+        "updates": sum(len(out[2]) for out in outputs)
+    }
+
+def bench_db(batches, change_rate, db_writers, logger):
+    results = {}
+    with LocalPostgres() as postgres:
+        db_manager = DatabaseManager(postgres.db_params, postgres.table_name, logger)
+
+        def insert_all():
+            for df_new in batches:
+                df = df_new.reset_index().drop(columns=["source_file"])
+                df.insert(0, "id", df["request_number"])
+                db_manager.insert_records(df)
+        rows = sum(len(df) for df in batches)
+        seconds, _ = _timed(insert_all)
+        results["insert_records"] = _stage(seconds, rows)
+
+        # Mezcla completa sobre una tabla con parte de los registros ya cargados, en cada modo de escritura
+        # ('diff': consulta + diff + INSERT/UPDATE; 'upsert': INSERT ... ON CONFLICT DO UPDATE) y con cada
+        # grado de paralelismo de escritores.
+        def load_existing():
+            postgres.reset_table()
+            for i, df_new in enumerate(batches):
+                df_db = db_frame_from_batch(df_new, change_rate=change_rate, seed=i).reset_index()
+                df_db.insert(0, "id", df_db["request_number"])
+                for col in ("filing_date", "expiration_date"):
+                    df_db.loc[df_db[col].isna() | (df_db[col] == ""), col] = None
+                db_manager.insert_records(df_db)
+
+        def write_all(write_mode, writers=1, pipeline_depth=0):
+            with BatchWriter(db_manager, logger, write_mode, writers=writers, pipeline_depth=pipeline_depth) as writer:
+                seconds, outputs = _timed(lambda: [out for _, out in writer.iter_process(enumerate(batches))])
+            return {**_stage(seconds, rows), "inserts": sum(out[1] for out in outputs), "updates": sum(out[2] for out in outputs)}
+
+        results["batch_writer"] = {}
+        results["batch_writer_pipelined"] = {}
+        for write_mode in ("diff", "upsert"):
+            for writers in db_writers:
+                load_existing()
+                results["batch_writer"].setdefault(write_mode, {})[str(writers)] = write_all(write_mode, writers)
+            # Con la consulta del lote siguiente y la escritura de los anteriores solapadas con la comparación.
+            for pipeline_depth in (1, 2):
+                load_existing()
+                results["batch_writer_pipelined"].setdefault(write_mode, {})[str(pipeline_depth)] = write_all(write_mode, pipeline_depth=pipeline_depth)
+
+        # Lectura de la tabla completa: materializada vs. por bloques con cursor del lado del servidor.
+        full_table_readers = {
+            "fetch_all_records": lambda: len(db_manager.fetch_all_records()),
+            "iter_records": lambda: sum(len(chunk) for chunk in db_manager.iter_records()),
+            "iter_active_request_numbers": lambda: sum(len(chunk) for chunk in db_manager.iter_active_request_numbers())
+        }
+        for name, read in full_table_readers.items():
+            tracemalloc.start()
+            seconds, read_rows = _timed(read)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[name] = {**_stage(seconds, read_rows), "peak_mb": round(peak / 1024 / 1024, 2)}
+    return results
+
+def run(sizes, batch_size, duplicate_rate, change_rate, records_per_file, skip_db, db_writers=(1,)):
+    logger = _silent_logger()
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "settings": {"batch_size": batch_size, "duplicate_rate": duplicate_rate, "change_rate": change_rate, "records_per_file": records_per_file, "db_writers": list(db_writers)},
+        "results": []
+    }
+    for size in sizes:
+        folder = tempfile.mkdtemp(prefix="bench_corpus_")
+        try:
+            generation_seconds, file_paths = _timed(lambda: write_corpus(folder, size, records_per_file=records_per_file, duplicate_rate=duplicate_rate))
+            file_paths = sort_files_by_precedence(file_paths)
+            result = {"records": size, "files": len(file_paths), "generation_seconds": round(generation_seconds, 4)}
+            result["normalize"] = bench_normalize(file_paths, folder, logger)
+            batches, duplicates = build_batches(file_paths, folder, batch_size, logger)
+            result["duplicates_dropped"] = duplicates
+            result["diff"] = bench_diff(batches, change_rate)
+            if skip_db:
+                result["db"] = {"skipped": "--skip-db"}
+            else:
+                try:
+                    result["db"] = bench_db(batches, change_rate, db_writers, logger)
+                except RuntimeError as e:
+                    result["db"] = {"skipped": str(e)}
+            report["results"].append(result)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ETL benchmark suite over synthetic SIPI data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    parser.add_argument("--change-rate", type=float, default=0.05)
+    parser.add_argument("--records-per-file", type=int, default=2000)
+    parser.add_argument("--skip-db", action="store_true")
+    parser.add_argument("--db-writers", type=int, nargs="+", default=[1, 2, 4], help="Degrees of parallelism measured for the DB write stage.")
+    parser.add_argument("--output", type=str, default=None, help="JSON output path (default: benchmarks/results/<commit>.json).")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.batch_size, args.duplicate_rate, args.change_rate, args.records_per_file, args.skip_db, args.db_writers)
+    output = args.output or os.path.join("benchmarks", "results", f"{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,148 @@
+"""
+Simula en una sola máquina una ejecución repartida en N nodos: cada nodo es un proceso local con su propio
+directorio de trabajo (su tmp/, logs y métricas) que ejecuta run_shard_process con un scraper sintético,
+y todos comparten una carpeta local como SHARD_DEST. El proceso principal hace de paso de merge: espera a
+las N marcas de finalización y reúne los archivos de rangos (o, con --etl, ejecuta run_merge_process, que
+necesita las variables PG_* de una BD de pruebas, p. ej. la de benchmarks/local_postgres.py).
+
+El scraper sintético tarda estimate_task_cost(tarea) * --seconds-per-page (con un ruido de +-jitter) y escribe
+un archivo de rango por tarea. Se comprueba que el merge cubre cada tarea del plan exactamente una vez y
+se informa del coste estimado y del tiempo real de cada nodo. Con --stale-markers, SHARD_DEST empieza con las
+marcas de un plan anterior: el merge debe ignorarlas y esperar a que cada nodo las sobrescriba.
+
+Uso: python -m benchmarks.simulate_shards --shards 4 --status both --seconds-per-page 0.002
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from src.functions.scraping_functions import DOWNLOADS_PATH, build_scraping_plan
+from src.utils.intermediate_format import find_range_file, list_range_files, write_records
+from src.utils.process_context import get_worker_context
+from src.utils.sharding import MARKERS_FOLDER, SharedLocation, assign_shards, collect_shards, estimate_task_cost, marker_name, plan_fingerprint
+from benchmarks.synthetic_data import generate_records
+
+def synthetic_task_runner(tasks, worker_name, log_queue=None):
+    """Sustituye a _scrape_tasks_worker: mismo contrato (omite lo ya scrapeado), sin navegador."""
+    seconds_per_page = float(os.getenv("SIM_SECONDS_PER_PAGE", "0"))
+    jitter = float(os.getenv("SIM_JITTER", "0"))
+    for task in tasks:
+        output_base = f"{DOWNLOADS_PATH}{task['id']}"
+        if find_range_file(output_base):
+            continue
+        seed = zlib.crc32(task["id"].encode("utf-8"))
+        rng = random.Random(seed)
+        time.sleep(estimate_task_cost(task) * seconds_per_page * (1 + rng.uniform(-jitter, jitter)))
+        write_records(output_base, generate_records(rng.randint(1, 20), seed=seed, first_index=seed % 10 ** 7))
+
+def _run_node(shard, shards, case_status, node_folder, results):
+    os.chdir(node_folder)
+    sys.stdout = open("node_stdout.log", "w", encoding="utf-8")
+    from src.functions.sync_orchestrator import run_shard_process
+    from src.utils.logging_config import setup_logging, start_log_listener, stop_log_listener
+    start_log_listener()
+    logger = setup_logging()
+    start = time.perf_counter()
+    try:
+        run_shard_process(logger, case_status, shard, shards, task_runner=synthetic_task_runner)
+        results.put({"shard": shard, "seconds": round(time.perf_counter() - start, 2), "ok": True})
+    except Exception as e:
+        results.put({"shard": shard, "seconds": round(time.perf_counter() - start, 2), "ok": False, "error": str(e)})
+    finally:
+        stop_log_listener()
+
+def run(shards, case_status, seconds_per_page, jitter, workers, plan_date, etl, root, stale_markers=False):
+    shared_folder = os.path.join(root, "shared")
+    os.environ.update({
+        "SHARD_DEST": shared_folder, "SHARD_PLAN_DATE": plan_date, "SHARD_WORKERS": str(workers),
+        "SIM_SECONDS_PER_PAGE": str(seconds_per_page), "SIM_JITTER": str(jitter),
+        "SHARD_MERGE_TIMEOUT": "3600", "SHARD_POLL_SECONDS": "0.5"
+    })
+    plan = build_scraping_plan(case_status, datetime.strptime(plan_date, "%d/%m/%Y").date())
+    fingerprint = plan_fingerprint(plan, shards)
+    expected_costs = [sum(map(estimate_task_cost, tasks)) for tasks in assign_shards(plan, shards)]
+    logger = logging.getLogger("simulate_shards")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    if stale_markers:
+        location = SharedLocation(shared_folder, logger)
+        for shard in range(1, shards + 1):
+            location.put_json(MARKERS_FOLDER, marker_name(shard, shards), {
+                "shard": shard, "shards": shards, "plan_fingerprint": "stale", "case_status": case_status,
+                "completed_at": "2000-01-01T00:00:00", "tasks": 0, "files": [], "missing_tasks": []
+            })
+
+    context = get_worker_context()
+    results = context.Queue()
+    nodes = []
+    for shard in range(1, shards + 1):
+        node_folder = os.path.join(root, f"node_{shard}")
+        os.makedirs(node_folder, exist_ok=True)
+        node = context.Process(target=_run_node, args=(shard, shards, case_status, node_folder, results), name=f"Node-{shard}")
+        node.start()
+        nodes.append(node)
+
+    # El merge arranca a la vez que los nodos y espera (sondeando SHARD_DEST) a que terminen todos.
+    merge_folder = os.path.join(root, "merge")
+    os.makedirs(merge_folder, exist_ok=True)
+    merge_start = time.perf_counter()
+    if etl:
+        from src.functions.sync_orchestrator import run_merge_process
+        from src.utils.logging_config import setup_logging
+        os.chdir(merge_folder)
+        run_merge_process(setup_logging(), case_status, shards)
+        collected = None
+    else:
+        target_folder = os.path.join(merge_folder, "tmp")
+        markers = collect_shards(SharedLocation(shared_folder, logger), shards, fingerprint, target_folder, logger, timeout_seconds=3600, poll_seconds=0.5)
+        collected = [os.path.basename(path) for path in list_range_files(target_folder)]
+    merge_seconds = time.perf_counter() - merge_start
+
+    node_results = sorted((results.get() for _ in nodes), key=lambda result: result["shard"])
+    for node in nodes:
+        node.join()
+
+    report = {
+        "shards": shards, "case_status": case_status, "plan_tasks": len(plan), "workers_per_shard": workers,
+        "expected_cost_pages": expected_costs,
+        "cost_imbalance": round(max(expected_costs) / (sum(expected_costs) / shards), 3),
+        "nodes": node_results,
+        "merge_wait_seconds": round(merge_seconds, 2)
+    }
+    if collected is not None:
+        collected_ids = [name.split(".", 1)[0] for name in collected]
+        uploaded = sum(len(marker["files"]) for marker in markers)
+        report["merge"] = {
+            "files": len(collected),
+            "markers_with_plan": sum(marker["plan_fingerprint"] == fingerprint for marker in markers),
+            "uploaded_by_shards": uploaded,
+            "covers_plan_exactly_once": sorted(collected_ids) == sorted(task["id"] for task in plan) and uploaded == len(plan)
+        }
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run N local processes as shard nodes and merge their range files.")
+    parser.add_argument("--shards", type=int, default=3)
+    parser.add_argument("--status", choices=["active", "inactive", "both"], default="active")
+    parser.add_argument("--seconds-per-page", type=float, default=0.002)
+    parser.add_argument("--jitter", type=float, default=0.5, help="Relative noise of each task's real cost around its estimate.")
+    parser.add_argument("--workers", type=int, default=2, help="Synthetic scraping workers per shard (SHARD_WORKERS).")
+    parser.add_argument("--plan-date", default=datetime.now().strftime("%d/%m/%Y"), help="Plan reference day shared by all nodes (dd/mm/yyyy).")
+    parser.add_argument("--etl", action="store_true", help="Run run_merge_process (ETL + verification) instead of only collecting the files.")
+    parser.add_argument("--stale-markers", action="store_true", help="Start with completion markers from another plan in SHARD_DEST.")
+    parser.add_argument("--keep", action="store_true", help="Keep the nodes' and shared folders.")
+    args = parser.parse_args()
+    if args.keep:
+        root = tempfile.mkdtemp(prefix="shards_")
+        print(f"Working folder: {root}", file=sys.stderr)
+        result = run(args.shards, args.status, args.seconds_per_page, args.jitter, args.workers, args.plan_date, args.etl, root, args.stale_markers)
+    else:
+        with tempfile.TemporaryDirectory(prefix="shards_") as root:
+            result = run(args.shards, args.status, args.seconds_per_page, args.jitter, args.workers, args.plan_date, args.etl, root, args.stale_markers)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,99 @@
+"""
+Generador de datos sintéticos con la forma de la salida de SIPI (extract_row_data),
+usado por los benchmarks para no depender de un scraping real.
+"""
+import logging
+import os
+import random
+from datetime import date, timedelta
+from src.utils.data_normalizer import DataNormalizer
+from src.utils.intermediate_format import write_records
+from src.utils.trademark_record import decode_categoricals
+
+SPANISH_MONTHS = ["ene.", "feb.", "mar.", "abr.", "may.", "jun.", "jul.", "ago.", "sept.", "oct.", "nov.", "dic."]
+RAW_STATUSES = [status.capitalize() for status in DataNormalizer(None, logging.getLogger(__name__)).status_mapping]
+HOLDER_NAMES = [
+    "COMERCIALIZADORA ANDINA S.A.S.", "Inversiones  del Valle; Ltda.", "JUAN   PEREZ GOMEZ",
+    "Laboratorios Bogotá S.A.", "ALIMENTOS DEL CARIBE S.A.", "María Fernanda Ríos", "TEXTILES MEDELLÍN S.A.S.",
+    "Compañía Cafetera de Antioquia", "DISTRIBUIDORA   DEL  PACÍFICO", "Grupo Empresarial Santander S.A."
+]
+OFFICES = ["SD", "NC"]
+
+def spanish_date(rng, start_year=1990, end_year=2025):
+    """Fecha en el formato que muestra SIPI, p. ej. '7 sept. 2019'."""
+    return f"{rng.randint(1, 28)} {rng.choice(SPANISH_MONTHS)} {rng.randint(start_year, end_year)}"
+
+def holder_value(rng):
+    """Un titular, o una lista si SIPI los separa con <br> (como hace try_get_text)."""
+    if rng.random() < 0.2:
+        cell = "<br>".join(rng.sample(HOLDER_NAMES, rng.randint(2, 3)))
+        return [name.strip() for name in cell.split("<br>")]
+    return rng.choice(HOLDER_NAMES)
+
+def request_number(index, rng):
+    return f"{OFFICES[index % len(OFFICES)]}{2000 + index % 25}/{index:07d}"
+
+def generate_records(count, seed=0, duplicate_rate=0.0, first_index=0):
+    """
+    Genera 'count' registros crudos. Una fracción 'duplicate_rate' reutiliza un request_number
+    ya generado (con otros valores), como ocurre entre los archivos Niza y los de rangos de fechas.
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        index = first_index + i
+        if records and rng.random() < duplicate_rate:
+            number = rng.choice(records)["request_number"]
+        else:
+            number = request_number(index, rng)
+        records.append({
+            "request_number": number,
+            "registry_number": str(rng.randint(100000, 999999)) if rng.random() < 0.7 else "",
+            "denomination": f"MARCA {rng.randint(1, max(count, 1))}",
+            "logo_url": f"https://sipi.sic.gov.co/sipi/Extra/Image.aspx?id={index}&fmt=jpeg" if rng.random() < 0.5 else "",
+            "filing_date": spanish_date(rng),
+            "expiration_date": spanish_date(rng) if rng.random() < 0.8 else "",
+            "status": rng.choice(RAW_STATUSES),
+            "holder": holder_value(rng),
+            "niza_class": str(rng.randint(1, 45)),
+            "gazette_number": str(rng.randint(800, 1100))
+        })
+    return records
+
+def write_corpus(folder, total_records, records_per_file=2000, duplicate_rate=0.02, niza_files=4, fmt=None, seed=0):
+    """
+    Escribe un corpus de archivos de rangos semanales (y algunos de Clases Niza que repiten
+    request_numbers de los rangos) en 'folder'. Devuelve la lista de archivos escritos.
+    """
+    os.makedirs(folder, exist_ok=True)
+    file_paths, written, week_start = [], 0, date(2019, 1, 1)
+    while written < total_records:
+        count = min(records_per_file, total_records - written)
+        week_end = week_start + timedelta(days=6)
+        base = os.path.join(folder, f"{week_start.strftime('%d_%m_%Y')}_{week_end.strftime('%d_%m_%Y')}_ACTIVE")
+        file_paths.append(write_records(base, generate_records(count, seed=seed + written, duplicate_rate=duplicate_rate, first_index=written), fmt=fmt))
+        written += count
+        week_start = week_end + timedelta(days=1)
+
+    rng = random.Random(seed)
+    for niza_class in range(1, niza_files + 1):
+        count = max(int(records_per_file * duplicate_rate), 1)
+        indices = [rng.randrange(max(total_records, 1)) for _ in range(count)]
+        records = generate_records(count, seed=seed + niza_class * 7919)
+        for record, index in zip(records, indices):
+            record["request_number"] = request_number(index, rng)
+        file_paths.append(write_records(os.path.join(folder, f"niza_{niza_class}_1900_1900_ACTIVE"), records, fmt=fmt))
+    return file_paths
+
+def db_frame_from_batch(df_new, change_rate=0.05, existing_rate=0.8, seed=0):
+    """
+    Construye el DataFrame que devolvería fetch_records_by_request_numbers para un lote normalizado:
+    una fracción 'existing_rate' ya está en la BD y, de ellos, 'change_rate' tiene algún valor distinto.
+    """
+    rng = random.Random(seed)
+    df_db = decode_categoricals(df_new.drop(columns=[col for col in ("logo", "updated_at", "badger_country", "source_file") if col in df_new.columns]))
+    df_db = df_db[[rng.random() < existing_rate for _ in range(len(df_db))]].copy()
+    changed = [rng.random() < change_rate for _ in range(len(df_db))]
+    df_db.loc[changed, "status"] = "CANCELADA"
+    df_db.loc[changed, "gazette_number"] = "0"
+    return df_db
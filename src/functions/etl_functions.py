@@ -1,20 +1,425 @@
+import csv
 import os
 import sys
+import time
+import numpy as np
 import pandas as pd
 import uuid
 import json
-import rollbar
+from src.utils.rollbar_reporter import reporter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from src.gateways.database_gateway import DatabaseManager
+from src.gateways.database_gateway import DatabaseManager, DatabaseWriteError, DB_COLUMNS
 from src.utils.data_normalizer import DataNormalizer
+from src.utils.batch_assembler import BatchAssembler
+from src.utils.dedup_index import RequestNumberIndex, sort_files_by_precedence
+from src.utils.change_report import ChangeReportWriter
+from src.utils.etl_ledger import ETLLedger, file_checksum
+from src.utils.request_number_codec import RequestNumberCodec, isin_sorted
+from src.utils.trademark_record import decode_categoricals, encode_categoricals, records_to_columns
 from src.gateways.scraping_gateway import run_scraping_for_missing_requests
-from src.utils.constants import PATHS, S3_PATHS
+from src.utils.constants import PATHS, S3_PATHS, ETL_SETTINGS
+from src.utils.logging_config import setup_logging, get_log_queue
+from src.utils.process_context import get_worker_context
+from src.utils.metrics import metrics
 from src.gateways.s3_gateway import S3Manager
 
 JSON_FOLDER_PATH = PATHS["tmp_path"]
+REQUEST_NUMBERS_PATH = PATHS["request_numbers_file"]
+LEDGER_PATH = PATHS["etl_ledger_file"]
+DATE_COLUMNS = ['filing_date', 'expiration_date']
+ALL_DB_COLUMNS = ["id", "request_number", "registry_number", "denomination", "logo_url", "logo", "filing_date", "expiration_date", "status", "holder", "niza_class", "gazette_number", "updated_at", "badger_country"]
+WRITE_MODES = ("diff", "upsert")
+RECORD_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://sipi.sic.gov.co/colombia-trademarks")
+
+def record_id(request_number, badger_country="COLOMBIA"):
+    """ID determinista: el mismo request_number y país generan siempre el mismo UUID (reintentos y replays idempotentes)."""
+    return str(uuid.uuid5(RECORD_ID_NAMESPACE, f"{badger_country}:{request_number}"))
+
+def _with_record_ids(df):
+    """Copia de df (indexado por request_number) con la columna 'id' determinista, lista para escribir en la BD."""
+    df = df.copy()
+    countries = df["badger_country"] if "badger_country" in df.columns else ["COLOMBIA"] * len(df)
+    df["id"] = [record_id(req_num, country) for req_num, country in zip(df.index, countries)]
+    df.reset_index(inplace=True)
+    df = decode_categoricals(df[[col for col in ALL_DB_COLUMNS if col in df.columns]].copy())
+    for col in DATE_COLUMNS:
+        if col in df.columns: df.loc[df[col] == '', col] = None
+    return df
+
+def _get_int_setting(env_name, default):
+    """Lee un entero de una variable de entorno, usando el valor por defecto si no es válido."""
+    value = os.getenv(env_name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+def _format_date_columns(df):
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+
+def build_batch_frame(file_path, normalizer, columnar=False):
+    """Lee y normaliza un archivo JSON y construye el DataFrame del lote, indexado por 'request_number'."""
+    if columnar:
+        new_data = normalizer.normalize_single_file_columns(file_path)
+        if not new_data or not new_data["request_number"]:
+            return None
+    else:
+        new_data = normalizer.normalize_single_file(file_path)
+        if not new_data:
+            return None
+        new_data = records_to_columns(new_data)
+
+    df_new = pd.DataFrame(new_data)
+    df_new.drop_duplicates(subset=['request_number'], keep='first', inplace=True)
+    df_new.set_index("request_number", inplace=True)
+    _format_date_columns(df_new)
+    return encode_categoricals(df_new)
+
+_worker_normalizer = None
+
+def _init_normalize_worker(log_queue):
+    """Inicializador del pool: un normalizador por proceso para que sus cachés se reutilicen entre archivos."""
+    global _worker_normalizer
+    _worker_normalizer = DataNormalizer(raw_data_folder=JSON_FOLDER_PATH, logger=setup_logging(log_queue))
+
+def _build_batch_frame_in_worker(file_path, columnar):
+    """Punto de entrada del pool de procesos: normaliza un archivo en un proceso hijo."""
+    return _timed_build_batch_frame(file_path, _worker_normalizer, columnar)
+
+def _timed_build_batch_frame(file_path, normalizer, columnar):
+    start = time.perf_counter()
+    df_new = build_batch_frame(file_path, normalizer, columnar)
+    return file_path, df_new, time.perf_counter() - start
+
+def iter_batch_frames(json_file_list, normalizer, logger, workers=1, max_in_flight=None, columnar=False):
+    """
+    Genera (file_path, df_new) en el mismo orden que json_file_list.
+    Con workers > 1 la decodificación y normalización corren en un ProcessPoolExecutor;
+    como máximo 'max_in_flight' lotes están en vuelo a la vez para acotar la memoria.
+    """
+    if workers <= 1:
+        for file_path in json_file_list:
+            _, df_new, elapsed = _timed_build_batch_frame(file_path, normalizer, columnar)
+            metrics.observe("etl_stage_seconds", elapsed, stage="normalize")
+            yield file_path, df_new
+        return
+
+    max_in_flight = max(max_in_flight or workers * 2, 1)
+    logger.info(f"Normalizando en paralelo con {workers} procesos (máximo {max_in_flight} lotes en vuelo).")
+    pending_files = iter(json_file_list)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_worker_context(), initializer=_init_normalize_worker, initargs=(get_log_queue(),)) as pool:
+        in_flight = deque()
+        for file_path in pending_files:
+            in_flight.append(pool.submit(_build_batch_frame_in_worker, file_path, columnar))
+            if len(in_flight) >= max_in_flight:
+                break
+
+        while in_flight:
+            with metrics.timer("etl_stage_seconds", stage="normalize_wait"):
+                file_path, df_new, elapsed = in_flight.popleft().result()
+            metrics.observe("etl_stage_seconds", elapsed, stage="normalize")
+            next_file = next(pending_files, None)
+            if next_file is not None:
+                in_flight.append(pool.submit(_build_batch_frame_in_worker, next_file, columnar))
+            yield file_path, df_new
+
+def _comparable_values(series):
+    return [str(value or '').strip() for value in series.tolist()]
+
+def diff_batch(df_new, df_db):
+    """
+    Clasifica los registros del lote en nuevos y modificados comparándolos con la BD.
+    Devuelve también, por cada registro modificado, la tupla de columnas que cambiaron.
+    La comparación se hace columna a columna sobre las filas ya presentes en la BD, sin extraer cada fila.
+    """
+    report_data_lote, records_to_insert_indices, records_to_update_indices = [], [], []
+    update_columns = {}
+    has_lineage = 'source_file' in df_new.columns
+
+    in_db = df_new.index.isin(df_db.index) if not df_db.empty else [False] * len(df_new)
+    existing = df_new.index[in_db]
+    common_columns = df_new.columns.intersection(df_db.columns) if not df_db.empty else []
+    df_db_existing = df_db.reindex(existing) if not df_db.empty else df_db
+    changed_by_column = [
+        (col, [new != db for new, db in zip(_comparable_values(df_new.loc[existing, col]), _comparable_values(df_db_existing[col]))])
+        for col in common_columns
+    ]
+    source_files = df_new['source_file'].tolist() if has_lineage else None
+
+    existing_position = 0
+    for position, (req_num, row_in_db) in enumerate(zip(df_new.index, in_db)):
+        if not row_in_db:
+            columns_changed = ["NEW_RECORD"]
+            records_to_insert_indices.append(req_num)
+        else:
+            columns_changed = [col for col, changed in changed_by_column if changed[existing_position]]
+            existing_position += 1
+            if columns_changed:
+                records_to_update_indices.append(req_num)
+                update_columns[req_num] = tuple(columns_changed)
+
+        if columns_changed:
+            report_row = {"request_number": req_num, "changed": True, "columns_changed": ", ".join(columns_changed)}
+            if has_lineage:
+                report_row["source_file"] = source_files[position]
+            report_data_lote.append(report_row)
+
+    return report_data_lote, records_to_insert_indices, records_to_update_indices, update_columns
+
+def partition_by_request_number(df, partitions):
+    """
+    Reparte df (indexado por request_number) en 'partitions' particiones disjuntas por hash del
+    request_number. Cada partición va ordenada por request_number para que todas las sesiones tomen
+    los locks en el mismo orden.
+    """
+    buckets = pd.util.hash_array(df.index.to_numpy(dtype=object)) % partitions
+    return [df[buckets == p].sort_index() for p in range(partitions) if (buckets == p).any()]
+
+class BatchWriter:
+    """
+    Escritura de los lotes en tres etapas: 'fetch' (consulta de los registros del lote en la BD),
+    'diff' (comparación, CPU) y 'write' (INSERT/UPDATE). En modo 'upsert' no hay consulta ni comparación:
+    el lote se escribe con INSERT ... ON CONFLICT DO UPDATE (si falla, se reintenta en modo 'diff').
+    Con writers > 1 la consulta y la escritura de cada lote se parten por hash del request_number y las
+    particiones van en paralelo, cada una con sus propias conexiones y transacciones.
+    Con pipeline_depth > 0, iter_process solapa la consulta del lote siguiente y la escritura de los
+    anteriores con la comparación del lote actual. 'journal(context, report_rows)', si se da, recibe en
+    iter_process las filas del reporte de cada lote antes de escribirlo (en 'upsert', justo después).
+    """
+    def __init__(self, db_manager, logger, write_mode="diff", writers=1, pipeline_depth=0, journal=None):
+        self.db_manager = db_manager
+        self.journal = journal
+        self.logger = logger
+        self.write_mode = write_mode
+        self.writers = max(writers, 1)
+        self.pipeline_depth = max(pipeline_depth, 0)
+        # psycopg2 libera el GIL mientras espera a la BD, así que los hilos solapan las sesiones.
+        # Cada etapa en vuelo (la consulta adelantada y cada escritura) usa sus propios 'writers' hilos.
+        self._pool = ThreadPoolExecutor(max_workers=self.writers * (self.pipeline_depth + 1), thread_name_prefix="db-writer") if self.writers > 1 else None
+        # Un hilo para la consulta adelantada y uno por cada escritura en vuelo.
+        self._stage_pool = ThreadPoolExecutor(max_workers=self.pipeline_depth + 1, thread_name_prefix="etl-pipeline") if self.pipeline_depth else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        for pool in (self._stage_pool, self._pool):
+            if pool is not None:
+                pool.shutdown()
+        self._stage_pool, self._pool = None, None
+
+    def process(self, df_new):
+        """Devuelve (report_data_lote, inserts, updates) del lote ya guardado."""
+        df_db = self.fetch(df_new)
+        return self.write(df_new, self.diff(df_new, df_db))
+
+    def iter_process(self, items):
+        """
+        Recibe pares (context, df_new) y genera (context, resultado de process) en el mismo orden, cuando
+        el lote ya está guardado. Mientras se compara el lote i, la consulta del lote i+1 y la escritura de
+        hasta pipeline_depth lotes anteriores corren en hilos. Los lotes no comparten request_number
+        (los deduplica RequestNumberIndex), así que la consulta adelantada no depende de las escrituras pendientes.
+        Los lotes vacíos se devuelven con un resultado vacío respetando el orden.
+        """
+        if self._stage_pool is None:
+            for context, df_new in items:
+                yield context, (self._write_batch(context, df_new, self.diff(df_new, self.fetch(df_new))) if not df_new.empty else ([], 0, 0))
+            return
+
+        items = iter(items)
+        pending_writes = deque()
+
+        def submit_fetch():
+            item = next(items, None)
+            if item is None:
+                return None
+            context, df_new = item
+            return context, df_new, None if df_new.empty else self._stage_pool.submit(self.fetch, df_new)
+
+        next_batch = submit_fetch()
+        while next_batch is not None:
+            context, df_new, fetch_future = next_batch
+            if fetch_future is None:
+                next_batch = submit_fetch()
+                pending_writes.append((context, None))
+            else:
+                with metrics.timer("etl_stage_seconds", stage="fetch_wait"):
+                    df_db = fetch_future.result()
+                next_batch = submit_fetch()  # la consulta del lote i+1 corre mientras se compara el lote i
+                plan = self.diff(df_new, df_db)
+                pending_writes.append((context, self._stage_pool.submit(self._write_batch, context, df_new, plan)))
+            while len(pending_writes) > self.pipeline_depth:
+                yield self._collect(*pending_writes.popleft())
+
+        while pending_writes:
+            yield self._collect(*pending_writes.popleft())
+
+    def _write_batch(self, context, df_new, plan):
+        if self.journal and plan is not None:
+            self.journal(context, plan[0])
+        result = self.write(df_new, plan)
+        if self.journal and plan is None:
+            # En 'upsert' lo escrito solo se conoce al confirmar: queda una ventana entre el commit y este registro.
+            self.journal(context, result[0])
+        return result
+
+    def _collect(self, context, write_future):
+        if write_future is None:
+            return context, ([], 0, 0)
+        with metrics.timer("etl_stage_seconds", stage="write_wait"):
+            return context, write_future.result()
+
+    def _map_partitions(self, func, df):
+        """Aplica func a cada partición por hash de df (en paralelo con writers > 1) y devuelve los resultados."""
+        if self._pool is None:
+            return [func(df)]
+        return list(self._pool.map(func, partition_by_request_number(df, self.writers)))
+
+    def fetch(self, df_new):
+        """Registros del lote en la BD, indexados por request_number (None en modo 'upsert')."""
+        return None if self.write_mode == "upsert" else self._fetch_db(df_new)
+
+    def _fetch_db(self, df_new):
+        with metrics.timer("etl_stage_seconds", stage="fetch"):
+            frames = self._map_partitions(lambda part: self.db_manager.fetch_records_by_request_numbers(part.index.tolist()), df_new)
+        frames = [frame for frame in frames if not frame.empty]
+        df_db = pd.concat(frames, ignore_index=True) if len(frames) > 1 else (frames[0] if frames else pd.DataFrame())
+        if not df_db.empty:
+            df_db.drop_duplicates(subset=['request_number'], keep='first', inplace=True)
+            df_db.set_index("request_number", inplace=True)
+        _format_date_columns(df_db)
+        return df_db
+
+    def diff(self, df_new, df_db):
+        """Compara el lote con la BD; devuelve el plan de escritura de diff_batch (None en modo 'upsert')."""
+        if df_db is None:
+            return None
+        self.logger.info("Comparando y clasificando registros del lote...")
+        with metrics.timer("etl_stage_seconds", stage="diff"):
+            plan = diff_batch(df_new, df_db)
+        _, records_to_insert_indices, records_to_update_indices, _ = plan
+        metrics.inc("etl_records_total", len(records_to_insert_indices), result="insert")
+        metrics.inc("etl_records_total", len(records_to_update_indices), result="update")
+        metrics.inc("etl_records_total", len(df_new) - len(records_to_insert_indices) - len(records_to_update_indices), result="unchanged")
+        self.logger.info(f"Lote comparado: {len(records_to_insert_indices)} nuevos, {len(records_to_update_indices)} modificados.")
+        return plan
+
+    def write(self, df_new, plan):
+        """Escribe el lote según el plan de diff (o con upsert si no hay plan) y devuelve (report_data_lote, inserts, updates)."""
+        start = time.perf_counter()
+        result = self._write_upsert(df_new) if plan is None else self._write_diff(df_new, plan)
+        elapsed = time.perf_counter() - start
+        metrics.observe("etl_stage_seconds", elapsed, stage="write")
+        self.logger.info(f"Lote escrito en {elapsed:.2f}s ({len(df_new) / elapsed if elapsed else 0:.0f} registros/s con {self.writers} escritor(es)).")
+        return result
+
+    def _write_upsert(self, df_new):
+        partial_results = self._map_partitions(self._upsert_partition, df_new)
+        # El fallback no puede correr dentro de _upsert_partition: ya ocupa un hilo de self._pool y su consulta
+        # y escritura por particiones esperarían a hilos del mismo pool (bloqueo con ETL_DB_WRITERS > 1).
+        # Las particiones ya confirmadas no cambian al repetirlas: solo se reintentan las que fallaron.
+        failed = [result for result in partial_results if isinstance(result, pd.DataFrame)]
+        if failed:
+            df_failed = pd.concat(failed) if len(failed) > 1 else failed[0]
+            self.logger.warning(f"El upsert falló en {len(failed)} partición(es) ({len(df_failed)} registros); se reintentan con consulta y comparación.")
+            partial_results = [result for result in partial_results if not isinstance(result, pd.DataFrame)]
+            partial_results.append(self._write_diff(df_failed, self.diff(df_failed, self._fetch_db(df_failed))))
+        position = {req_num: i for i, req_num in enumerate(df_new.index)}
+        report_data_lote = sorted((row for rows, _, _ in partial_results for row in rows), key=lambda row: position[row["request_number"]])
+        return report_data_lote, sum(r[1] for r in partial_results), sum(r[2] for r in partial_results)
+
+    def _upsert_partition(self, df_new):
+        """(report_data, inserts, updates) de la partición, o la propia partición si el upsert falló."""
+        try:
+            with metrics.timer("etl_stage_seconds", stage="upsert"):
+                written = self.db_manager.upsert_records(_with_record_ids(df_new), DB_COLUMNS)
+        except DatabaseWriteError:
+            return df_new
+
+        has_lineage = 'source_file' in df_new.columns
+        report_data_lote, inserts, updates = [], 0, 0
+        for req_num, inserted, columns_changed in written:
+            inserts += inserted
+            updates += not inserted
+            report_row = {"request_number": req_num, "changed": True, "columns_changed": "NEW_RECORD" if inserted else ", ".join(columns_changed)}
+            if has_lineage:
+                report_row["source_file"] = df_new.at[req_num, 'source_file']
+            report_data_lote.append(report_row)
+        metrics.inc("etl_records_total", inserts, result="insert")
+        metrics.inc("etl_records_total", updates, result="update")
+        metrics.inc("etl_records_total", len(df_new) - inserts - updates, result="unchanged")
+        self.logger.info(f"Lote guardado con upsert: {inserts} nuevos, {updates} modificados.")
+        return report_data_lote, inserts, updates
+
+    def _write_diff(self, df_new, plan):
+        report_data_lote, records_to_insert_indices, records_to_update_indices, update_columns = plan
+        if records_to_insert_indices or records_to_update_indices:
+            df_changed = df_new.loc[records_to_insert_indices + records_to_update_indices]
+            self._map_partitions(lambda part: self._write_changed_partition(part, update_columns), df_changed)
+        return report_data_lote, len(records_to_insert_indices), len(records_to_update_indices)
+
+    def _write_changed_partition(self, df_part, update_columns):
+        """Inserta los registros nuevos de la partición y actualiza los modificados (los que tienen columnas cambiadas)."""
+        records_to_insert_indices = [req_num for req_num in df_part.index if req_num not in update_columns]
+        records_to_update_indices = [req_num for req_num in df_part.index if req_num in update_columns]
+        if records_to_insert_indices:
+            self.db_manager.insert_records(_with_record_ids(df_part.loc[records_to_insert_indices]))
+        if records_to_update_indices:
+            self._update_changed_columns(df_part, records_to_update_indices, update_columns)
+
+    def _update_changed_columns(self, df_new, records_to_update_indices, update_columns):
+        """
+        Agrupa los registros modificados por su conjunto de columnas cambiadas y escribe solo esas columnas.
+        Un DatabaseWriteError se propaga: el lote no se cuenta ni se marca como guardado en el ledger.
+        """
+        groups = {}
+        for req_num in records_to_update_indices:
+            groups.setdefault(update_columns[req_num], []).append(req_num)
+        self.logger.info(f"Actualizando {len(records_to_update_indices)} registros en {len(groups)} grupos por columnas modificadas.")
+        metrics.inc("etl_update_groups_total", len(groups))
+
+        touch_columns = [col for col in ("updated_at",) if col in df_new.columns]
+        for changed_columns, req_nums in groups.items():
+            df_group = decode_categoricals(df_new.loc[req_nums, [*changed_columns, *touch_columns]].reset_index())
+            for col in DATE_COLUMNS:
+                if col in df_group.columns: df_group.loc[df_group[col] == '', col] = None
+            self.db_manager.update_changed_columns(df_group, list(changed_columns), touch_columns)
+
+def _recover_in_flight_rows(pending_rows, saved_request_numbers, report_data_lote, inserts, updates, logger):
+    """
+    Al reanudar: los registros que un lote en vuelo llegó a escribir antes de la caída ya están en la BD, así que
+    el diff los ve sin cambios. Se recuperan del registro de lotes en vuelo del ledger para que el reporte y los
+    totales los cuenten; lo que el diff actual sí ve como cambiado (no se llegó a escribir) tiene prioridad.
+    """
+    reported = {row["request_number"] for row in report_data_lote}
+    recovered = []
+    for req_num in saved_request_numbers:
+        row = pending_rows.pop(req_num, None)
+        if row is not None and req_num not in reported:
+            recovered.append(row)
+    if not recovered:
+        return report_data_lote, inserts, updates
+    recovered_inserts = sum(row["columns_changed"] == "NEW_RECORD" for row in recovered)
+    logger.info(f"Se recuperan {len(recovered)} registros escritos por un lote en vuelo antes de la interrupción ({recovered_inserts} nuevos).")
+    return report_data_lote + recovered, inserts + recovered_inserts, updates + len(recovered) - recovered_inserts
 
 def run_full_etl_process(logger):
-    """Orquesta el proceso ETL completo, procesando los JSON en lotes (uno por uno)."""
+    """
+    Orquesta el proceso ETL completo, procesando los JSON en lotes.
+    Los registros de varios archivos se agrupan en lotes de ~ETL_BATCH_SIZE registros
+    (0 = un lote por archivo). Con ETL_WORKERS > 1 la normalización se reparte en un pool de procesos y un único
+    escritor ordenado hace la consulta, la comparación y la escritura en la BD; con ETL_PIPELINE_DEPTH > 0
+    la consulta y la escritura en la BD se solapan con la comparación del lote actual.
+    """
     try:
         logger.info("Iniciando proceso ETL principal por lotes...")
         db_params = {
@@ -40,108 +445,165 @@ def run_full_etl_process(logger):
             logger.warning(f"No se encontraron archivos JSON en '{JSON_FOLDER_PATH}'. Terminando ETL.")
             return
 
+        precedence = os.getenv("ETL_SOURCE_PRECEDENCE", ETL_SETTINGS["source_precedence"])
+        json_file_list = sort_files_by_precedence(json_file_list, precedence)
+        logger.info(f"Archivos ordenados por precedencia '{precedence}': ante un 'request_number' repetido gana el primero.")
+
+        # Ledger de lotes guardados: si una ejecución anterior quedó a medias sobre los mismos archivos,
+        # se saltan los archivos ya guardados y se continúa desde el último lote confirmado.
+        ledger = ETLLedger(LEDGER_PATH, table_name)
+        checksums = {os.path.basename(path): file_checksum(path) for path in json_file_list}
+        resume_from = ledger.load(checksums)
+        keys_partial_path = f"{REQUEST_NUMBERS_PATH}.partial"
+        if resume_from and not os.path.exists(keys_partial_path):
+            logger.warning(f"Ledger encontrado pero falta '{keys_partial_path}'. Se reinicia el ETL desde el principio.")
+            ledger.reset()
+            resume_from = None
+
+        workers = _get_int_setting("ETL_WORKERS", ETL_SETTINGS["workers"])
+        max_in_flight = _get_int_setting("ETL_MAX_IN_FLIGHT", ETL_SETTINGS["max_in_flight"])
+        batch_size = _get_int_setting("ETL_BATCH_SIZE", ETL_SETTINGS["batch_size"])
+        columnar = os.getenv("ETL_NORMALIZE_MODE", ETL_SETTINGS["normalize_mode"]) == "columnar"
+
         total_inserts = 0
         total_updates = 0
-        report_data_global = []
-        
-        db_cols_list = None
+        total_duplicates = 0
+        open_file_rows = 0
+        report_date = datetime.now().strftime('%Y-%m-%d')
+        seen_index = RequestNumberIndex()
+        batch_number = 0
+        pending_rows = {}
+        if resume_from:
+            completed_files = ledger.completed_files()
+            json_file_list = [path for path in json_file_list if os.path.basename(path) not in completed_files]
+            with open(keys_partial_path, "r+", encoding="utf-8") as keys_file:
+                keys_file.truncate(resume_from["keys_offset"])
+            with open(keys_partial_path, "r", encoding="utf-8") as keys_file:
+                seen_index.add([line.rstrip("\n") for line in keys_file])
+            total_duplicates = seen_index.duplicates_dropped = resume_from.get("duplicates_dropped", 0)
+            open_file_rows = resume_from.get("open_file_rows", 0)
+            total_inserts, total_updates = resume_from["inserts"], resume_from["updates"]
+            report_date, batch_number = resume_from["report_date"], resume_from["batch"]
+            pending_rows = ledger.pending_rows()
+            logger.info(
+                f"Reanudando ETL tras el lote {batch_number}: {len(completed_files)} archivos ya guardados se omiten, "
+                f"{len(seen_index)} 'request_number' ya confirmados y {len(json_file_list)} archivos pendientes."
+            )
+            metrics.inc("etl_resumed_files_skipped_total", len(completed_files))
+        file_order = [os.path.basename(path) for path in json_file_list]
+        file_position = {name: i for i, name in enumerate(file_order)}
+        recorded_upto = 0
+        report_compress = os.getenv("ETL_REPORT_GZIP", str(ETL_SETTINGS["report_gzip"])).lower() in ("1", "true", "yes")
+        write_mode = os.getenv("ETL_WRITE_MODE", ETL_SETTINGS["write_mode"])
+        if write_mode not in WRITE_MODES:
+            logger.warning(f"ETL_WRITE_MODE '{write_mode}' no válido; se usa '{ETL_SETTINGS['write_mode']}'.")
+            write_mode = ETL_SETTINGS["write_mode"]
+        db_writers = _get_int_setting("ETL_DB_WRITERS", ETL_SETTINGS["db_writers"])
+        pipeline_depth = _get_int_setting("ETL_PIPELINE_DEPTH", ETL_SETTINGS["pipeline_depth"])
+        logger.info(f"Modo de escritura del ETL: {write_mode}, {db_writers} escritor(es) en paralelo, {pipeline_depth} lote(s) escribiéndose mientras se compara el siguiente.")
+        assembler = BatchAssembler(target_size=batch_size)
 
-        for i, file_path in enumerate(json_file_list):
-            logger.info(f"--- Procesando Lote {i+1}/{len(json_file_list)}: {os.path.basename(file_path)} ---")
-            
-            new_data = normalizer.normalize_single_file(file_path)
-            if not new_data:
-                logger.warning(f"El archivo {file_path} no produjo datos. Omitiendo lote.")
-                continue
-                
-            df_new = pd.DataFrame(new_data)
-            df_new.drop_duplicates(subset=['request_number'], keep='first', inplace=True)
-            df_new.set_index("request_number", inplace=True)
-            
-            request_numbers_in_lote = df_new.index.tolist()
-            df_db = db_manager.fetch_records_by_request_numbers(request_numbers_in_lote)
-            if not df_db.empty:
-                df_db.drop_duplicates(subset=['request_number'], keep='first', inplace=True)
-                df_db.set_index("request_number", inplace=True)
-
-            for df in [df_new, df_db]:
-                for col in ['filing_date', 'expiration_date']:
-                    if col in df.columns:
-                        df[col] = pd.to_datetime(df[col], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
-
-            logger.info("Comparando y clasificando registros del lote...")
-            report_data_lote, records_to_insert_indices, records_to_update_indices = [], [], []
-            all_request_numbers_lote = df_new.index
-            
-            for req_num in all_request_numbers_lote:
-                changed, columns_changed = False, []
-                in_db = not df_db.empty and req_num in df_db.index
-                
-                if not in_db:
-                    columns_changed.append("NEW_RECORD")
-                    records_to_insert_indices.append(req_num)
+        def non_empty_frames():
+            # Al reanudar, las primeras open_file_rows filas del archivo que quedó a medias ya pasaron por un lote
+            # confirmado (guardadas o descartadas y contadas como duplicadas): se saltan en lugar de volver a filtrarlas.
+            skip_rows = open_file_rows
+            for file_path, df_new in iter_batch_frames(json_file_list, normalizer, logger, workers=workers, max_in_flight=max_in_flight, columnar=columnar):
+                if df_new is None:
+                    logger.warning(f"El archivo {file_path} no produjo datos. Omitiendo archivo.")
+                    continue
+                if skip_rows:
+                    df_new, skip_rows = df_new.iloc[skip_rows:], max(skip_rows - len(df_new), 0)
+                yield file_path, df_new
+
+        def deduplicated_batches():
+            for number, (df_new, source_files) in enumerate(assembler.iter_batches(non_empty_frames()), start=batch_number + 1):
+                logger.info(f"--- Procesando Lote {number}: {len(df_new)} registros de {len(source_files)} archivo(s) ({', '.join(source_files[:3])}{', ...' if len(source_files) > 3 else ''}) ---")
+                duplicates_before = seen_index.duplicates_dropped
+                last_file_rows = int((df_new["source_file"] == source_files[-1]).sum())
+                df_new = seen_index.filter_new(df_new)
+                metrics.inc("etl_duplicates_dropped_total", seen_index.duplicates_dropped - duplicates_before)
+                if seen_index.duplicates_dropped > duplicates_before:
+                    logger.info(f"Se descartaron {seen_index.duplicates_dropped - duplicates_before} registros ya procesados en otro archivo.")
+                yield (number, source_files, df_new.index, seen_index.duplicates_dropped - duplicates_before, last_file_rows), df_new
+
+        # Los request_number guardados se escriben a disco durante esta pasada para que la verificación
+        # no tenga que volver a leer todos los JSON. Solo se publica el archivo si el ETL termina.
+        # El ledger, el reporte y las claves se escriben en orden de lote y solo cuando el lote ya está en la BD,
+        # aunque con ETL_PIPELINE_DEPTH > 0 la consulta y la escritura de otros lotes sigan en vuelo.
+        with open(keys_partial_path, "a" if resume_from else "w", encoding="utf-8") as keys_file, \
+                ChangeReportWriter(f"change_report_{report_date}.csv", f"change_report_summary_{report_date}.json", compress=report_compress, append=bool(resume_from), offset=resume_from.get("report_offset") if resume_from else None) as change_report, \
+                BatchWriter(db_manager, logger, write_mode, writers=db_writers, pipeline_depth=pipeline_depth,
+                            journal=lambda context, rows: ledger.record_pending(context[0], rows)) as writer:
+            if resume_from:
+                for entry in ledger.entries:
+                    change_report.restore(entry)
+            else:
+                # Entrada inicial: si la ejecución cae antes del primer lote confirmado, se reanuda (con el
+                # registro de lotes en vuelo) en lugar de empezar de cero contra filas ya escritas.
+                ledger.record(batch=0, report_date=report_date, checksums={}, completed_files=[], keys_offset=0, report_offset=change_report.offset,
+                             inserts=0, updates=0, duplicates_dropped=0, open_file_rows=0)
+            open_file = file_order[0] if resume_from and file_order else None
+            for (batch_number, source_files, saved_request_numbers, duplicates, last_file_rows), (report_data_lote, inserts, updates) in writer.iter_process(deduplicated_batches()):
+                batch_stats = {}
+                total_duplicates += duplicates
+                # Filas ya consumidas del último archivo del lote, que puede continuar en el lote siguiente.
+                if source_files[-1] != open_file:
+                    open_file, open_file_rows = source_files[-1], 0
+                open_file_rows += last_file_rows
+                if saved_request_numbers.empty:
+                    logger.info(f"--- Lote {batch_number} sin registros nuevos tras deduplicar. Omitiendo. ---")
                 else:
-                    new_row, db_row = df_new.loc[req_num], df_db.loc[req_num]
-                    common_columns = df_new.columns.intersection(df_db.columns)
-                    for col in common_columns:
-                        val_new, val_db = str(new_row.get(col, '') or '').strip(), str(db_row.get(col, '') or '').strip()
-                        if val_new != val_db:
-                            changed = True
-                            columns_changed.append(col)
-                    if changed: 
-                        records_to_update_indices.append(req_num)
-                        
-                if columns_changed: 
-                    report_data_lote.append({"request_number": req_num, "changed": True, "columns_changed": ", ".join(columns_changed)})
-
-            logger.info(f"Lote comparado: {len(records_to_insert_indices)} nuevos, {len(records_to_update_indices)} modificados.")
-            report_data_global.extend(report_data_lote)
-            total_inserts += len(records_to_insert_indices)
-            total_updates += len(records_to_update_indices)
-            
-            df_to_insert = df_new.loc[records_to_insert_indices].copy()
-            if not df_to_insert.empty:
-                df_to_insert['id'] = [str(uuid.uuid4()) for _ in range(len(df_to_insert))]
-                df_to_insert.reset_index(inplace=True)
-                all_db_cols = ["id", "request_number", "registry_number", "denomination", "logo_url", "logo", "filing_date", "expiration_date", "status", "holder", "niza_class", "gazette_number", "updated_at", "badger_country"]
-                df_to_insert = df_to_insert[[col for col in all_db_cols if col in df_to_insert.columns]]
-                for col in ['filing_date', 'expiration_date']:
-                    if col in df_to_insert.columns: df_to_insert.loc[df_to_insert[col] == '', col] = None
-                db_manager.insert_records(df_to_insert)
-            
-            df_to_update = df_new.loc[records_to_update_indices].copy().reset_index()
-            if not df_to_update.empty:
-                for col in ['filing_date', 'expiration_date']:
-                    if col in df_to_update.columns: df_to_update.loc[df_to_update[col] == '', col] = None
-                
-                if db_cols_list is None:
-                    logger.info("Obteniendo lista de columnas de la DB por primera vez...")
-                    if not df_db.empty:
-                        db_cols_list = df_db.columns.tolist()
-                    else:
-                        temp_df = db_manager.fetch_records_by_request_numbers(["-1"])
-                        db_cols_list = temp_df.columns.tolist()
-
-                cols_to_pass = [col for col in df_to_update.columns if col in db_cols_list or col == 'updated_at' or col == 'request_number']
-                db_manager.update_records(df_to_update[cols_to_pass])
-            
-            logger.info(f"--- Lote {i+1} procesado y guardado en la DB. ---")
+                    if pending_rows:
+                        report_data_lote, inserts, updates = _recover_in_flight_rows(pending_rows, saved_request_numbers, report_data_lote, inserts, updates, logger)
+                    batch_stats = change_report.write_batch(report_data_lote)
+                    total_inserts += inserts
+                    total_updates += updates
+                    keys_file.writelines(f"{req_num}\n" for req_num in saved_request_numbers)
+                    logger.info(f"--- Lote {batch_number} procesado y guardado en la DB. ---")
+
+                # Los archivos anteriores al último del lote ya no pueden aparecer en lotes posteriores.
+                last_position = max(file_position[name] for name in source_files)
+                completed = file_order[recorded_upto:last_position]
+                keys_file.flush()
+                os.fsync(keys_file.fileno())
+                ledger.record(
+                    batch=batch_number, report_date=report_date,
+                    checksums={name: checksums[name] for name in set(completed) | set(source_files)},
+                    completed_files=completed, keys_offset=keys_file.tell(), report_offset=change_report.offset,
+                    inserts=total_inserts, updates=total_updates,
+                    duplicates_dropped=total_duplicates, open_file_rows=open_file_rows, **batch_stats
+                )
+                recorded_upto = last_position
+
+            ledger.record(
+                batch=batch_number, report_date=report_date,
+                checksums={name: checksums[name] for name in file_order[recorded_upto:]},
+                completed_files=file_order[recorded_upto:], keys_offset=keys_file.tell(),
+                inserts=total_inserts, updates=total_updates,
+                duplicates_dropped=total_duplicates, finished=True
+            )
+
+        os.replace(keys_partial_path, REQUEST_NUMBERS_PATH)
+        logger.info(f"Lista de 'request_number' procesados guardada en '{REQUEST_NUMBERS_PATH}'.")
 
-        logger.info("Todos los lotes procesados. Generando reporte CSV global...")
-        csv_report_path = f"change_report_{datetime.now().strftime('%Y-%m-%d')}.csv"
-        pd.DataFrame(report_data_global).to_csv(csv_report_path, index=False, encoding="utf-8")
-        logger.info(f"Reporte CSV global exportado a '{csv_report_path}'")
+        logger.info(f"Todos los lotes procesados. {len(seen_index)} 'request_number' únicos; {seen_index.duplicates_dropped} duplicados entre archivos descartados.")
+        change_report.write_summary(
+            inserts=total_inserts, updates=total_updates,
+            unique_request_numbers=len(seen_index), duplicates_dropped=seen_index.duplicates_dropped
+        )
+        logger.info(f"Reporte de cambios exportado a '{change_report.report_path}' ({change_report.rows_written} filas) y resumen a '{change_report.summary_path}'.")
         
         try:
             s3_manager = S3Manager(bucket_name=S3_PATHS["bucket_name"], logger=logger)
-            s3_manager.upload_file(csv_report_path, S3_PATHS["reports_folder"])
+            s3_manager.upload_file(change_report.report_path, S3_PATHS["reports_folder"])
+            s3_manager.upload_file(change_report.summary_path, S3_PATHS["reports_folder"])
         except Exception as e:
             logger.error(f"Fallo al subir reporte CSV a S3: {e}")
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
 
         try:
-            rollbar.report_message(
-                f"ETL: Base de datos actualizada ({total_inserts} nuevos, {total_updates} modificados) - PROCESADO EN LOTES",
+            reporter.report_message(
+                f"ETL: Base de datos actualizada ({total_inserts} nuevos, {total_updates} modificados, {seen_index.duplicates_dropped} duplicados entre archivos descartados) - PROCESADO EN LOTES",
                 "info"
             )
         except Exception as e:
@@ -152,7 +614,7 @@ def run_full_etl_process(logger):
     except Exception as e:
         logger.critical(f"Un error inesperado ocurrió en el proceso ETL por lotes: {e}", exc_info=True)
         try:
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
         except:
             logger.error("No se pudo reportar el error de ETL a Rollbar.")
         sys.exit(1)
@@ -162,7 +624,7 @@ def compare_json_vs_db_and_generate_csv(logger):
     logger.info("Starting comparison of JSONs vs. Database for active records...")
 
     try:
-        rollbar.report_message(
+        reporter.report_message(
             "Iniciando Comparación (JSONs vs DB) para corrección de faltantes",
             "info"
         )
@@ -176,23 +638,30 @@ def compare_json_vs_db_and_generate_csv(logger):
         return None
     
     normalizer = DataNormalizer(JSON_FOLDER_PATH, logger)
-    json_requests = normalizer.get_all_request_numbers_from_jsons()
+    db_manager = DatabaseManager(db_params, table_name, logger, itersize=_get_int_setting("ETL_DB_ITERSIZE", ETL_SETTINGS["db_itersize"]))
+    csv_path = os.path.join(JSON_FOLDER_PATH, "missing_records.csv")
 
-    db_manager = DatabaseManager(db_params, table_name, logger)
-    db_active_requests = db_manager.fetch_active_request_numbers()
+    keys_path = REQUEST_NUMBERS_PATH
+    if not os.path.exists(keys_path):
+        logger.warning(f"'{REQUEST_NUMBERS_PATH}' not found. Re-reading every JSON file to collect request numbers.")
+        keys_path = os.path.join(JSON_FOLDER_PATH, "request_numbers_from_jsons.txt")
+        codec = RequestNumberCodec()
+        with open(keys_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{req_num}\n" for req_num in codec.decode_many(normalizer.get_all_request_numbers_from_jsons(codec)))
 
-    missing_requests = sorted(list(db_active_requests - json_requests))
+    missing_count = db_manager.export_missing_active_request_numbers(keys_path, csv_path)
+    if missing_count is None:
+        logger.warning("Server-side comparison failed. Falling back to an in-memory comparison.")
+        missing_count = _compare_in_memory(normalizer, db_manager, keys_path, csv_path, logger)
+    if missing_count is None:
+        # Sin comparación no se sabe si faltan registros: no es lo mismo que "sin discrepancias".
+        raise RuntimeError("Verification failed: both the server-side and the in-memory comparison of JSONs vs. DB failed.")
     
-    if not missing_requests:
+    if not missing_count:
         logger.info("Excellent! No discrepancies found. The database is in sync with the JSONs.")
         return None
         
-    logger.warning(f"Found {len(missing_requests)} active records in the DB that are not in the JSONs.")
-    
-    csv_path = os.path.join(JSON_FOLDER_PATH, "missing_records.csv")
-    df_missing = pd.DataFrame(missing_requests, columns=["missing_request_number"])
-    df_missing.to_csv(csv_path, index=False, encoding="utf-8")
-    
+    logger.warning(f"Found {missing_count} active records in the DB that are not in the JSONs.")
     logger.info(f"Generated file '{csv_path}' with the missing records.")
     
     s3_manager = S3Manager(bucket_name=S3_PATHS["bucket_name"], logger=logger)
@@ -200,12 +669,40 @@ def compare_json_vs_db_and_generate_csv(logger):
     
     return csv_path
 
+def _compare_in_memory(normalizer, db_manager, keys_path, csv_path, logger):
+    """
+    Computes the missing active request numbers against the scraped set, streaming the DB side in
+    ordered chunks (server-side cursor) and writing them to csv_path as they are found.
+    Both sides are compared as int64 codes (RequestNumberCodec) with a binary search over the sorted scraped codes.
+    Returns the number of missing request numbers, or None if the DB side could not be read.
+    """
+    codec = RequestNumberCodec()
+    json_codes = normalizer.get_request_numbers_from_artifact(keys_path, codec)
+    if json_codes is None:
+        json_codes = np.empty(0, dtype=np.int64)
+    missing_count = 0
+    try:
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["missing_request_number"])
+            for chunk in db_manager.iter_active_request_numbers():
+                # Un formato irregular que no está en los JSON no se añade a la tabla: queda como UNKNOWN_CODE (faltante).
+                missing = chunk[~isin_sorted(json_codes, codec.encode_many(chunk, extend=False))]
+                writer.writerows([req_num] for req_num in missing)
+                missing_count += len(missing)
+    except Exception as e:
+        logger.critical(f"CRITICAL error streaming active 'request_numbers': {e}")
+        reporter.report_exc_info()
+        return None
+    logger.info(f"In-memory comparison done ({codec.fallback_size} request numbers with an irregular format).")
+    return missing_count
+
 def update_statuses_from_json(json_path, logger):
     """Reads a JSON with updated statuses and applies them to the database."""
     logger.info(f"Starting status update from file '{json_path}'...")
 
     try:
-        rollbar.report_message(
+        reporter.report_message(
             f"Iniciando actualización de DB (Corrección) desde: {json_path}",
             "info"
         )
@@ -226,7 +723,7 @@ def update_statuses_from_json(json_path, logger):
         return
     except json.JSONDecodeError:
         logger.error(f"Error decoding the results JSON '{json_path}'.")
-        rollbar.report_exc_info()
+        reporter.report_exc_info()
         return
     
     status_mapping = {
@@ -253,7 +750,7 @@ def update_statuses_from_json(json_path, logger):
         db_manager.update_record_statuses(records_for_db)
 
         try:
-            rollbar.report_message(
+            reporter.report_message(
                 f"Actualización de DB (Corrección) finalizada ({len(records_for_db)} records actualizados)",
                 "success"
             )
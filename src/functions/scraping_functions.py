@@ -1,16 +1,59 @@
-import os
 from datetime import date, datetime, timedelta
 import calendar
-import rollbar
+from src.utils.rollbar_reporter import reporter
 from src.utils.constants import PATHS
+from src.utils.intermediate_format import find_range_file
 from src.gateways.scraping_gateway import (
     scrape_by_date_range,
     scrape_by_niza_class
 )
 
 DOWNLOADS_PATH = PATHS["tmp_path"]
+CASE_STATUSES = ("active", "inactive")
+NIZA_CLASSES = range(1, 45)
 
-async def run_scraping_by_year_interval(page, start_date_str, end_date_str, year_interval, case_state, logger):
+# Plan de búsquedas por fecha de radicación: (granularidad, inicio, fin, años por intervalo). Cada tramo se
+# parte lo bastante fino para no llegar al límite de 2000 resultados de SIPI; fin None = hasta hoy.
+HISTORICAL_SEGMENTS = (
+    ("years", "02/01/1900", "31/12/1970", 71),
+    ("years", "01/01/1971", "31/12/1975", 5),
+    ("years", "01/01/1976", "31/12/1980", 5),
+    ("years", "01/01/1981", "31/12/1985", 5),
+    ("years", "01/01/1986", "31/12/1986", 1),
+    ("years", "01/01/1987", "31/12/1987", 1),
+    ("years", "01/01/1988", "31/12/1988", 1),
+    ("months", "01/01/1989", "30/11/2014", None),
+    ("weeks", "01/12/2014", "31/12/2018", None),
+)
+RECENT_SEGMENTS = (
+    ("weeks", "01/01/2019", "27/12/2022", None),
+    ("days", "28/12/2022", "31/12/2022", None),
+    ("weeks", "01/01/2023", None, None),
+)
+
+def expand_case_status(case_status):
+    """'both' recorre los dos estados; 'active' o 'inactive', solo ese."""
+    case_status = case_status.strip().lower()
+    return CASE_STATUSES if case_status == "both" else (case_status,)
+
+async def scrape_range_for_statuses(page, start_str, end_str, case_state, logger, kind, skip_label, range_label=None):
+    """
+    Scrapea un rango de fechas para cada estado de 'case_state' ('both' = activas e inactivas), uno tras otro
+    en la misma página. Se omite el estado cuyo archivo de rango ya existe.
+    """
+    start_safe = start_str.replace("/", "_")
+    end_safe = end_str.replace("/", "_")
+    for state in expand_case_status(case_state):
+        tag = 'ACTIVE' if state == 'active' else 'INACTIVE'
+        output_filename = find_range_file(f'{DOWNLOADS_PATH}{start_safe}_{end_safe}_{tag}')
+        if output_filename:
+            logger.info(f"File '{output_filename}' already exists. Skipping {skip_label}.")
+        else:
+            logger.info(f"=== Scraping {kind} ({tag}): {range_label or f'{start_str} -> {end_str}'} ===")
+            await scrape_by_date_range(page, start_str, end_str, state, logger)
+
+def iter_year_intervals(start_date_str, end_date_str, year_interval):
+    """(inicio, fin) en dd/mm/AAAA de cada intervalo de 'year_interval' años entre las dos fechas."""
     start_date = datetime.strptime(start_date_str, "%d/%m/%Y")
     end_date = datetime.strptime(end_date_str, "%d/%m/%Y")
     current_date = start_date
@@ -26,21 +69,10 @@ async def run_scraping_by_year_interval(page, start_date_str, end_date_str, year
             interval_end_dt = next_start_date - timedelta(days=1)
 
         interval_end_dt = min(interval_end_dt, end_date)
-        interval_start_str = interval_start_dt.strftime("%d/%m/%Y")
-        interval_end_str = interval_end_dt.strftime("%d/%m/%Y")
-        start_safe = interval_start_str.replace("/", "_")
-        end_safe = interval_end_str.replace("/", "_")
-        tag = 'ACTIVE' if case_state.strip().lower() == 'active' else 'INACTIVE'
-        output_filename = f'{DOWNLOADS_PATH}{start_safe}_{end_safe}_{tag}.json'
-
-        if os.path.exists(output_filename):
-            logger.info(f"File '{output_filename}' already exists. Skipping interval.")
-        else:
-            logger.info(f"=== Scraping {year_interval}-year interval ({tag}): {interval_start_str} -> {interval_end_str} ===")
-            await scrape_by_date_range(page, interval_start_str, interval_end_str, case_state, logger)
+        yield interval_start_dt.strftime("%d/%m/%Y"), interval_end_dt.strftime("%d/%m/%Y")
         current_date = interval_end_dt + timedelta(days=1)
 
-async def run_scraping_by_month(page, start_date_str, end_date_str, case_state, logger):
+def iter_months(start_date_str, end_date_str):
     start_date = datetime.strptime(start_date_str, "%d/%m/%Y")
     end_date = datetime.strptime(end_date_str, "%d/%m/%Y")
     current_date = start_date
@@ -48,90 +80,124 @@ async def run_scraping_by_month(page, start_date_str, end_date_str, case_state,
         month_start_dt = datetime(current_date.year, current_date.month, 1)
         _, last_day = calendar.monthrange(current_date.year, current_date.month)
         month_end_dt = min(datetime(current_date.year, current_date.month, last_day), end_date)
-        month_start_str = month_start_dt.strftime("%d/%m/%Y")
-        month_end_str = month_end_dt.strftime("%d/%m/%Y")
-        start_safe = month_start_str.replace("/", "_")
-        end_safe = month_end_str.replace("/", "_")
-        tag = 'ACTIVE' if case_state.strip().lower() == 'active' else 'INACTIVE'
-        output_filename = f'{DOWNLOADS_PATH}{start_safe}_{end_safe}_{tag}.json'
-
-        if os.path.exists(output_filename):
-            logger.info(f"File '{output_filename}' already exists. Skipping month {current_date.strftime('%Y-%m')}.")
-        else:
-            logger.info(f"=== Scraping month ({tag}): {month_start_str} -> {month_end_str} ===")
-            await scrape_by_date_range(page, month_start_str, month_end_str, case_state, logger)
+        yield month_start_dt.strftime("%d/%m/%Y"), month_end_dt.strftime("%d/%m/%Y")
         current_date = month_end_dt + timedelta(days=1)
 
-async def run_scraping_by_week(page, start_date_str, end_date_str, case_state, logger):
+def iter_weeks(start_date_str, end_date_str):
     start_date = datetime.strptime(start_date_str, "%d/%m/%Y")
     end_date = datetime.strptime(end_date_str, "%d/%m/%Y")
     current_date = start_date
     while current_date <= end_date:
-        week_start_dt = current_date
         week_end_dt = min(current_date + timedelta(days=6), end_date)
-        week_start_str = week_start_dt.strftime("%d/%m/%Y")
-        week_end_str = week_end_dt.strftime("%d/%m/%Y")
-        start_safe = week_start_str.replace("/", "_")
-        end_safe = week_end_str.replace("/", "_")
-        tag = 'ACTIVE' if case_state.strip().lower() == 'active' else 'INACTIVE'
-        output_filename = f'{DOWNLOADS_PATH}{start_safe}_{end_safe}_{tag}.json'
-
-        if os.path.exists(output_filename):
-            logger.info(f"File '{output_filename}' already exists. Skipping week {week_start_str} - {week_end_str}.")
-        else:
-            logger.info(f"=== Scraping week ({tag}): {week_start_str} -> {week_end_str} ===")
-            await scrape_by_date_range(page, week_start_str, week_end_str, case_state, logger)
+        yield current_date.strftime("%d/%m/%Y"), week_end_dt.strftime("%d/%m/%Y")
         current_date = week_end_dt + timedelta(days=1)
 
-async def run_scraping_by_day(page, start_date_str, end_date_str, case_state, logger):
-    """
-    Scrapes data day by day for a given date range.
-    Ideal for periods with a high volume of records to avoid exceeding limits.
-    """
+def iter_days(start_date_str, end_date_str):
     start_date = datetime.strptime(start_date_str, "%d/%m/%Y")
     end_date = datetime.strptime(end_date_str, "%d/%m/%Y")
     current_date = start_date
     while current_date <= end_date:
         day_str = current_date.strftime("%d/%m/%Y")
-        day_safe = day_str.replace("/", "_")
-        tag = 'ACTIVE' if case_state.strip().lower() == 'active' else 'INACTIVE'
-        output_filename = f'{DOWNLOADS_PATH}{day_safe}_{day_safe}_{tag}.json'
-
-        if os.path.exists(output_filename):
-            logger.info(f"File '{output_filename}' already exists. Skipping day {day_str}.")
-        else:
-            logger.info(f"=== Scraping day ({tag}): {day_str} ===")
-            await scrape_by_date_range(page, day_str, day_str, case_state, logger)
-        
+        yield day_str, day_str
         current_date += timedelta(days=1)
 
+async def run_scraping_by_year_interval(page, start_date_str, end_date_str, year_interval, case_state, logger):
+    for interval_start_str, interval_end_str in iter_year_intervals(start_date_str, end_date_str, year_interval):
+        await scrape_range_for_statuses(page, interval_start_str, interval_end_str, case_state, logger, f"{year_interval}-year interval", "interval")
+
+async def run_scraping_by_month(page, start_date_str, end_date_str, case_state, logger):
+    for month_start_str, month_end_str in iter_months(start_date_str, end_date_str):
+        month_label = datetime.strptime(month_start_str, "%d/%m/%Y").strftime('%Y-%m')
+        await scrape_range_for_statuses(page, month_start_str, month_end_str, case_state, logger, "month", f"month {month_label}")
+
+async def run_scraping_by_week(page, start_date_str, end_date_str, case_state, logger):
+    for week_start_str, week_end_str in iter_weeks(start_date_str, end_date_str):
+        await scrape_range_for_statuses(page, week_start_str, week_end_str, case_state, logger, "week", f"week {week_start_str} - {week_end_str}")
+
+async def run_scraping_by_day(page, start_date_str, end_date_str, case_state, logger):
+    """
+    Scrapes data day by day for a given date range.
+    Ideal for periods with a high volume of records to avoid exceeding limits.
+    """
+    for day_str, _ in iter_days(start_date_str, end_date_str):
+        await scrape_range_for_statuses(page, day_str, day_str, case_state, logger, "day", f"day {day_str}", range_label=day_str)
+
+def iter_segment(segment, today=None):
+    """Rangos (inicio, fin) de un tramo del plan, con la misma partición que run_scraping_segment."""
+    granularity, start_date_str, end_date_str, year_interval = segment
+    end_date_str = end_date_str or (today or date.today()).strftime('%d/%m/%Y')
+    if granularity == "years":
+        return iter_year_intervals(start_date_str, end_date_str, year_interval)
+    if granularity == "months":
+        return iter_months(start_date_str, end_date_str)
+    if granularity == "weeks":
+        return iter_weeks(start_date_str, end_date_str)
+    return iter_days(start_date_str, end_date_str)
+
+def _nominal_days(granularity, start_dt, year_interval):
+    """Días de un rango completo de esa granularidad (el último de cada tramo puede quedar más corto)."""
+    if granularity == "years":
+        return round(365.25 * year_interval)
+    if granularity == "months":
+        return calendar.monthrange(start_dt.year, start_dt.month)[1]
+    return 7 if granularity == "weeks" else 1
+
+def build_scraping_plan(case_status, today=None):
+    """
+    Lista explícita de las búsquedas de una ejecución completa: las 44 clases Niza (solo activas) y cada rango
+    de HISTORICAL_SEGMENTS y RECENT_SEGMENTS por estado. El 'id' de cada tarea es el nombre base (sin carpeta
+    ni extensión) de su archivo de rango, así que es único y estable para el mismo día de referencia.
+    """
+    tasks = [
+        {"id": f"niza_{niza_class}_1900_1900_ACTIVE", "kind": "niza", "niza_class": niza_class}
+        for niza_class in NIZA_CLASSES
+    ]
+    for segment in HISTORICAL_SEGMENTS + RECENT_SEGMENTS:
+        granularity, _, _, year_interval = segment
+        for start_str, end_str in iter_segment(segment, today):
+            start_dt = datetime.strptime(start_str, "%d/%m/%Y")
+            span_days = (datetime.strptime(end_str, "%d/%m/%Y") - start_dt).days + 1
+            for state in expand_case_status(case_status):
+                tag = 'ACTIVE' if state == 'active' else 'INACTIVE'
+                tasks.append({
+                    "id": f"{start_str.replace('/', '_')}_{end_str.replace('/', '_')}_{tag}",
+                    "kind": "date_range", "granularity": granularity, "start": start_str, "end": end_str, "state": state,
+                    "span_days": span_days, "nominal_days": _nominal_days(granularity, start_dt, year_interval)
+                })
+    return tasks
+
+async def run_scraping_segment(page, segment, case_state, logger, today=None):
+    granularity, start_date_str, end_date_str, year_interval = segment
+    end_date_str = end_date_str or (today or date.today()).strftime('%d/%m/%Y')
+    if granularity == "years":
+        await run_scraping_by_year_interval(page, start_date_str, end_date_str, year_interval, case_state, logger)
+    elif granularity == "months":
+        await run_scraping_by_month(page, start_date_str, end_date_str, case_state, logger)
+    elif granularity == "weeks":
+        await run_scraping_by_week(page, start_date_str, end_date_str, case_state, logger)
+    else:
+        await run_scraping_by_day(page, start_date_str, end_date_str, case_state, logger)
+
 async def run_scraping_historical_part(page, logger, case_status, context_tag="[Scraping]"):
     """
     Ejecuta la primera parte (histórica) del scraping por fechas (1900-2014).
     """
     logger.info(f"--- Iniciando Scraping Parte 1 (Histórico) para Status: '{case_status.upper()}' ---")
     try:
-        rollbar.report_message(
+        reporter.report_message(
             f"{context_tag} Iniciando scraping Parte 1 (Histórico, Status: {case_status.upper()})", 
             "info"
         )
     except Exception as e:
         logger.warning(f"No se pudo reportar mensaje a Rollbar: {e}")
 
-    await run_scraping_by_year_interval(page, "02/01/1900", "31/12/1970", 71, case_status, logger)
-    await run_scraping_by_year_interval(page, "01/01/1971", "31/12/1975", 5, case_status, logger)
-    await run_scraping_by_year_interval(page, "01/01/1976", "31/12/1980", 5, case_status, logger)
-    await run_scraping_by_year_interval(page, "01/01/1981", "31/12/1985", 5, case_status, logger)
-    await run_scraping_by_year_interval(page, "01/01/1986", "31/12/1986", 1, case_status, logger)
-    await run_scraping_by_year_interval(page, "01/01/1987", "31/12/1987", 1, case_status, logger)
-    await run_scraping_by_year_interval(page, "01/01/1988", "31/12/1988", 1, case_status, logger)
-    await run_scraping_by_month(page, "01/01/1989", "30/11/2014", case_status, logger)
-    await run_scraping_by_week(page, "01/12/2014", "31/12/2018", case_status, logger)
+    for segment in HISTORICAL_SEGMENTS:
+        await run_scraping_segment(page, segment, case_status, logger)
     
     logger.info("--- Scraping Parte 1 (Histórico) FINALIZADO ---")
 
     try:
-        rollbar.report_message(
+        reporter.report_message(
             f"{context_tag} Finalizado scraping Parte 1 (Histórico, Status: {case_status.upper()})", 
             "info"
         )
@@ -143,24 +209,22 @@ async def run_scraping_recent_part(page, logger, case_status, context_tag="[Scra
     Ejecuta la segunda parte (reciente y más intensiva) del scraping por fechas (2014-Presente).
     """
     logger.info(f"--- Iniciando Scraping Parte 2 (Reciente) para Status: '{case_status.upper()}' ---")
-    current_date = date.today().strftime('%d/%m/%Y')
-    
+
     try:
-        rollbar.report_message(
+        reporter.report_message(
             f"{context_tag} Iniciando scraping Parte 2 (Reciente, Status: {case_status.upper()})", 
             "info"
         )
     except Exception as e:
         logger.warning(f"No se pudo reportar mensaje a Rollbar: {e}")
 
-    await run_scraping_by_week(page, "01/01/2019", "27/12/2022", case_status, logger)
-    await run_scraping_by_day(page, "28/12/2022", "31/12/2022", case_status, logger)
-    await run_scraping_by_week(page, "01/01/2023", current_date, case_status, logger)
+    for segment in RECENT_SEGMENTS:
+        await run_scraping_segment(page, segment, case_status, logger)
     
     logger.info("--- Scraping Parte 2 (Reciente) FINALIZADO ---")
 
     try:
-        rollbar.report_message(
+        reporter.report_message(
             f"{context_tag} Finalizado scraping Parte 2 (Reciente, Status: {case_status.upper()})", 
             "info"
         )
@@ -182,23 +246,37 @@ async def run_full_scraping_process(page, logger, case_status):
     logger.info("========== DATE-BASED SCRAPING FINISHED ==========")
     logger.info("=======================================================")
 
+async def scrape_niza_class_if_missing(page, niza_class, logger):
+    output_filename = find_range_file(f'{DOWNLOADS_PATH}niza_{niza_class}_1900_1900_ACTIVE')
+    if output_filename:
+        logger.info(f"File '{output_filename}' already exists. Skipping Niza class {niza_class}.")
+    else:
+        logger.info(f"=== Scraping Niza Class ({'ACTIVE'}): {niza_class} ===")
+        await scrape_by_niza_class(page, niza_class, logger)
+
 async def run_niza_class_scraping(page, logger, context_tag="[Scraping]"):
     """Executes scraping for all Niza classes (1-44)."""
 
     try:
-        rollbar.report_message(f"{context_tag} Iniciando scraping por Niza class (1-45)", "info")
+        reporter.report_message(f"{context_tag} Iniciando scraping por Niza class (1-45)", "info")
     except Exception as e:
         logger.warning(f"No se pudo reportar mensaje a Rollbar: {e}")
 
-    for niza_class in range(1, 45):
-        output_filename = f'{DOWNLOADS_PATH}niza_{niza_class}_1900_1900_ACTIVE.json'
-        if os.path.exists(output_filename):
-            logger.info(f"File '{output_filename}' already exists. Skipping Niza class {niza_class}.")
-        else:
-            logger.info(f"=== Scraping Niza Class ({'ACTIVE'}): {niza_class} ===")
-            await scrape_by_niza_class(page, niza_class, logger)
+    for niza_class in NIZA_CLASSES:
+        await scrape_niza_class_if_missing(page, niza_class, logger)
 
     try:
-        rollbar.report_message(f"{context_tag} Scraping por Niza class finalizado con éxito", "info")
+        reporter.report_message(f"{context_tag} Scraping por Niza class finalizado con éxito", "info")
     except Exception as e:
-        logger.warning(f"No se pudo reportar mensaje a Rollbar: {e}")
\ No newline at end of file
+        logger.warning(f"No se pudo reportar mensaje a Rollbar: {e}")
+
+async def run_scraping_tasks(page, tasks, logger):
+    """Ejecuta en orden una lista de tareas de build_scraping_plan (p. ej. las de un shard), omitiendo las ya scrapeadas."""
+    for task in tasks:
+        if task["kind"] == "niza":
+            await scrape_niza_class_if_missing(page, task["niza_class"], logger)
+        else:
+            await scrape_range_for_statuses(
+                page, task["start"], task["end"], task["state"], logger,
+                task["granularity"][:-1], f"{task['granularity'][:-1]} {task['start']} - {task['end']}"
+            )
@@ -1,26 +1,44 @@
 import asyncio
 import pathlib
+import time
 import shutil
 import os
-import rollbar
-import multiprocessing
+from datetime import date, datetime
+from src.utils.rollbar_reporter import reporter
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright
 from src.functions.scraping_functions import (
+    build_scraping_plan,
     run_niza_class_scraping, 
     run_scraping_historical_part, 
-    run_scraping_recent_part
+    run_scraping_recent_part,
+    run_scraping_tasks
 )
-from src.functions.etl_functions import run_full_etl_process, run_verification_and_correction
-from src.utils.constants import PATHS
-from src.utils.logging_config import setup_logging
+from src.utils.constants import PATHS, SHARD_SETTINGS
+from src.utils.sharding import (
+    SharedLocation,
+    MARKERS_FOLDER,
+    assign_shards,
+    collect_shards,
+    complete_shard,
+    estimate_task_cost,
+    marker_name,
+    plan_fingerprint
+)
+from src.utils.intermediate_format import get_output_format
+from src.utils.snapshot import create_snapshot, restore_snapshot
+from src.utils.logging_config import setup_logging, get_log_queue
+from src.utils.metrics import metrics, collect_run_metrics
+from src.utils.profiling import profile_process
+from src.utils.process_context import get_worker_context
 
 
-def _scrape_worker_1(case_status):
+def _scrape_worker_1(case_status, log_queue=None):
     """
     Worker Proceso 1: Ejecuta Niza + Scraping Histórico (1900-2014).
     """
-    logger = setup_logging()
+    logger = setup_logging(log_queue)
+    metrics.reset()
     logger.info("--- [Proceso 1] INICIANDO (Niza + Fechas Históricas) ---")
     
     async def worker_1_main_tasks():
@@ -47,21 +65,25 @@ def _scrape_worker_1(case_status):
                 logger.info("--- [Proceso 1] Navegador Chromium cerrado. ---")
 
     try:
-        asyncio.run(worker_1_main_tasks())
+        with profile_process("worker_1", logger):
+            asyncio.run(worker_1_main_tasks())
         logger.info("--- [Proceso 1] FINALIZADO (Niza + Fechas Históricas) ---")
         
     except Exception as e:
         logger.critical(f"--- [Proceso 1] FALLÓ: {e}", exc_info=True)
         try:
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
         except Exception as re:
             logger.error(f"No se pudo reportar excepción de Proceso 1 a Rollbar: {re}")
+    finally:
+        metrics.dump(os.path.join(PATHS["metrics_dumps_path"], "worker_1.json"))
 
-def _scrape_worker_2(case_status):
+def _scrape_worker_2(case_status, log_queue=None):
     """
     Worker Proceso 2: Ejecuta Scraping Reciente (2019-Presente).
     """
-    logger = setup_logging()
+    logger = setup_logging(log_queue)
+    metrics.reset()
     logger.info(f"--- [Proceso 2] INICIANDO (Fechas Recientes, Status: {case_status}) ---")
     
     async def worker_2_main_task():
@@ -82,16 +104,133 @@ def _scrape_worker_2(case_status):
                 logger.info("--- [Proceso 2] Navegador Chromium cerrado. ---")
 
     try:
-        asyncio.run(worker_2_main_task())
+        with profile_process("worker_2", logger):
+            asyncio.run(worker_2_main_task())
         logger.info("--- [Proceso 2] FINALIZADO (Fechas Recientes) ---")
         
     except Exception as e:
         logger.critical(f"--- [Proceso 2] FALLÓ: {e}", exc_info=True)
         try:
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
         except Exception as re:
             logger.error(f"No se pudo reportar excepción de Proceso 2 a Rollbar: {re}")
+    finally:
+        metrics.dump(os.path.join(PATHS["metrics_dumps_path"], "worker_2.json"))
+
+def _scrape_tasks_worker(tasks, worker_name, log_queue=None):
+    """
+    Worker de un shard: ejecuta en un navegador propio su parte de las tareas del plan.
+    """
+    logger = setup_logging(log_queue)
+    metrics.reset()
+    logger.info(f"--- [{worker_name}] INICIANDO ({len(tasks)} tareas) ---")
+
+    async def tasks_main():
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            context = await browser.new_context(
+                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117 Safari/537.36",
+                viewport={"width": 1280, "height": 900}
+            )
+            page = await context.new_page()
+            logger.info(f"--- [{worker_name}] Navegador Chromium iniciado. ---")
+
+            try:
+                await run_scraping_tasks(page, tasks, logger)
+            finally:
+                await browser.close()
+                logger.info(f"--- [{worker_name}] Navegador Chromium cerrado. ---")
+
+    try:
+        with profile_process(worker_name, logger):
+            asyncio.run(tasks_main())
+        logger.info(f"--- [{worker_name}] FINALIZADO ---")
+
+    except Exception as e:
+        logger.critical(f"--- [{worker_name}] FALLÓ: {e}", exc_info=True)
+        try:
+            reporter.report_exc_info()
+        except Exception as re:
+            logger.error(f"No se pudo reportar excepción de {worker_name} a Rollbar: {re}")
+    finally:
+        metrics.dump(os.path.join(PATHS["metrics_dumps_path"], f"{worker_name}.json"))
+
+
+def _run_etl_and_verification(logger):
+    # Import diferido: pandas, psycopg2 y boto3 solo los necesita el proceso principal en esta fase,
+    # no los workers de scraping.
+    from src.functions.etl_functions import run_full_etl_process, run_verification_and_correction
+
+    logger.info("Iniciando proceso ETL principal (actualización de BD)...")
+    with metrics.timer("run_stage_seconds", stage="etl"):
+        run_full_etl_process(logger)
+    logger.info("Proceso ETL principal finalizado.")
 
+    logger.info("Iniciando proceso de verificación y corrección...")
+    
+    async def verification_task():
+        await run_verification_and_correction(logger)
+        
+    with metrics.timer("run_stage_seconds", stage="verification"), profile_process("verification", logger):
+        asyncio.run(verification_task())
+    logger.info("Proceso de verificación y corrección finalizado.")
+
+def _clear_metrics_dumps(logger):
+    """
+    Borra los volcados de métricas de los workers que dejó una ejecución anterior sin terminar (tmp/ se
+    conserva para reanudar), para no sumarlos a los de esta ejecución.
+    """
+    dumps_folder = PATHS["metrics_dumps_path"]
+    if os.path.isdir(dumps_folder):
+        shutil.rmtree(dumps_folder, ignore_errors=True)
+        logger.info(f"Volcados de métricas de una ejecución anterior eliminados de '{dumps_folder}'.")
+
+def _write_run_metrics(logger, **extra):
+    try:
+        collect_run_metrics(PATHS["metrics_dumps_path"], os.getenv("METRICS_DIR", PATHS["metrics_output_path"]), logger, **extra)
+    except Exception as e:
+        logger.error(f"No se pudieron escribir las métricas de la ejecución: {e}")
+
+def _remove_tmp_folder(logger, tmp_folder, completed=True):
+    if not completed:
+        # Se conservan los rangos scrapeados y el ledger del ETL para que la siguiente ejecución reanude.
+        logger.warning(f"La ejecución no terminó: se conserva '{tmp_folder}' para reanudar el scraping y el ETL.")
+        return
+    try:
+        if os.path.exists(tmp_folder):
+            shutil.rmtree(tmp_folder)
+            logger.info(f"Carpeta temporal '{tmp_folder}' y todo su contenido han sido eliminados.")
+    except OSError as e:
+        logger.error(f"Error eliminando carpeta '{tmp_folder}': {e.strerror}")
+
+def run_replay_process(logger, snapshot):
+    """
+    Ejecuta el ETL y la verificación a partir de un snapshot archivado (ruta local o s3://),
+    sin volver a scrapear SIPI. Pensado para pruebas de rendimiento reproducibles.
+    No se ejecuta si tmp/ tiene contenido (p. ej. una sincronización sin terminar que se conserva para
+    reanudar); al acabar solo se borra tmp/ si lo llenó el propio replay.
+    """
+    TMP_FOLDER = PATHS["tmp_path"]
+    restored = False
+    completed = False
+    try:
+        _clear_metrics_dumps(logger)
+        logger.info(f"Proceso de replay iniciado desde el snapshot '{snapshot}'.")
+        manifest = restore_snapshot(snapshot, TMP_FOLDER, logger)
+        restored = True
+        logger.info(f"Snapshot creado el {manifest['created_at']} (Status: {manifest['case_status'].upper()}, {len(manifest['files'])} archivos).")
+
+        _run_etl_and_verification(logger)
+        logger.info(f"Proceso de replay finalizado con ÉXITO para el snapshot '{snapshot}'.")
+        completed = True
+    finally:
+        _write_run_metrics(logger, mode="replay", snapshot=snapshot)
+        if restored:
+            # Todo lo que hay en tmp/ lo creó este replay, que se puede repetir desde el snapshot: se borra
+            # también si falla, para no dejar sus rangos y su ledger a una sincronización posterior.
+            if not completed:
+                logger.warning(f"El replay no terminó: se eliminan los archivos restaurados en '{TMP_FOLDER}'.")
+            _remove_tmp_folder(logger, TMP_FOLDER)
 
 def run_sync_process(logger, case_status):
     """
@@ -99,14 +238,19 @@ def run_sync_process(logger, case_status):
     incluyendo configuración, ejecución paralela y limpieza.
     """
     TMP_FOLDER = PATHS["tmp_path"]
+    completed = False
     try:
+        _clear_metrics_dumps(logger)
+        logger.info(f"Formato intermedio de los rangos: {get_output_format()}.")
         pathlib.Path(TMP_FOLDER).mkdir(exist_ok=True)
         logger.info(f"Carpeta temporal '{TMP_FOLDER}' creada o ya existe.")
 
         logger.info(f"Proceso de sync iniciado para status: {case_status.upper()}")
+        if case_status.strip().lower() == "both":
+            logger.info("Modo 'both': cada rango se scrapea como activas e inactivas en la misma sesión del navegador; el ETL y la verificación se ejecutan una sola vez sobre ambos.")
 
         try:
-            rollbar.report_message(
+            reporter.report_message(
                 f"Proceso de sync iniciado (Status: {case_status.upper()})", 
                 "info"
             )
@@ -115,18 +259,20 @@ def run_sync_process(logger, case_status):
 
         logger.info("Iniciando procesos de scraping en paralelo (divididos)...")
         
-        process1 = multiprocessing.Process(
+        worker_context = get_worker_context()
+        process1 = worker_context.Process(
             target=_scrape_worker_1,
-            args=(case_status,),
+            args=(case_status, get_log_queue()),
             name="Worker-1"
         )
-        process2 = multiprocessing.Process(
+        process2 = worker_context.Process(
             target=_scrape_worker_2,
-            args=(case_status,),
+            args=(case_status, get_log_queue()),
             name="Worker-2"
         )
 
         # Iniciar ambos procesos
+        scraping_start = time.perf_counter()
         process1.start()
         process2.start()
 
@@ -135,25 +281,25 @@ def run_sync_process(logger, case_status):
         logger.info("--- Proceso 1 (Niza + Histórico) ha finalizado. ---")
         process2.join()
         logger.info("--- Proceso 2 (Reciente) ha finalizado. ---")
+        metrics.observe("run_stage_seconds", time.perf_counter() - scraping_start, stage="scraping")
 
         logger.info("Ambos procesos de scraping han terminado.")
 
-        logger.info("Iniciando proceso ETL principal (actualización de BD)...")
-        run_full_etl_process(logger)
-        logger.info("Proceso ETL principal finalizado.")
+        snapshot_destination = os.getenv("SNAPSHOT_DEST")
+        if snapshot_destination:
+            try:
+                create_snapshot(TMP_FOLDER, snapshot_destination, case_status, logger)
+            except Exception as e:
+                logger.error(f"No se pudo archivar el snapshot de los rangos scrapeados: {e}")
+                reporter.report_exc_info()
 
-        logger.info("Iniciando proceso de verificación y corrección...")
-        
-        async def verification_task():
-            await run_verification_and_correction(logger)
-            
-        asyncio.run(verification_task())
-        logger.info("Proceso de verificación y corrección finalizado.")
+        _run_etl_and_verification(logger)
+        completed = True
 
         logger.info(f"Proceso de sync finalizado con ÉXITO para status: {case_status.upper()}")
         
         try:
-            rollbar.report_message(
+            reporter.report_message(
                 f"Proceso de sync finalizado con ÉXITO (Status: {case_status.upper()})", 
                 "info"
             )
@@ -161,9 +307,89 @@ def run_sync_process(logger, case_status):
             logger.warning(f"No se pudo reportar mensaje a Rollbar: {e}")
 
     finally:
-        try:
-            if os.path.exists(TMP_FOLDER):
-                shutil.rmtree(TMP_FOLDER)
-                logger.info(f"Carpeta temporal '{TMP_FOLDER}' y todo su contenido han sido eliminados.")
-        except OSError as e:
-            logger.error(f"Error eliminando carpeta '{TMP_FOLDER}': {e.strerror}")
\ No newline at end of file
+        _write_run_metrics(logger, mode="sync", case_status=case_status)
+        _remove_tmp_folder(logger, TMP_FOLDER, completed)
+
+def _shard_plan_date():
+    """Día de referencia del plan (SHARD_PLAN_DATE, dd/mm/AAAA; hoy si no se define). Debe ser el mismo en todos los nodos."""
+    value = os.getenv("SHARD_PLAN_DATE", "").strip()
+    return datetime.strptime(value, "%d/%m/%Y").date() if value else date.today()
+
+def run_shard_process(logger, case_status, shard, shards, task_runner=_scrape_tasks_worker):
+    """
+    Scrapea solo las tareas del plan asignadas al shard 'shard' de 'shards' y sube sus archivos de rangos y su
+    marca de finalización a SHARD_DEST. No ejecuta el ETL: de eso se encarga run_merge_process cuando terminan
+    todos los shards. 'task_runner(tasks, worker_name, log_queue)' es el target de cada proceso worker.
+    """
+    TMP_FOLDER = PATHS["tmp_path"]
+    completed = False
+    try:
+        _clear_metrics_dumps(logger)
+        logger.info(f"Formato intermedio de los rangos: {get_output_format()}.")
+        pathlib.Path(TMP_FOLDER).mkdir(exist_ok=True)
+        plan = build_scraping_plan(case_status, _shard_plan_date())
+        fingerprint = plan_fingerprint(plan, shards)
+        tasks = assign_shards(plan, shards)[shard - 1]
+        location = SharedLocation(os.getenv("SHARD_DEST", PATHS["shards_path"]), logger)
+
+        marker = location.get_json(MARKERS_FOLDER, marker_name(shard, shards))
+        if marker and marker["plan_fingerprint"] == fingerprint:
+            logger.info(f"Shard {shard}/{shards} ya completado el {marker['completed_at']} (plan {fingerprint}). No se repite.")
+            completed = True
+            return
+
+        logger.info(
+            f"Shard {shard}/{shards} (plan {fingerprint}, Status: {case_status.upper()}): {len(tasks)} de {len(plan)} tareas, "
+            f"coste estimado {sum(map(estimate_task_cost, tasks))} de {sum(map(estimate_task_cost, plan))} páginas."
+        )
+        worker_tasks = [group for group in assign_shards(tasks, int(os.getenv("SHARD_WORKERS", SHARD_SETTINGS["workers"]))) if group]
+        worker_context = get_worker_context()
+        processes = [
+            worker_context.Process(
+                target=task_runner,
+                args=(group, f"shard_{shard}_worker_{index}", get_log_queue()),
+                name=f"Worker-{index}"
+            )
+            for index, group in enumerate(worker_tasks, start=1)
+        ]
+
+        scraping_start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        metrics.observe("run_stage_seconds", time.perf_counter() - scraping_start, stage="scraping")
+        logger.info(f"Los {len(processes)} procesos de scraping del shard {shard}/{shards} han terminado.")
+
+        complete_shard(location, shard, shards, tasks, fingerprint, TMP_FOLDER, case_status, logger)
+        completed = True
+        logger.info(f"Shard {shard}/{shards} finalizado con ÉXITO.")
+    finally:
+        _write_run_metrics(logger, mode="shard", case_status=case_status, shard=f"{shard}/{shards}")
+        _remove_tmp_folder(logger, TMP_FOLDER, completed)
+
+def run_merge_process(logger, case_status, shards):
+    """
+    Espera a que los 'shards' shards de SHARD_DEST hayan terminado con el mismo plan que calcula este nodo
+    (case_status y SHARD_PLAN_DATE), reúne sus archivos de rangos en tmp/ y ejecuta una sola vez el ETL y la
+    verificación sobre todos ellos. Las marcas de otro plan se ignoran hasta que el shard las sobrescriba.
+    """
+    TMP_FOLDER = PATHS["tmp_path"]
+    completed = False
+    try:
+        _clear_metrics_dumps(logger)
+        fingerprint = plan_fingerprint(build_scraping_plan(case_status, _shard_plan_date()), shards)
+        location = SharedLocation(os.getenv("SHARD_DEST", PATHS["shards_path"]), logger)
+        logger.info(f"Proceso de merge iniciado para {shards} shards en '{location.destination}' (plan {fingerprint}, Status: {case_status.upper()}).")
+        collect_shards(
+            location, shards, fingerprint, TMP_FOLDER, logger,
+            timeout_seconds=int(os.getenv("SHARD_MERGE_TIMEOUT", SHARD_SETTINGS["merge_timeout_seconds"])),
+            poll_seconds=float(os.getenv("SHARD_POLL_SECONDS", SHARD_SETTINGS["poll_seconds"]))
+        )
+
+        _run_etl_and_verification(logger)
+        completed = True
+        logger.info(f"Proceso de merge finalizado con ÉXITO para {shards} shards.")
+    finally:
+        _write_run_metrics(logger, mode="merge", case_status=case_status, shards=shards)
+        _remove_tmp_folder(logger, TMP_FOLDER, completed)
@@ -1,40 +1,151 @@
 import os
+import uuid
+import numpy as np
 import pandas as pd
 import psycopg2
 import psycopg2.extras
 from datetime import datetime
-import rollbar
+from src.utils.constants import ETL_SETTINGS
+from src.utils.rollbar_reporter import reporter
+from src.utils.metrics import metrics
+
+DB_COLUMNS = ["request_number", "registry_number", "denomination", "logo_url", "filing_date", "expiration_date", "status", "holder", "niza_class", "gazette_number"]
+
+class DatabaseWriteError(Exception):
+    """A write of the ETL could not be committed (it was rolled back). The batch must not be counted or marked as saved."""
 
 class DatabaseManager:
     """Class to manage all interactions with the PostgreSQL database."""
-    def __init__(self, db_params, table_name, logger):
+    def __init__(self, db_params, table_name, logger, itersize=ETL_SETTINGS["db_itersize"]):
         self.db_params = db_params
         self.table_name = table_name
         self.logger = logger
+        self.itersize = itersize
+        self._column_types = None
         self.ACTIVE_STATES = (
             "EXAMEN_DE_FORMA", "SUSPENDIDA", "EN_GACETA", "EXAMEN_DE_FONDO",
             "OPOSICION", "CERTIFICADA_Y_ENVIADA", "IRREGULAR", "VIGENTE", "PROTEGIDA"
         )
 
+    def _iter_query_chunks(self, query, params=None, itersize=None):
+        """
+        Runs 'query' on a named (server-side) cursor and yields lists of at most 'itersize' rows,
+        so only one chunk is held in memory at a time. The connection is closed when the generator
+        is exhausted or closed.
+        """
+        itersize = itersize or self.itersize
+        conn = psycopg2.connect(**self.db_params)
+        try:
+            with conn.cursor(name=f"colombia_stream_{uuid.uuid4().hex}") as cur:
+                cur.itersize = itersize
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(itersize)
+                    if not rows:
+                        break
+                    metrics.inc("db_rows_streamed_total", len(rows))
+                    yield rows
+            conn.commit()
+        finally:
+            conn.close()
+
+    def iter_active_request_numbers(self, itersize=None):
+        """Yields the active 'request_number' values, ordered, as numpy object arrays of at most 'itersize' items."""
+        query = f'SELECT "request_number" FROM {self.table_name} WHERE "status" IN %s ORDER BY "request_number";'
+        for rows in self._iter_query_chunks(query, (self.ACTIVE_STATES,), itersize):
+            yield np.array([row[0] for row in rows], dtype=object)
+
+    def iter_records(self, itersize=None, columns=None):
+        """Yields the Colombia records as DataFrames of at most 'itersize' rows (server-side cursor)."""
+        columns = columns or DB_COLUMNS
+        columns_str = ", ".join([f'"{col}"' for col in columns])
+        query = f"SELECT {columns_str} FROM {self.table_name} WHERE badger_country = 'COLOMBIA';"
+        for rows in self._iter_query_chunks(query, None, itersize):
+            yield pd.DataFrame.from_records(rows, columns=columns)
+
+    @metrics.timed("db_operation_seconds", operation="fetch_active")
     def fetch_active_request_numbers(self):
-        """Fetches all 'request_number' with an active status from the DB."""
+        """Fetches all 'request_number' with an active status from the DB. Prefer 'iter_active_request_numbers' for full-table scans."""
         self.logger.info(f"Fetching active 'request_number' from '{self.table_name}'...")
+        try:
+            results = {req_num for chunk in self.iter_active_request_numbers() for req_num in chunk}
+            self.logger.info(f"Fetched {len(results)} active records from the database.")
+            return results
+        except Exception as e:
+            self.logger.critical(f"CRITICAL error fetching active 'request_numbers': {e}")
+            reporter.report_exc_info()
+            return set()
+
+    def status_request_number_index_name(self):
+        return f"{self.table_name.replace('.', '_')}_status_request_number_idx".lower()
+
+    def check_status_request_number_index(self):
+        """
+        Checks (read-only) that the ("status", "request_number") index used by the verification anti-join exists
+        and is valid. It is not created here: see the migration in the README. Returns True if it is usable.
+        """
+        index_name = self.status_request_number_index_name()
         conn = None
         try:
             conn = psycopg2.connect(**self.db_params)
             with conn.cursor() as cur:
-                query = f'SELECT "request_number" FROM {self.table_name} WHERE "status" IN %s;'
-                cur.execute(query, (self.ACTIVE_STATES,))
-                results = {row[0] for row in cur.fetchall()}
-                self.logger.info(f"Fetched {len(results)} active records from the database.")
-                return results
+                cur.execute("SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = %s;", (index_name,))
+                row = cur.fetchone()
+            if row is None:
+                self.logger.warning(f"Index '{index_name}' does not exist: the anti-join will scan '{self.table_name}'. Create it with the migration in the README.")
+                return False
+            if not row[0]:
+                self.logger.warning(f"Index '{index_name}' is INVALID (interrupted build): drop and rebuild it with the migration in the README.")
+                return False
+            return True
         except Exception as e:
-            self.logger.critical(f"CRITICAL error fetching active 'request_numbers': {e}")
-            rollbar.report_exc_info()
-            return set()
+            self.logger.warning(f"Could not check index '{index_name}': {e}")
+            return False
+        finally:
+            if conn: conn.close()
+
+    @metrics.timed("db_operation_seconds", operation="missing_anti_join")
+    def export_missing_active_request_numbers(self, keys_file_path, output_csv_path):
+        """
+        Bulk-loads the scraped request_numbers (one per line) into a temporary table with COPY and
+        streams the active DB records that are not among them straight into a CSV.
+        Returns the number of missing records, or None if the comparison could not be made.
+        """
+        self.check_status_request_number_index()
+        self.logger.info(f"Comparing active records in '{self.table_name}' against '{keys_file_path}' in the database...")
+        conn = None
+        try:
+            conn = psycopg2.connect(**self.db_params)
+            with conn.cursor() as cur:
+                cur.execute('CREATE TEMP TABLE scraped_request_numbers ("request_number" text) ON COMMIT DROP;')
+                with open(keys_file_path, "r", encoding="utf-8") as keys_file:
+                    cur.copy_expert('COPY scraped_request_numbers ("request_number") FROM STDIN;', keys_file)
+                cur.execute('CREATE INDEX ON scraped_request_numbers ("request_number"); ANALYZE scraped_request_numbers;')
+
+                missing_query = cur.mogrify(
+                    f'SELECT t."request_number" AS "missing_request_number" FROM {self.table_name} t '
+                    f'WHERE t."status" IN %s AND NOT EXISTS ('
+                    f'SELECT 1 FROM scraped_request_numbers s WHERE s."request_number" = t."request_number") '
+                    f'ORDER BY 1',
+                    (self.ACTIVE_STATES,)
+                ).decode("utf-8")
+                with open(output_csv_path, "w", encoding="utf-8") as csv_file:
+                    cur.copy_expert(f"COPY ({missing_query}) TO STDOUT WITH (FORMAT csv, HEADER true);", csv_file)
+                conn.commit()
+
+            with open(output_csv_path, "r", encoding="utf-8") as csv_file:
+                missing_count = max(sum(1 for _ in csv_file) - 1, 0)
+            self.logger.info(f"Found {missing_count} active records missing from the scraped set.")
+            return missing_count
+        except Exception as e:
+            self.logger.error(f"Error computing missing active records in the database: {e}")
+            reporter.report_exc_info()
+            if conn: conn.rollback()
+            return None
         finally:
             if conn: conn.close()
 
+    @metrics.timed("db_operation_seconds", operation="update_statuses")
     def update_record_statuses(self, records_to_update):
         """Updates the status of a list of records in the DB."""
         if not records_to_update:
@@ -59,19 +170,19 @@ class DatabaseManager:
                 self.logger.info(f"Successfully completed update of {len(data_tuples)} statuses.")
         except Exception as e:
             self.logger.error(f"Error updating statuses in the database: {e}")
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
             if conn: conn.rollback()
         finally:
             if conn: conn.close()
 
+    @metrics.timed("db_operation_seconds", operation="fetch")
     def fetch_records_by_request_numbers(self, request_numbers_list):
         """Busca en la BD solo los registros que coinciden con la lista de request_numbers."""
         if not request_numbers_list:
             self.logger.info("fetch_records_by_request_numbers recibió una lista vacía. Saltando consulta.")
             return pd.DataFrame()
             
-        columns_to_fetch = ["request_number", "registry_number", "denomination", "logo_url", "filing_date", "expiration_date", "status", "holder", "niza_class", "gazette_number"]
-        columns_str = ", ".join([f'"{col}"' for col in columns_to_fetch])
+        columns_str = ", ".join([f'"{col}"' for col in DB_COLUMNS])
         self.logger.info(f"Buscando {len(request_numbers_list)} registros específicos en la DB...")
         conn = None
         try:
@@ -83,33 +194,29 @@ class DatabaseManager:
             return df
         except Exception as e:
             self.logger.error(f"Error buscando registros por lista: {e}", exc_info=True)
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
             return pd.DataFrame()
         finally:
             if conn: conn.close()
 
+    @metrics.timed("db_operation_seconds", operation="fetch_all")
     def fetch_all_records(self):
         """
-        ¡ADVERTENCIA! Esta función puede causar OOM (Out-of-Memory) si la tabla es muy grande.
-        Usar 'fetch_records_by_request_numbers' en su lugar para ETL en lotes.
+        ¡ADVERTENCIA! Materializa toda la tabla en un único DataFrame y puede causar OOM si es muy grande.
+        Usar 'iter_records' (por bloques) o 'fetch_records_by_request_numbers' para ETL en lotes.
         """
-        columns_to_fetch = ["request_number", "registry_number", "denomination", "logo_url", "filing_date", "expiration_date", "status", "holder", "niza_class", "gazette_number"]
-        columns_str = ", ".join([f'"{col}"' for col in columns_to_fetch])
         self.logger.info(f"Step 2: Connecting to DB and fetching ALL data from '{self.table_name}'...")
-        conn = None
         try:
-            conn = psycopg2.connect(**self.db_params)
-            query = f"SELECT {columns_str} FROM {self.table_name} WHERE badger_country = 'COLOMBIA';"
-            df = pd.read_sql_query(query, conn)
+            chunks = list(self.iter_records())
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=DB_COLUMNS)
             self.logger.info(f"Fetched {len(df)} records from the database.")
             return df
         except Exception as e:
             self.logger.critical(f"CRITICAL error connecting to or fetching data from the database: {e}")
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
             return pd.DataFrame()
-        finally:
-            if conn: conn.close()
 
+    @metrics.timed("db_operation_seconds", operation="insert")
     def insert_records(self, df_to_insert):
         if df_to_insert.empty:
             self.logger.info("Step 5.1: No new records to insert.")
@@ -129,11 +236,117 @@ class DatabaseManager:
                 self.logger.info("Insertion completed successfully.")
         except Exception as e:
             self.logger.error(f"Error inserting into the database: {e}")
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
+            if conn: conn.rollback()
+            raise DatabaseWriteError(f"Could not insert {len(df_to_insert)} records.") from e
+        finally:
+            if conn: conn.close()
+
+    def _get_column_types(self, cur):
+        """Column name -> SQL type of the table (cached), used to type the VALUES of set-based updates."""
+        if self._column_types is None:
+            cur.execute(
+                "SELECT a.attname, format_type(a.atttypid, a.atttypmod) FROM pg_attribute a "
+                "WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped;",
+                (self.table_name,)
+            )
+            self._column_types = dict(cur.fetchall())
+        return self._column_types
+
+    @metrics.timed("db_operation_seconds", operation="update_columns")
+    def update_changed_columns(self, df_to_update, changed_columns, touch_columns=("updated_at",), page_size=1000):
+        """
+        Writes only 'changed_columns' (plus 'touch_columns', e.g. updated_at) for the rows of df_to_update,
+        which must contain 'request_number' and those columns, with one set-based
+        UPDATE ... FROM (VALUES ...). Rows whose changed columns already hold the same values are
+        skipped, so they do not create dead tuples. Returns the number of updated rows; raises DatabaseWriteError
+        (after rolling back) if the update fails.
+        """
+        if df_to_update.empty or not changed_columns:
+            return 0
+        touch_columns = [col for col in touch_columns if col in df_to_update.columns and col not in changed_columns]
+        columns = ["request_number", *changed_columns, *touch_columns]
+        conn = None
+        try:
+            conn = psycopg2.connect(**self.db_params)
+            with conn.cursor() as cur:
+                column_types = self._get_column_types(cur)
+                template = "(" + ", ".join(f"%s::{column_types.get(col, 'text')}" for col in columns) + ")"
+                columns_str = ", ".join(f'"{col}"' for col in columns)
+                set_clause = ", ".join(f'"{col}" = v."{col}"' for col in [*changed_columns, *touch_columns])
+                distinct_clause = " OR ".join(f't."{col}" IS DISTINCT FROM v."{col}"' for col in changed_columns)
+                update_query = (
+                    f"UPDATE {self.table_name} AS t SET {set_clause} "
+                    f"FROM (VALUES %s) AS v ({columns_str}) "
+                    f'WHERE t."request_number" = v."request_number" AND ({distinct_clause});'
+                )
+                data_tuples = [tuple(row) for row in df_to_update[columns].itertuples(index=False, name=None)]
+                updated = 0
+                for start in range(0, len(data_tuples), page_size):
+                    psycopg2.extras.execute_values(cur, update_query, data_tuples[start:start + page_size], template=template, page_size=page_size)
+                    updated += cur.rowcount
+                conn.commit()
+                metrics.inc("db_rows_updated_total", updated)
+                metrics.inc("db_rows_update_skipped_total", len(data_tuples) - updated)
+                return updated
+        except Exception as e:
+            self.logger.error(f"Error updating columns {list(changed_columns)} in the database: {e}")
+            reporter.report_exc_info()
+            if conn: conn.rollback()
+            raise DatabaseWriteError(f"Could not update columns {list(changed_columns)} of {len(df_to_update)} records.") from e
+        finally:
+            if conn: conn.close()
+
+    @metrics.timed("db_operation_seconds", operation="upsert")
+    def upsert_records(self, df_to_upsert, compare_columns, page_size=1000):
+        """
+        INSERT ... ON CONFLICT ("request_number") DO UPDATE for every row of df_to_upsert, without a prior
+        SELECT. Existing rows are only rewritten when one of 'compare_columns' differs; their 'id' is kept.
+        Returns a list of (request_number, inserted, changed_columns) for the rows actually written; raises
+        DatabaseWriteError (after rolling back) on error. Requires a unique constraint on "request_number".
+        """
+        if df_to_upsert.empty:
+            return []
+        columns = df_to_upsert.columns.tolist()
+        compare_columns = [col for col in compare_columns if col in columns and col != "request_number"]
+        conn = None
+        try:
+            conn = psycopg2.connect(**self.db_params)
+            with conn.cursor() as cur:
+                column_types = self._get_column_types(cur)
+                template = "(" + ", ".join(f"%s::{column_types.get(col, 'text')}" for col in columns) + ")"
+                columns_str = ", ".join(f'"{col}"' for col in columns)
+                set_clause = ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in columns if col not in ("id", "request_number"))
+                distinct_clause = (
+                    "(" + ", ".join(f't."{col}"' for col in compare_columns) + ") IS DISTINCT FROM ("
+                    + ", ".join(f'EXCLUDED."{col}"' for col in compare_columns) + ")"
+                )
+                changed_array = "ARRAY_REMOVE(ARRAY[" + ", ".join(
+                    f"""CASE WHEN o."{col}" IS DISTINCT FROM v."{col}" THEN '{col}' END""" for col in compare_columns
+                ) + "]::text[], NULL)"
+                # Las CTE comparten snapshot: 'o' ve los valores anteriores al upsert, para reportar qué columnas cambiaron.
+                upsert_query = (
+                    f"WITH v ({columns_str}) AS (VALUES %s), "
+                    f'o AS (SELECT t.* FROM {self.table_name} t JOIN v ON t."request_number" = v."request_number"), '
+                    f"u AS (INSERT INTO {self.table_name} AS t ({columns_str}) SELECT {columns_str} FROM v "
+                    f'ON CONFLICT ("request_number") DO UPDATE SET {set_clause} WHERE {distinct_clause} '
+                    f'RETURNING t."request_number", (t.xmax = 0) AS inserted) '
+                    f'SELECT u."request_number", u.inserted, {changed_array} FROM u '
+                    f'JOIN v ON v."request_number" = u."request_number" LEFT JOIN o ON o."request_number" = u."request_number";'
+                )
+                data_tuples = list(df_to_upsert.itertuples(index=False, name=None))
+                results = psycopg2.extras.execute_values(cur, upsert_query, data_tuples, template=template, page_size=page_size, fetch=True)
+                conn.commit()
+                return results
+        except Exception as e:
+            self.logger.error(f"Error upserting into the database: {e}")
+            reporter.report_exc_info()
             if conn: conn.rollback()
+            raise DatabaseWriteError(f"Could not upsert {len(df_to_upsert)} records.") from e
         finally:
             if conn: conn.close()
 
+    @metrics.timed("db_operation_seconds", operation="update")
     def update_records(self, df_to_update):
         if df_to_update.empty:
             self.logger.info("Step 5.2: No existing records to update.")
@@ -156,7 +369,7 @@ class DatabaseManager:
                 self.logger.info("Update completed successfully.")
         except Exception as e:
             self.logger.error(f"Error updating the database: {e}")
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
             if conn: conn.rollback()
         finally:
             if conn: conn.close()
\ No newline at end of file
@@ -1,13 +1,23 @@
 import os
 import boto3
-import rollbar
+from src.utils.rollbar_reporter import reporter
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import NoCredentialsError
 
+MB = 1024 * 1024
+
 class S3Manager:
     """Class to manage all interactions with AWS S3."""
-    def __init__(self, bucket_name, logger):
+    def __init__(self, bucket_name, logger, multipart_threshold_mb=16, multipart_chunksize_mb=16, max_concurrency=8):
         self.bucket_name = bucket_name
         self.logger = logger
+        # Los reportes grandes se suben en partes y en paralelo.
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold_mb * MB,
+            multipart_chunksize=multipart_chunksize_mb * MB,
+            max_concurrency=max_concurrency,
+            use_threads=True
+        )
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
@@ -21,11 +31,11 @@ class S3Manager:
             self.logger.error(f"The file '{file_path}' does not exist and cannot be uploaded to S3.")
             return False
         
-        s3_key = f"{s3_folder}/{os.path.basename(file_path)}"
+        s3_key = f"{s3_folder}/{os.path.basename(file_path)}" if s3_folder else os.path.basename(file_path)
         self.logger.info(f"Uploading '{file_path}' to S3 bucket '{self.bucket_name}' at '{s3_key}'...")
         
         try:
-            self.s3_client.upload_file(file_path, self.bucket_name, s3_key)
+            self.s3_client.upload_file(file_path, self.bucket_name, s3_key, Config=self.transfer_config)
             self.logger.info(f"Successfully uploaded '{file_path}' to '{self.bucket_name}/{s3_key}'.")
             return True
         except FileNotFoundError:
@@ -33,9 +43,41 @@ class S3Manager:
             return False
         except NoCredentialsError:
             self.logger.error("AWS credentials not found or are invalid. Please configure your environment variables.")
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
             return False
         except Exception as e:
             self.logger.error(f"An error occurred while uploading to S3: {e}")
-            rollbar.report_exc_info()
-            return False
\ No newline at end of file
+            reporter.report_exc_info()
+            return False
+
+    def download_file(self, s3_key, local_path):
+        """Downloads an object from the S3 bucket to a local path."""
+        self.logger.info(f"Downloading '{self.bucket_name}/{s3_key}' to '{local_path}'...")
+        try:
+            self.s3_client.download_file(self.bucket_name, s3_key, local_path, Config=self.transfer_config)
+            self.logger.info(f"Successfully downloaded '{self.bucket_name}/{s3_key}'.")
+            return True
+        except NoCredentialsError:
+            self.logger.error("AWS credentials not found or are invalid. Please configure your environment variables.")
+            reporter.report_exc_info()
+            return False
+        except Exception as e:
+            self.logger.error(f"An error occurred while downloading from S3: {e}")
+            reporter.report_exc_info()
+            return False
+
+    def list_keys(self, prefix):
+        """Lists the keys under a prefix of the S3 bucket (empty list if it cannot be listed)."""
+        try:
+            keys = []
+            for page in self.s3_client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket_name, Prefix=prefix):
+                keys.extend(item["Key"] for item in page.get("Contents", []))
+            return keys
+        except NoCredentialsError:
+            self.logger.error("AWS credentials not found or are invalid. Please configure your environment variables.")
+            reporter.report_exc_info()
+            return []
+        except Exception as e:
+            self.logger.error(f"An error occurred while listing S3 prefix '{prefix}': {e}")
+            reporter.report_exc_info()
+            return []
@@ -1,14 +1,18 @@
 import asyncio
+import csv
 import json
 import re
 import os
 import html
 import random
-import rollbar
+from src.utils.rollbar_reporter import reporter
 from datetime import datetime
-import pandas as pd
 from playwright.async_api import async_playwright, Page, TimeoutError as PlaywrightTimeoutError
 from src.utils.constants import PATHS
+from src.utils.intermediate_format import write_records
+from src.utils.trademark_record import ScrapedRecord
+from src.utils.metrics import metrics
+from src.utils.logging_config import SAMPLED_PAGE_LOG, SAMPLED_REQUEST_LOG
 
 DOWNLOADS_PATH = PATHS["tmp_path"]
 
@@ -61,6 +65,7 @@ async def click_with_retry(page, selector, retries=3, wait_for_visible=True, tim
             return True
         except Exception as e:
             last_exc = e
+            metrics.inc("click_retries_total", selector=selector)
             print(f"Warning: [click_with_retry] Attempt {attempt}/{retries} failed for {selector}: {e}")
             if attempt < retries: await asyncio.sleep(sleep_between * attempt)
     raise last_exc
@@ -104,7 +109,7 @@ async def extract_row_data(page, i):
         niza_class = await try_get_text(page, f'#MainContent_ctrlTMSearch_ctrlProcList_gvwIPCases > tbody > tr:nth-child({i}) > td:nth-child(9)')
         gazette_number = await try_get_text(page, f'#MainContent_ctrlTMSearch_ctrlProcList_gvwIPCases > tbody > tr:nth-child({i}) > td:nth-child(10)')
         
-    case_data = {"request_number": request_number, "registry_number": registry_number, "denomination": denomination, "logo_url": str(logo_url), "filing_date": filing_date, "expiration_date": expiration_date, "status": status, "holder": holder, "niza_class": niza_class, "gazette_number": gazette_number}
+    case_data = ScrapedRecord(request_number=request_number, registry_number=registry_number, denomination=denomination, logo_url=str(logo_url), filing_date=filing_date, expiration_date=expiration_date, status=status, holder=holder, niza_class=niza_class, gazette_number=gazette_number)
     return case_data if any(case_data.values()) else None
 
 async def extract_all_pages_data(page, logger):
@@ -115,7 +120,7 @@ async def extract_all_pages_data(page, logger):
         return []
     
     while True:
-        logger.info(f"--- Extracting data from page {current_page_num}... ---")
+        logger.info(f"--- Extracting data from page {current_page_num}... ---", extra=SAMPLED_PAGE_LOG)
         await wait_hidden_overlay(page)
         try:
             await page.wait_for_selector('#MainContent_ctrlTMSearch_ctrlProcList_gvwIPCases > tbody > tr:nth-child(2)', state='visible', timeout=30000)
@@ -123,18 +128,22 @@ async def extract_all_pages_data(page, logger):
             logger.info(f"No data rows found on page {current_page_num}.")
             break
             
-        for row_index in range(2, 203):
-            first_cell_selector = f'#MainContent_ctrlTMSearch_ctrlProcList_gvwIPCases > tbody > tr:nth-child({row_index}) > td:nth-child(2)'
-            if await page.locator(first_cell_selector).count() > 0:
-                case_data = await extract_row_data(page, row_index)
-                if case_data: all_cases.append(case_data)
-            else:
-                break
+        rows_before = len(all_cases)
+        with metrics.timer("page_extract_seconds"):
+            for row_index in range(2, 203):
+                first_cell_selector = f'#MainContent_ctrlTMSearch_ctrlProcList_gvwIPCases > tbody > tr:nth-child({row_index}) > td:nth-child(2)'
+                if await page.locator(first_cell_selector).count() > 0:
+                    case_data = await extract_row_data(page, row_index)
+                    if case_data: all_cases.append(case_data)
+                else:
+                    break
+        metrics.inc("pages_total")
+        metrics.inc("rows_extracted_total", len(all_cases) - rows_before)
                 
         next_page_selector = f"//table[@id='MainContent_ctrlTMSearch_ctrlProcList_gvwIPCases']//span[text()='{current_page_num}']/ancestor::td/following-sibling::td[1]/a"
         if await page.locator(next_page_selector).count() > 0:
             current_page_num += 1
-            logger.info(f"Navigating to the next page (now {current_page_num})...")
+            logger.info(f"Navigating to the next page (now {current_page_num})...", extra=SAMPLED_PAGE_LOG)
             target_href = await page.locator(next_page_selector).get_attribute('href')
             if target_href:
                 match = re.search(r"__doPostBack\('([^']*)','([^']*)'", target_href)
@@ -142,7 +151,7 @@ async def extract_all_pages_data(page, logger):
                     event_target, event_argument = match.group(1), match.group(2)
                     await page.evaluate(f"__doPostBack('{event_target}', '{event_argument}')")
                     await page.wait_for_load_state('networkidle', timeout=90000)
-                    logger.info(f"Navigation to page {current_page_num} completed.")
+                    logger.info(f"Navigation to page {current_page_num} completed.", extra=SAMPLED_PAGE_LOG)
                 else:
                     logger.warning("Could not extract PostBack event from the link. Ending pagination.")
                     break
@@ -155,6 +164,7 @@ async def extract_all_pages_data(page, logger):
             
     return all_cases
 
+@metrics.timed("search_seconds", kind="date_range")
 async def scrape_by_date_range(page: Page, start_date, end_date, case_state, logger, global_retries=3):
     start_safe, end_safe, global_attempt = start_date.replace("/", "_"), end_date.replace("/", "_"), 0
     normalized_state = (case_state or 'inactive').strip().lower()
@@ -164,7 +174,7 @@ async def scrape_by_date_range(page: Page, start_date, end_date, case_state, log
         
     state_index = '0' if normalized_state == 'active' else '1'
     output_tag = 'ACTIVE' if normalized_state == 'active' else 'INACTIVE'
-    output_filename = f'{DOWNLOADS_PATH}{start_safe}_{end_safe}_{output_tag}.json'
+    output_base = f'{DOWNLOADS_PATH}{start_safe}_{end_safe}_{output_tag}'
     
     while global_attempt < global_retries:
         global_attempt += 1
@@ -194,11 +204,13 @@ async def scrape_by_date_range(page: Page, start_date, end_date, case_state, log
             if not found:
                 if await page.locator("#MainContent_ctrlTMSearch_divHelp").is_visible():
                         logger.info(f"No results found for the range {start_date} - {end_date}.")
+                        metrics.inc("searches_total", kind="date_range", outcome="no_results")
                         return
                 raise RuntimeError("The results page did not load.")
                 
             if "2000" in (await try_get_text(page, "#MainContent_ctrlTMSearch_ctrlProcList_hdrNbItems") or ""):
                 logger.warning(f"SKIPPED RANGE: The range {start_date} - {end_date} exceeded the 2000 trademark limit and will not be processed.")
+                metrics.inc("searches_total", kind="date_range", outcome="skipped_limit")
                 return
                 
             try:
@@ -220,27 +232,30 @@ async def scrape_by_date_range(page: Page, start_date, end_date, case_state, log
                 logger.warning(f"An error occurred while configuring the results view. Continuing. Error: {e}")
                 
             list_cases = await extract_all_pages_data(page, logger)
-            with open(output_filename, 'w', encoding='utf-8') as json_file:
-                json.dump(list_cases, json_file, ensure_ascii=False, indent=4)
+            write_records(output_base, list_cases)
             logger.info(f"SUCCESS: Saved {len(list_cases)} records ({output_tag}) for the range {start_date} - {end_date}.")
 
             pause_time = random.randint(5, 15)
             logger.info(f"Pausa de {pause_time} segundos para simular comportamiento humano.")
             await asyncio.sleep(pause_time) 
                                                     
+            metrics.inc("searches_total", kind="date_range", outcome="success")
             return
             
         except Exception as e:
+            metrics.inc("search_attempt_failures_total", kind="date_range")
             logger.error(f"[scrape_by_date_range] Attempt {global_attempt}/{global_retries} failed for {start_date} - {end_date}: {e}", exc_info=True)
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
             if global_attempt >= global_retries:
                 logger.critical(f"{start_date} - {end_date} -> Failed after {global_retries} attempts.")
+                metrics.inc("searches_total", kind="date_range", outcome="failed")
                 return
             await asyncio.sleep(2 ** global_attempt + random.random())
 
+@metrics.timed("search_seconds", kind="niza")
 async def scrape_by_niza_class(page: Page, niza_class, logger, global_retries=3):
     start, end, case_state = "01/01/1900", "01/01/1900", 'active'
-    output_filename = f'{DOWNLOADS_PATH}niza_{niza_class}_1900_1900_ACTIVE.json'
+    output_base = f'{DOWNLOADS_PATH}niza_{niza_class}_1900_1900_ACTIVE'
     global_attempt, state_index = 0, '0'
     
     while global_attempt < global_retries:
@@ -273,12 +288,14 @@ async def scrape_by_niza_class(page: Page, niza_class, logger, global_retries=3)
             if not found:
                 if await page.locator("#MainContent_ctrlTMSearch_divHelp").is_visible():
                         logger.info(f"No results found for Niza class {niza_class}.")
-                        with open(output_filename, 'w', encoding='utf-8') as json_file: json.dump([], json_file)
+                        write_records(output_base, [])
+                        metrics.inc("searches_total", kind="niza", outcome="no_results")
                         return
                 raise RuntimeError("The results page did not load.")
                 
             if "2000" in (await try_get_text(page, "#MainContent_ctrlTMSearch_ctrlProcList_hdrNbItems") or ""):
                 logger.warning(f"SKIPPED RANGE: Niza class {niza_class} exceeded the 2000 trademark limit.")
+                metrics.inc("searches_total", kind="niza", outcome="skipped_limit")
                 return
 
             try:
@@ -300,16 +317,18 @@ async def scrape_by_niza_class(page: Page, niza_class, logger, global_retries=3)
                 logger.warning(f"An error occurred while configuring the results view. Continuing. Error: {e}")
                 
             list_cases = await extract_all_pages_data(page, logger)
-            with open(output_filename, 'w', encoding='utf-8') as json_file:
-                json.dump(list_cases, json_file, ensure_ascii=False, indent=4)
+            write_records(output_base, list_cases)
             logger.info(f"SUCCESS: Saved {len(list_cases)} records for Niza class {niza_class}.")
+            metrics.inc("searches_total", kind="niza", outcome="success")
             return
             
         except Exception as e:
+            metrics.inc("search_attempt_failures_total", kind="niza")
             logger.error(f"[scrape_by_niza_class] Attempt {global_attempt}/{global_retries} failed for Niza {niza_class}: {e}", exc_info=True)
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
             if global_attempt >= global_retries:
                 logger.critical(f"Niza {niza_class} -> Failed after {global_retries} attempts.")
+                metrics.inc("searches_total", kind="niza", outcome="failed")
                 return
             await asyncio.sleep(2 ** global_attempt + random.random())
 
@@ -336,9 +355,10 @@ async def _extract_status_with_retries(page, logger, max_attempts=4):
             await asyncio.sleep(1 * attempt)
     return ""
 
+@metrics.timed("correction_lookup_seconds")
 async def scrape_request_by_number(page, request_number, logger):
     """Scrapes a single request by its number and extracts its status."""
-    logger.info(f"Starting scrape for request_number: {request_number}")
+    logger.info(f"Starting scrape for request_number: {request_number}", extra=SAMPLED_REQUEST_LOG)
     try:
         await page.goto("https://sipi.sic.gov.co/sipi/Extra/Default.aspx", wait_until='networkidle')
         await click_with_retry(page, '#MainContent_lnkTMSearch')
@@ -349,36 +369,41 @@ async def scrape_request_by_number(page, request_number, logger):
         await page.wait_for_load_state('networkidle', timeout=60000)
         status = await _extract_status_with_retries(page, logger)
         if status:
+            metrics.inc("correction_lookups_total", outcome="found")
             return status, None
         
         result_link_selector = '#MainContent_ctrlTMSearch_gvSearchResults a'
         if await page.locator(result_link_selector).count() > 0:
-            logger.info("Found a link in the results, clicking it...")
+            logger.info("Found a link in the results, clicking it...", extra=SAMPLED_REQUEST_LOG)
             await click_with_retry(page, result_link_selector)
             await page.wait_for_load_state('networkidle', timeout=60000)
             status = await _extract_status_with_retries(page, logger, max_attempts=5)
             if status:
+                metrics.inc("correction_lookups_total", outcome="found")
                 return status, None
         
         logger.warning(f"Could not determine status for {request_number} after all attempts.")
+        metrics.inc("correction_lookups_total", outcome="not_found")
         return "", "Status not found on results page."
     except Exception as e:
         logger.error(f"Fatal error during scraping of {request_number}: {e}", exc_info=True)
-        rollbar.report_exc_info()
+        reporter.report_exc_info()
+        metrics.inc("correction_lookups_total", outcome="error")
         return "", str(e)
 
 async def run_scraping_for_missing_requests(csv_path, logger):
     """Reads a CSV of missing records, scrapes them, and saves the results to JSON."""
     logger.info(f"Starting scraping process for missing records from '{csv_path}'")
     try:
-        df = pd.read_csv(csv_path)
-        if 'missing_request_number' not in df.columns:
-            logger.error("The CSV must contain the column 'missing_request_number'.")
-            return None
-        requests_to_process = df['missing_request_number'].dropna().tolist()
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            if 'missing_request_number' not in (reader.fieldnames or []):
+                logger.error("The CSV must contain the column 'missing_request_number'.")
+                return None
+            requests_to_process = [row['missing_request_number'] for row in reader if row['missing_request_number']]
     except FileNotFoundError:
         logger.error(f"The CSV file '{csv_path}' was not found.")
-        rollbar.report_exc_info()
+        reporter.report_exc_info()
         return None
     
     if not requests_to_process:
@@ -388,7 +413,7 @@ async def run_scraping_for_missing_requests(csv_path, logger):
     logger.info(f"{len(requests_to_process)} records from the CSV will be processed.")
 
     try:
-        rollbar.report_message(
+        reporter.report_message(
             f"Iniciando scraping de corrección por request_number ({len(requests_to_process)} records)",
             "info"
         )
@@ -405,7 +430,7 @@ async def run_scraping_for_missing_requests(csv_path, logger):
             page = await context.new_page()
 
             for i, req_num in enumerate(requests_to_process):
-                logger.info(f"Processing {i+1}/{len(requests_to_process)}: {req_num}")
+                logger.info(f"Processing {i+1}/{len(requests_to_process)}: {req_num}", extra=SAMPLED_REQUEST_LOG)
                 status, error = await scrape_request_by_number(page, req_num, logger)
                 
                 result = {"request_number": req_num, "extracted_status": status, "error": error}
@@ -423,7 +448,7 @@ async def run_scraping_for_missing_requests(csv_path, logger):
             logger.info(f"Process finished. Final results saved to '{output_json_path}'.")
 
             try:
-                rollbar.report_message(
+                reporter.report_message(
                     f"Scraping de corrección por request_number finalizado ({len(all_results)} records procesados)",
                     "info"
                 )
@@ -3,6 +3,8 @@ import os
 from dotenv import load_dotenv
 import argparse
 from src.services.sync_colombia_trademarks.main import handler
+from src.utils.sharding import parse_shard
+from src.utils.profiling import PROFILE_MODES, start_profiling_run, profile_process, write_profile_summary
 
 def container_handler(event, context=None):
     return handler(event, context)
@@ -14,13 +16,72 @@ if __name__ == '__main__':
     parser.add_argument(
         '--status',
         type=str,
-        required=True,
-        choices=['active', 'inactive'],
-        help="The case status to scrape ('active' or 'inactive')."
+        choices=['active', 'inactive', 'both'],
+        help="The case status to scrape ('active', 'inactive', or 'both' to scrape each range for both states in one crawl and run a single ETL pass)."
+    )
+    parser.add_argument(
+        '--replay',
+        type=str,
+        metavar='SNAPSHOT',
+        help="Run ETL and verification from an archived snapshot (local path or s3:// URL) without scraping."
+    )
+    parser.add_argument(
+        '--shard',
+        type=str,
+        metavar='i/N',
+        help="Scrape only the i-th of N deterministic, cost-balanced parts of the plan (1-based) and upload its range files to SHARD_DEST, without running the ETL."
+    )
+    parser.add_argument(
+        '--merge-shards',
+        type=int,
+        metavar='N',
+        help="Once all N shards in SHARD_DEST have completed with this node's plan (--status and SHARD_PLAN_DATE), download their range files and run the ETL and verification once."
+    )
+    parser.add_argument(
+        '--profile',
+        type=str,
+        nargs='?',
+        const='deterministic',
+        choices=PROFILE_MODES,
+        help="Profile the main process, each scraping worker and the correction loop ('deterministic' by default, or 'sampling')."
+    )
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=30,
+        metavar='N',
+        help="Number of functions listed in the merged profile summary (default: 30)."
     )
     args = parser.parse_args()
+    if not args.status and not args.replay and not args.merge_shards:
+        parser.error("one of the arguments --status, --replay or --merge-shards is required")
+    if args.shard:
+        if not args.status:
+            parser.error("--shard requires --status")
+        try:
+            parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.merge_shards is not None and args.merge_shards < 1:
+        parser.error("--merge-shards must be at least 1")
+    if args.merge_shards and not args.status:
+        parser.error("--merge-shards requires --status")
     event_params = {
         "case_status": args.status
     }
+    if args.replay:
+        event_params["replay_snapshot"] = args.replay
+    if args.shard:
+        event_params["shard"] = args.shard
+    if args.merge_shards:
+        event_params["merge_shards"] = args.merge_shards
     print(f"Running handler with event: {json.dumps(event_params, indent=2)}")
-    container_handler(event_params)
\ No newline at end of file
+    if args.profile:
+        profile_dir = start_profiling_run(args.profile)
+        print(f"Profiling enabled ({args.profile}), writing profiles to '{profile_dir}'")
+    try:
+        with profile_process("main"):
+            container_handler(event_params)
+    finally:
+        if args.profile:
+            print(f"Merged profile summary written to '{write_profile_summary(profile_dir, args.profile_top)}'")
\ No newline at end of file
@@ -1,19 +1,15 @@
-import rollbar
-import os
 import sys
+from src.utils.rollbar_reporter import reporter
 
 def use_rollbar(handler):
-    #rollbar.init(
-    #    access_token=os.getenv("ROLLBAR_TOKEN"), 
-    #    environment=os.getenv("ENV_STAGE")
-    #)
+    # rollbar.init lo hace RollbarReporter en el primer reporte, solo con ROLLBAR_ENABLED=true (ROLLBAR_TOKEN, ENV_STAGE, ROLLBAR_ENDPOINT).
 
     def wrapper(*args, **kwargs):
         try:
             return handler(*args, **kwargs)
         except Exception as err:
-            rollbar.report_exc_info(sys.exc_info())
+            reporter.report_exc_info(sys.exc_info())
             raise err
 
     wrapper.__name__ = handler.__name__
-    return wrapper
\ No newline at end of file
+    return wrapper
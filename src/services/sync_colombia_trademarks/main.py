@@ -1,13 +1,30 @@
-from src.utils.logging_config import setup_logging
-from src.functions.sync_orchestrator import run_sync_process
+from src.utils.logging_config import setup_logging, start_log_listener, stop_log_listener
+from src.functions.sync_orchestrator import run_sync_process, run_replay_process, run_shard_process, run_merge_process
+from src.utils.sharding import parse_shard
 from src.middlewares.rollbar_config import use_rollbar
 
 @use_rollbar
 def handler(event, context=None):
+    start_log_listener()
     logger = setup_logging()
-    case_status = event.get("case_status")
-    if not case_status:
-        logger.critical("'case_status' must be provided in the event.")
-        return
-    run_sync_process(logger, case_status)
-    return event
\ No newline at end of file
+    try:
+        replay_snapshot = event.get("replay_snapshot")
+        if replay_snapshot:
+            run_replay_process(logger, replay_snapshot)
+            return event
+        case_status = event.get("case_status")
+        if not case_status:
+            logger.critical("'case_status' must be provided in the event.")
+            return
+        merge_shards = event.get("merge_shards")
+        if merge_shards:
+            run_merge_process(logger, case_status, int(merge_shards))
+            return event
+        if event.get("shard"):
+            shard, shards = parse_shard(event["shard"])
+            run_shard_process(logger, case_status, shard, shards)
+            return event
+        run_sync_process(logger, case_status)
+        return event
+    finally:
+        stop_log_listener()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import os
+import pandas as pd
+from src.utils.trademark_record import encode_categoricals
+
+class BatchAssembler:
+    """
+    Agrupa los DataFrames normalizados de varios archivos en lotes de un tamaño objetivo.
+    Cada registro conserva el archivo del que proviene en la columna 'source_file' (categórica).
+    """
+    def __init__(self, target_size):
+        self.target_size = target_size
+        self._pending = []
+        self._pending_rows = 0
+
+    def add(self, df, source_file):
+        """Añade los registros de un archivo y devuelve la lista de lotes que quedaron completos."""
+        if df is None or df.empty:
+            return []
+        self._pending.append(df.assign(source_file=os.path.basename(source_file)))
+        self._pending_rows += len(df)
+
+        batches = []
+        if self.target_size <= 0:
+            batches.append(self._take_all())
+            return batches
+        while self._pending_rows >= self.target_size:
+            combined = self._take_all()
+            batches.append(combined.iloc[:self.target_size])
+            rest = combined.iloc[self.target_size:]
+            if not rest.empty:
+                self._pending, self._pending_rows = [rest], len(rest)
+        return batches
+
+    def flush(self):
+        """Devuelve el último lote incompleto, o None si no queda nada pendiente."""
+        if not self._pending:
+            return None
+        return self._take_all()
+
+    def _take_all(self):
+        combined = pd.concat(self._pending) if len(self._pending) > 1 else self._pending[0]
+        self._pending, self._pending_rows = [], 0
+        # concat de categorías distintas vuelve a 'object': se recodifica el lote combinado.
+        return encode_categoricals(combined)
+
+    def iter_batches(self, frames):
+        """
+        Consume (file_path, df) en orden y genera (df_lote, source_files) de ~target_size registros.
+        Un lote puede repetir un 'request_number' de varios archivos; la deduplicación la hace RequestNumberIndex.
+        """
+        for file_path, df in frames:
+            for batch in self.add(df, file_path):
+                yield self._finalize(batch)
+        last = self.flush()
+        if last is not None:
+            yield self._finalize(last)
+
+    @staticmethod
+    def _finalize(batch):
+        return batch, batch['source_file'].unique().tolist()
@@ -0,0 +1,108 @@
+import csv
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+
+class ChangeReportWriter:
+    """
+    Escribe el reporte de cambios del ETL de forma incremental (un lote a la vez) y acumula
+    un resumen compacto: cambios por columna e inserciones/actualizaciones por archivo de origen.
+    """
+    FIELDS = ["request_number", "changed", "columns_changed", "source_file"]
+
+    def __init__(self, report_path, summary_path, compress=False, append=False, offset=None):
+        self.report_path = f"{report_path}.gz" if compress else report_path
+        self.summary_path = summary_path
+        self.compress = compress
+        self.rows_written = 0
+        self.column_changes = Counter()
+        self.per_source_file = defaultdict(lambda: {"inserts": 0, "updates": 0})
+        # En modo append (ETL reanudado) se continúa el reporte existente, recortado a 'offset' (el del último
+        # lote confirmado en el ledger): así no se repiten las filas de un lote escrito pero no confirmado.
+        append = append and os.path.exists(self.report_path) and os.path.getsize(self.report_path) > 0
+        if append and offset is not None:
+            with open(self.report_path, "r+b") as f:
+                f.truncate(offset)
+        self._file = self._open("a" if append else "w")
+        if not append:
+            self._writer.writeheader()
+        self.offset = self._sync()
+
+    def _open(self, mode):
+        # Con gzip, cada lote va en su propio miembro (se cierra al terminar el lote), de modo que el offset
+        # guardado en el ledger siempre cae en un límite de miembro y el archivo se puede recortar ahí.
+        if self.compress:
+            file = gzip.open(self.report_path, f"{mode}t", encoding="utf-8", newline="")
+        else:
+            file = open(self.report_path, mode, encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(file, fieldnames=self.FIELDS, extrasaction="ignore")
+        return file
+
+    def _sync(self):
+        """Fuerza a disco lo escrito (cerrando el miembro gzip) y devuelve el tamaño del reporte en bytes."""
+        if self.compress:
+            self._file.close()
+            fd = os.open(self.report_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        else:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return os.path.getsize(self.report_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_batch(self, report_rows):
+        """
+        Añade las filas de un lote al reporte y actualiza las estadísticas. Devuelve las estadísticas del
+        lote (filas, cambios por columna y por archivo), que el ETL guarda en el ledger para poder reanudar.
+        Tras cada lote, 'offset' es el tamaño del reporte en disco.
+        """
+        if self._file.closed:
+            self._file = self._open("a")
+        column_changes = Counter()
+        per_source_file = defaultdict(lambda: {"inserts": 0, "updates": 0})
+        for row in report_rows:
+            self._writer.writerow(row)
+            columns_changed = row["columns_changed"].split(", ")
+            source = per_source_file[row.get("source_file", "")]
+            if "NEW_RECORD" in columns_changed:
+                source["inserts"] += 1
+            else:
+                source["updates"] += 1
+                column_changes.update(columns_changed)
+        self.offset = self._sync()
+        batch_stats = {"report_rows": len(report_rows), "column_changes": dict(column_changes), "per_source_file": dict(per_source_file)}
+        self.restore(batch_stats)
+        return batch_stats
+
+    def restore(self, batch_stats):
+        """Suma las estadísticas de un lote (de write_batch, o de una entrada del ledger al reanudar)."""
+        self.rows_written += batch_stats.get("report_rows", 0)
+        self.column_changes.update(batch_stats.get("column_changes", {}))
+        for source_file, counts in batch_stats.get("per_source_file", {}).items():
+            self.per_source_file[source_file]["inserts"] += counts["inserts"]
+            self.per_source_file[source_file]["updates"] += counts["updates"]
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def write_summary(self, **totals):
+        """Escribe el resumen en JSON junto al reporte y lo devuelve."""
+        summary = {
+            **totals,
+            "report_rows": self.rows_written,
+            "column_changes": dict(self.column_changes.most_common()),
+            "per_source_file": dict(sorted(self.per_source_file.items()))
+        }
+        with open(self.summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
@@ -2,9 +2,21 @@ from typing import TypedDict
 
 class PathNames(TypedDict):
     tmp_path: str
+    request_numbers_file: str
+    etl_ledger_file: str
+    metrics_dumps_path: str
+    metrics_output_path: str
+    profiles_path: str
+    shards_path: str
 
 PATHS: PathNames = {
-    "tmp_path": "tmp/"
+    "tmp_path": "tmp/",
+    "request_numbers_file": "tmp/request_numbers.txt",
+    "etl_ledger_file": "tmp/etl_ledger.jsonl",
+    "metrics_dumps_path": "tmp/metrics/",
+    "metrics_output_path": "metrics/",
+    "profiles_path": "profiles/",
+    "shards_path": "shards/"
 }
 
 class S3PathNames(TypedDict):
@@ -14,4 +26,63 @@ class S3PathNames(TypedDict):
 S3_PATHS: S3PathNames = {
     "bucket_name": "usrv-scraping",
     "reports_folder": "reports-scraping-colombia"
-}
\ No newline at end of file
+}
+
+class IntermediateFormats(TypedDict):
+    default: str
+    extensions: dict
+
+# Formato de los archivos de rangos en tmp/; se puede sobrescribir con INTERMEDIATE_FORMAT ('ndjson' o
+# 'parquet', este último con el extra opcional de requirements-parquet.txt).
+# Los lectores aceptan siempre los tres formatos, incluido el JSON legado.
+INTERMEDIATE_FORMATS: IntermediateFormats = {
+    "default": "json",
+    "extensions": {"json": ".json", "ndjson": ".ndjson.gz", "parquet": ".parquet"}
+}
+
+class ETLSettings(TypedDict):
+    workers: int
+    max_in_flight: int
+    batch_size: int
+    source_precedence: str
+    normalize_mode: str
+    report_gzip: bool
+    db_itersize: int
+    write_mode: str
+    db_writers: int
+    pipeline_depth: int
+
+# Valores por defecto; se pueden sobrescribir con las variables ETL_WORKERS, ETL_MAX_IN_FLIGHT, ETL_BATCH_SIZE
+# ETL_SOURCE_PRECEDENCE ('date_range', 'niza' o 'newest') ETL_NORMALIZE_MODE ('row' o 'columnar')
+# ETL_REPORT_GZIP (comprime el reporte de cambios) y ETL_DB_ITERSIZE (filas por bloque en las lecturas
+# de tabla completa con cursores del lado del servidor) y ETL_WRITE_MODE ('diff': consulta + comparación +
+# INSERT/UPDATE, o 'upsert': INSERT ... ON CONFLICT DO UPDATE sin lectura previa) y ETL_DB_WRITERS
+# (conexiones que escriben en paralelo particiones disjuntas de cada lote) y ETL_PIPELINE_DEPTH (lotes
+# escribiéndose en segundo plano mientras se compara el siguiente, cuya consulta ya va adelantada; 0 = en serie,
+# por defecto).
+ETL_SETTINGS: ETLSettings = {
+    "workers": 1,
+    "max_in_flight": 0,
+    "batch_size": 20000,
+    "source_precedence": "date_range",
+    "normalize_mode": "row",
+    "report_gzip": False,
+    "db_itersize": 20000,
+    "write_mode": "diff",
+    "db_writers": 1,
+    "pipeline_depth": 0
+}
+
+class ShardSettings(TypedDict):
+    workers: int
+    merge_timeout_seconds: int
+    poll_seconds: float
+
+# Ejecución repartida en N nodos (--shard i/N y --merge-shards N); se pueden sobrescribir con SHARD_WORKERS
+# (navegadores en paralelo dentro de cada shard), SHARD_MERGE_TIMEOUT (segundos que el merge espera a que
+# terminen todos los shards; 0 = falla si falta alguno) y SHARD_POLL_SECONDS (cada cuánto vuelve a comprobar).
+SHARD_SETTINGS: ShardSettings = {
+    "workers": 2,
+    "merge_timeout_seconds": 0,
+    "poll_seconds": 30
+}
@@ -1,8 +1,17 @@
 import os
 import json
 import re
+import numpy as np
+from collections import Counter
 from datetime import datetime
-import rollbar
+from functools import lru_cache
+from src.utils.rollbar_reporter import reporter
+from src.utils.intermediate_format import list_range_files, read_column, read_records
+from src.utils.request_number_codec import sorted_unique
+from src.utils.trademark_record import TrademarkRecord, intern_value
+
+LOGO_URL_TEMPLATE = "https://gazette-primary-assets.s3.amazonaws.com/logos/colombia/records/{}.jpeg"
+WHITESPACE_PATTERN = re.compile(r'\s+')
 
 class DataNormalizer:
     """Class responsible for processing and normalizing JSON files."""
@@ -19,6 +28,10 @@ class DataNormalizer:
             "desistida": "DESISTIDA", "abandonada": "ABANDONADA", "bajo examen de fondo": "EXAMEN_DE_FONDO",
             "bajo examen formal": "EXAMEN_DE_FORMA", "publicada": "EN_GACETA", "con oposición": "OPOSICION"
         }
+        # Cachés acotadas del modo columnar: fechas y titulares se repiten mucho entre registros.
+        self._cached_parse_date = lru_cache(maxsize=16384)(self._parse_date)
+        self._cached_normalize_holder = lru_cache(maxsize=65536)(self._normalize_holder_key)
+        self._cached_map_status = lru_cache(maxsize=1024)(self._map_status)
 
     def _format_date(self, date_str):
         if not date_str: return None
@@ -37,43 +50,73 @@ class DataNormalizer:
         normalized_list = [re.sub(r'\s+', ' ', name.replace(";", ",")).strip().upper() for name in holder_list]
         return "; ".join(normalized_list)
     
-    def get_all_request_numbers_from_jsons(self):
-        """Reads all JSONs and returns a set of unique request_numbers."""
-        request_numbers = set()
-        for filename in os.listdir(self.folder_path):
-            if filename.endswith(".json"):
-                file_path = os.path.join(self.folder_path, filename)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                        for entry in data:
-                            if entry and 'request_number' in entry:
-                                request_numbers.add(entry['request_number'])
-                except (json.JSONDecodeError, TypeError):
-                    self.logger.error(f"Error reading or processing JSON file: '{file_path}'. It will be skipped.")
-                    rollbar.report_exc_info()
-        self.logger.info(f"Found {len(request_numbers)} unique 'request_number' values in JSON files.")
+    def _parse_date(self, date_str):
+        """Igual que _format_date pero sin registrar el fallo; el modo columnar agrega los avisos."""
+        if not date_str: return None
+        try:
+            day, spa_month, year = date_str.split(" ")
+            eng_month = self.month_mapping.get(spa_month.lower())
+            if not eng_month: return None
+            return f"{year}-{eng_month}-{day.zfill(2)}"
+        except (ValueError, AttributeError):
+            return None
+
+    def _normalize_holder_key(self, holder_key):
+        if not holder_key: return ""
+        holder_list = holder_key if isinstance(holder_key, tuple) else [holder_key]
+        return "; ".join(WHITESPACE_PATTERN.sub(' ', name.replace(";", ",")).strip().upper() for name in holder_list)
+
+    def _map_status(self, status):
+        return self.status_mapping.get(str(status).lower(), status)
+
+    @staticmethod
+    def _memoized(func, fallback, value):
+        try:
+            return func(value)
+        except TypeError:
+            return fallback(value)
+
+    def get_all_request_numbers_from_jsons(self, codec):
+        """
+        Reads only the 'request_number' column of every range file and returns the unique values as a
+        sorted int64 array of 'codec' codes (decode with codec.decode_many).
+        """
+        chunks = []
+        for file_path in list_range_files(self.folder_path):
+            try:
+                chunks.append(sorted_unique(codec.encode_many(value for value in read_column(file_path, "request_number") if value)))
+            except (ValueError, TypeError, OSError):
+                self.logger.error(f"Error reading or processing range file: '{file_path}'. It will be skipped.")
+                reporter.report_exc_info()
+        request_numbers = sorted_unique(np.concatenate(chunks)) if chunks else np.empty(0, dtype=np.int64)
+        self.logger.info(f"Found {len(request_numbers)} unique 'request_number' values in range files.")
+        return request_numbers
+
+    def get_request_numbers_from_artifact(self, artifact_path, codec):
+        """
+        Reads the request_numbers written by the ETL pass (one per line) as a sorted, unique int64 array
+        of 'codec' codes. Returns None if the artifact does not exist, so callers can fall back to re-reading the JSONs.
+        """
+        if not os.path.exists(artifact_path):
+            return None
+        with open(artifact_path, "r", encoding="utf-8") as f:
+            request_numbers = sorted_unique(codec.encode_many(line.rstrip("\n") for line in f if line.strip()))
+        self.logger.info(f"Found {len(request_numbers)} unique 'request_number' values in '{artifact_path}'.")
         return request_numbers
 
     def get_json_file_list(self):
-        """Devuelve una lista de todas las rutas de archivos JSON válidos."""
-        json_files = []
-        for filename in os.listdir(self.folder_path):
-            if filename.endswith(".json"):
-                file_path = os.path.join(self.folder_path, filename)
-                json_files.append(file_path)
-        
-        self.logger.info(f"Se encontraron {len(json_files)} archivos JSON para procesar en lotes.")
+        """Devuelve una lista de todos los archivos de rangos (JSON legado, NDJSON comprimido o Parquet)."""
+        json_files = list_range_files(self.folder_path)
+        self.logger.info(f"Se encontraron {len(json_files)} archivos de rangos para procesar en lotes.")
         return json_files
 
     def normalize_single_file(self, file_path):
-        """Lee un solo archivo JSON, lo normaliza y lo devuelve."""
+        """Lee un solo archivo de rango (en cualquier formato soportado), lo normaliza y lo devuelve como lista de TrademarkRecord."""
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = read_records(file_path)
         except Exception as e:
             self.logger.error(f"Error al leer el archivo JSON {file_path}: {e}. Omitiendo.")
-            rollbar.report_exc_info()
+            reporter.report_exc_info()
             return []
         
         if not isinstance(data, list):
@@ -88,25 +131,89 @@ class DataNormalizer:
                 self.logger.warning(f"Registro omitido (sin 'request_number') en {file_path}: {entry}")
                 continue
             
-            final_entry = {
-                "request_number": request_number,
-                "registry_number": entry.get("registry_number", ""),
-                "denomination": entry.get("denomination", ""),
-                "logo_url": entry.get("logo_url", ""),
-                "logo": f"https://gazette-primary-assets.s3.amazonaws.com/logos/colombia/records/{request_number.replace('/', '_')}.jpeg" if entry.get("logo_url") else "",
-                "filing_date": self._format_date(entry.get("filing_date", "")),
-                "expiration_date": self._format_date(entry.get("expiration_date", "")),
-                "status": self.status_mapping.get(str(entry.get("status", "")).lower(), entry.get("status")),
-                "holder": self._normalize_holder(entry.get("holder", "")),
-                "niza_class": entry.get("niza_class", ""),
-                "gazette_number": entry.get("gazette_number", ""),
-                "updated_at": updated_at,
-                "badger_country": "COLOMBIA"
-            }
+            final_entry = TrademarkRecord(
+                request_number=request_number,
+                registry_number=entry.get("registry_number", ""),
+                denomination=entry.get("denomination", ""),
+                logo_url=entry.get("logo_url", ""),
+                logo=LOGO_URL_TEMPLATE.format(request_number.replace('/', '_')) if entry.get("logo_url") else "",
+                filing_date=self._format_date(entry.get("filing_date", "")),
+                expiration_date=self._format_date(entry.get("expiration_date", "")),
+                status=self.status_mapping.get(str(entry.get("status", "")).lower(), entry.get("status")),
+                holder=self._normalize_holder(entry.get("holder", "")),
+                niza_class=entry.get("niza_class", ""),
+                gazette_number=entry.get("gazette_number", ""),
+                updated_at=updated_at,
+                badger_country="COLOMBIA"
+            )
             final_data.append(final_entry)
             
         return final_data
 
+    def normalize_single_file_columns(self, file_path):
+        """
+        Versión columnar de normalize_single_file: devuelve {columna: lista de valores} con
+        exactamente los mismos valores, usando cachés para fechas, titulares y estados.
+        Los avisos se agregan en una sola línea por archivo en lugar de una por registro.
+        """
+        try:
+            data = read_records(file_path)
+        except Exception as e:
+            self.logger.error(f"Error al leer el archivo JSON {file_path}: {e}. Omitiendo.")
+            reporter.report_exc_info()
+            return {}
+
+        if not isinstance(data, list):
+            data = [data]
+
+        entries = [entry for entry in data if entry.get("request_number", "")]
+        if len(entries) < len(data):
+            self.logger.warning(f"{len(data) - len(entries)} registros omitidos (sin 'request_number') en {file_path}.")
+
+        def column(key):
+            return [entry.get(key, "") for entry in entries]
+
+        def interned_column(key):
+            return [intern_value(entry.get(key, "")) for entry in entries]
+
+        request_numbers = column("request_number")
+        logo_urls = column("logo_url")
+        raw_filing_dates = column("filing_date")
+        raw_expiration_dates = column("expiration_date")
+        holders = column("holder")
+
+        parse_date = lambda value: self._memoized(self._cached_parse_date, self._parse_date, value)
+        filing_dates = [parse_date(value) for value in raw_filing_dates]
+        expiration_dates = [parse_date(value) for value in raw_expiration_dates]
+        invalid_dates = Counter(
+            raw for raws, parsed in ((raw_filing_dates, filing_dates), (raw_expiration_dates, expiration_dates))
+            for raw, value in zip(raws, parsed) if raw and value is None
+        )
+        if invalid_dates:
+            examples = ", ".join(f"'{raw}'" for raw, _ in invalid_dates.most_common(5))
+            self.logger.warning(f"Could not format {sum(invalid_dates.values())} dates in {file_path} (e.g. {examples}). They will be set to null.")
+
+        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        size = len(entries)
+        return {
+            "request_number": request_numbers,
+            "registry_number": column("registry_number"),
+            "denomination": column("denomination"),
+            "logo_url": logo_urls,
+            "logo": [LOGO_URL_TEMPLATE.format(req.replace('/', '_')) if url else "" for req, url in zip(request_numbers, logo_urls)],
+            "filing_date": filing_dates,
+            "expiration_date": expiration_dates,
+            "status": [self._memoized(self._cached_map_status, self._map_status, entry.get("status")) for entry in entries],
+            "holder": [
+                self._cached_normalize_holder(tuple(holder) if isinstance(holder, list) else holder)
+                for holder in holders
+            ],
+            "niza_class": interned_column("niza_class"),
+            "gazette_number": interned_column("gazette_number"),
+            "updated_at": [updated_at] * size,
+            "badger_country": ["COLOMBIA"] * size
+        }
+
     def combine_and_normalize_jsons(self):
         """
         Esta función ahora está OBSOLETA para el ETL principal si hay problemas de memoria.
@@ -115,18 +222,14 @@ class DataNormalizer:
         self.logger.warning("Se está llamando a combine_and_normalize_jsons (obsoleto). Esto puede consumir mucha RAM.")
         
         combined_data = []
-        for filename in os.listdir(self.folder_path):
-            if filename.endswith(".json"):
-                file_path = os.path.join(self.folder_path, filename)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                        combined_data.extend(data if isinstance(data, list) else [data])
-                except json.JSONDecodeError:
-                    self.logger.error(f"Error decoding JSON file: '{file_path}'. It will be skipped.")
-                    rollbar.report_exc_info()
-                except Exception as e:
-                    self.logger.error(f"Unexpected error reading '{file_path}': {e}. It will be skipped.")
+        for file_path in list_range_files(self.folder_path):
+            try:
+                combined_data.extend(read_records(file_path))
+            except json.JSONDecodeError:
+                self.logger.error(f"Error decoding JSON file: '{file_path}'. It will be skipped.")
+                reporter.report_exc_info()
+            except Exception as e:
+                self.logger.error(f"Unexpected error reading '{file_path}': {e}. It will be skipped.")
 
         self.logger.info(f"Step 1: Merged a total of {len(combined_data)} records from the '{self.folder_path}' folder.")
         
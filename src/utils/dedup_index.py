@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pandas as pd
+from src.utils.request_number_codec import RequestNumberCodec, isin_sorted, sorted_unique
+
+PRECEDENCE_RULES = ("date_range", "niza", "newest")
+
+def sort_files_by_precedence(file_paths, rule="date_range"):
+    """
+    Ordena los archivos para que el de mayor precedencia se procese primero.
+    - 'date_range': los archivos por rango de fechas ganan a los de Clases Niza.
+    - 'niza': los archivos de Clases Niza ganan a los de rango de fechas.
+    - 'newest': gana el archivo scrapeado más recientemente (mtime).
+    """
+    if rule not in PRECEDENCE_RULES:
+        raise ValueError(f"Unknown precedence rule '{rule}'. Valid rules: {', '.join(PRECEDENCE_RULES)}.")
+    ordered = sorted(file_paths)
+    if rule == "newest":
+        return sorted(ordered, key=os.path.getmtime, reverse=True)
+    niza_first = rule == "niza"
+    return sorted(ordered, key=lambda p: os.path.basename(p).startswith("niza_") != niza_first)
+
+class RequestNumberIndex:
+    """
+    Índice de los 'request_number' ya procesados en la ejecución.
+    Guarda los códigos int64 de RequestNumberCodec en un array ordenado (8 bytes por clave, sin colisiones)
+    en lugar de un set de strings.
+    """
+    def __init__(self, merge_threshold=262144, codec=None):
+        self.merge_threshold = merge_threshold
+        self.codec = codec or RequestNumberCodec()
+        self.duplicates_dropped = 0
+        self._sorted = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_size = 0
+
+    def __len__(self):
+        return len(self._sorted) + self._pending_size
+
+    def _encode(self, keys):
+        return self.codec.encode_many(keys)
+
+    def _contains(self, codes):
+        found = isin_sorted(self._sorted, codes)
+        if self._pending:
+            found |= isin_sorted(np.sort(np.concatenate(self._pending)), codes)
+        return found
+
+    def _add_codes(self, codes):
+        if not len(codes):
+            return
+        self._pending.append(codes)
+        self._pending_size += len(codes)
+        if self._pending_size >= self.merge_threshold:
+            self._sorted = sorted_unique(np.concatenate([self._sorted, *self._pending]))
+            self._pending, self._pending_size = [], 0
+
+    def add(self, keys):
+        """Registra claves como ya vistas, sin filtrar nada."""
+        codes = sorted_unique(self._encode(keys))
+        self._add_codes(codes[~self._contains(codes)])
+
+    def filter_new(self, df):
+        """
+        Devuelve las filas de df (indexado por 'request_number') que no se habían visto antes,
+        conservando la primera aparición dentro del propio lote, y las registra en el índice.
+        """
+        if df.empty:
+            return df
+        codes = self._encode(df.index.to_numpy())
+        keep = ~pd.Index(codes).duplicated(keep='first') & ~self._contains(codes)
+        self.duplicates_dropped += int((~keep).sum())
+        self._add_codes(codes[keep])
+        return df[keep]
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+def file_checksum(file_path, chunk_size=1024 * 1024):
+    """sha256 del contenido del archivo, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ETLLedger:
+    """
+    Registro durable (JSON lines, con fsync) de los lotes del ETL ya guardados en la BD.
+    Cada entrada guarda los checksums de los archivos de origen vistos hasta ese lote, los archivos ya
+    completos, los offsets del archivo de request_numbers y del reporte de cambios tras el lote, las filas ya
+    consumidas del archivo que quedó a medias y los totales acumulados (inserciones, actualizaciones y
+    duplicados descartados).
+    Solo se reanuda si la tabla coincide y ningún archivo registrado cambió; si no, se empieza de cero.
+    Aparte (path + '.pending'), antes de escribir cada lote se registra lo que el diff va a guardar, para que
+    al reanudar se cuenten los registros que una escritura en vuelo llegó a confirmar antes de la caída.
+    """
+    def __init__(self, path, table_name):
+        self.path = path
+        self.pending_path = f"{path}.pending"
+        self.table_name = table_name
+        self.entries = []
+        self._pending_lock = threading.Lock()
+
+    def load(self, checksums):
+        """
+        Lee el ledger y lo valida contra los checksums actuales ({basename: sha256}).
+        Devuelve la última entrada si se puede reanudar, o None (y descarta el ledger) si no.
+        """
+        self.entries = []
+        if not os.path.exists(self.path):
+            self.reset()
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self.entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # Última línea a medio escribir: se ignora.
+
+        valid = bool(self.entries) and all(
+            entry.get("table") == self.table_name
+            and all(checksums.get(name) == checksum for name, checksum in entry["checksums"].items())
+            for entry in self.entries
+        )
+        if not valid or self.entries[-1].get("finished"):
+            self.reset()
+            return None
+        return self.entries[-1]
+
+    def completed_files(self):
+        """Archivos cuyo contenido ya quedó guardado entero en la BD."""
+        return {name for entry in self.entries for name in entry["completed_files"]}
+
+    def record(self, **entry):
+        """Añade una entrada y la fuerza a disco antes de devolver."""
+        entry = {"table": self.table_name, "committed_at": datetime.now().isoformat(timespec="seconds"), **entry}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries.append(entry)
+
+    def record_pending(self, batch, report_rows):
+        """Registra (con fsync) las filas del reporte de un lote antes de escribirlo; seguro entre hilos."""
+        if not report_rows:
+            return
+        line = json.dumps({"batch": batch, "rows": [
+            [row["request_number"], row["columns_changed"], row.get("source_file", "")] for row in report_rows
+        ]}, ensure_ascii=False)
+        with self._pending_lock:
+            os.makedirs(os.path.dirname(self.pending_path) or ".", exist_ok=True)
+            with open(self.pending_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def pending_rows(self):
+        """
+        {request_number: fila del reporte} de los lotes registrados con record_pending. Los que ya están en un
+        lote confirmado no vuelven a procesarse, así que solo se consultan los de lotes que quedaron en vuelo.
+        """
+        rows = {}
+        if not os.path.exists(self.pending_path):
+            return rows
+        with open(self.pending_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Última línea a medio escribir: ese lote aún no se había empezado a escribir.
+                for request_number, columns_changed, source_file in entry["rows"]:
+                    rows[request_number] = {"request_number": request_number, "changed": True, "columns_changed": columns_changed, "source_file": source_file}
+        return rows
+
+    def reset(self):
+        self.entries = []
+        for path in (self.path, self.pending_path):
+            if os.path.exists(path):
+                os.remove(path)
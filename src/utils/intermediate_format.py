@@ -0,0 +1,127 @@
+import gzip
+import json
+import os
+from src.utils.constants import INTERMEDIATE_FORMATS
+
+RAW_COLUMNS = ["request_number", "registry_number", "denomination", "logo_url", "filing_date", "expiration_date", "status", "holder", "niza_class", "gazette_number"]
+
+def get_output_format():
+    """
+    Formato con el que se escriben los rangos scrapeados (variable INTERMEDIATE_FORMAT). Falla si el formato
+    no existe o si es 'parquet' sin pyarrow; el orquestador lo llama al empezar, antes de scrapear.
+    """
+    fmt = os.getenv("INTERMEDIATE_FORMAT", INTERMEDIATE_FORMATS["default"])
+    if fmt not in INTERMEDIATE_FORMATS["extensions"]:
+        raise ValueError(f"Unknown intermediate format '{fmt}'. Valid formats: {', '.join(INTERMEDIATE_FORMATS['extensions'])}.")
+    if fmt == "parquet":
+        _import_pyarrow()
+    return fmt
+
+def detect_format(file_path):
+    for fmt, extension in INTERMEDIATE_FORMATS["extensions"].items():
+        if file_path.endswith(extension):
+            return fmt
+    return None
+
+def find_range_file(base_path):
+    """Devuelve el archivo existente para un rango (sin extensión) en cualquier formato, o None."""
+    for extension in INTERMEDIATE_FORMATS["extensions"].values():
+        if os.path.exists(f"{base_path}{extension}"):
+            return f"{base_path}{extension}"
+    return None
+
+def list_range_files(folder_path):
+    """Lista los archivos de rangos de la carpeta en cualquiera de los formatos soportados."""
+    return [
+        os.path.join(folder_path, filename) for filename in sorted(os.listdir(folder_path))
+        if detect_format(filename) and not filename.startswith("missing_results_")
+    ]
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError as e:
+        raise RuntimeError(
+            "The 'parquet' intermediate format requires the optional 'pyarrow' package. "
+            "Install it with 'pip install -r requirements-parquet.txt' or use INTERMEDIATE_FORMAT=ndjson or json."
+        ) from e
+
+def _holder_as_list(holder):
+    if isinstance(holder, list):
+        return [str(name) for name in holder]
+    return [holder] if holder else []
+
+def _holder_from_list(holder):
+    holder = list(holder or [])
+    if not holder:
+        return ""
+    return holder[0] if len(holder) == 1 else holder
+
+def _as_dict(record):
+    return record.to_dict() if hasattr(record, "to_dict") else record
+
+def write_records(base_path, records, fmt=None):
+    """
+    Escribe los registros de un rango (dicts o registros con to_dict) en base_path + extensión del formato
+    y devuelve la ruta. Se escribe primero en un archivo '.part' para que un rango a medias nunca parezca terminado.
+    """
+    fmt = fmt or get_output_format()
+    file_path = f"{base_path}{INTERMEDIATE_FORMATS['extensions'][fmt]}"
+    part_path = f"{file_path}.part"
+
+    if fmt == "json":
+        with open(part_path, "w", encoding="utf-8") as f:
+            json.dump([_as_dict(record) for record in records], f, ensure_ascii=False, indent=4)
+    elif fmt == "ndjson":
+        with gzip.open(part_path, "wt", encoding="utf-8", compresslevel=1) as f:
+            for record in records:
+                f.write(json.dumps(_as_dict(record), ensure_ascii=False))
+                f.write("\n")
+    else:
+        pyarrow = _import_pyarrow()
+        columns = {col: [str(record.get(col) or "") for record in records] for col in RAW_COLUMNS if col != "holder"}
+        columns["holder"] = [_holder_as_list(record.get("holder")) for record in records]
+        schema = pyarrow.schema([(col, pyarrow.list_(pyarrow.string()) if col == "holder" else pyarrow.string()) for col in RAW_COLUMNS])
+        table = pyarrow.table({col: columns[col] for col in RAW_COLUMNS}, schema=schema)
+        pyarrow.parquet.write_table(table, part_path, compression="zstd")
+
+    os.replace(part_path, file_path)
+    return file_path
+
+def iter_records(file_path):
+    """Genera los registros de un archivo de rango; NDJSON se lee en streaming."""
+    fmt = detect_format(file_path)
+    if fmt == "ndjson":
+        with gzip.open(file_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == "parquet":
+        pyarrow = _import_pyarrow()
+        parquet_file = pyarrow.parquet.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches():
+            for record in batch.to_pylist():
+                record["holder"] = _holder_from_list(record.get("holder"))
+                yield record
+    else:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        yield from (data if isinstance(data, list) else [data])
+
+def read_records(file_path):
+    """Lee todos los registros de un archivo de rango (JSON legado, NDJSON comprimido o Parquet)."""
+    if detect_format(file_path) == "ndjson":
+        # Un único json.loads sobre el archivo completo es bastante más rápido que uno por línea.
+        with gzip.open(file_path, "rt", encoding="utf-8") as f:
+            lines = [line for line in f.read().split("\n") if line.strip()]
+        return json.loads(f"[{','.join(lines)}]")
+    return list(iter_records(file_path))
+
+def read_column(file_path, column):
+    """Lee una sola columna; en Parquet solo se decodifica esa columna."""
+    if detect_format(file_path) == "parquet":
+        pyarrow = _import_pyarrow()
+        return pyarrow.parquet.read_table(file_path, columns=[column]).column(column).to_pylist()
+    return [entry.get(column) for entry in read_records(file_path) if entry]
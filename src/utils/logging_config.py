@@ -1,10 +1,86 @@
 import logging
+import logging.handlers
+import os
 import sys
+import threading
+from src.utils.process_context import get_worker_context
 
-def setup_logging():
+LOG_FILE = 'etl_process_en.log'
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(levelname)s - %(message)s'
+
+# Mensajes de alto volumen (uno por página o por request_number) se marcan con extra=SAMPLED_PAGE_LOG
+# o SAMPLED_REQUEST_LOG; con LOG_SAMPLE_EVERY=N solo se emite 1 de cada N por clave y proceso.
+SAMPLED_PAGE_LOG = {"sample_key": "page"}
+SAMPLED_REQUEST_LOG = {"sample_key": "request"}
+
+_log_queue = None
+_listener = None
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada 'every' registros marcados con el mismo sample_key; el resto pasa siempre."""
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(every, 1)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None or self.every == 1 or record.levelno > logging.INFO:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.every == 0
+
+def _build_output_handlers():
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024)),
+        backupCount=int(os.getenv("LOG_BACKUP_COUNT", 5)),
+        encoding='utf-8'
+    )
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(formatter)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setLevel(logging.INFO)
+    stream_handler.setFormatter(formatter)
+    return [file_handler, stream_handler]
+
+def start_log_listener():
+    """
+    Arranca en el proceso principal el único listener que formatea y escribe los logs (archivo con
+    rotación por tamaño + stdout). Devuelve la cola que deben usar los workers en setup_logging.
+    """
+    global _log_queue, _listener
+    if _listener is None:
+        _log_queue = get_worker_context().Queue(-1)
+        _listener = logging.handlers.QueueListener(_log_queue, *_build_output_handlers(), respect_handler_level=True)
+        _listener.start()
+        # Si el logger ya tenía handlers directos, se reemplazan por el QueueHandler.
+        logging.getLogger("etl_app").handlers.clear()
+    return _log_queue
+
+def stop_log_listener():
+    """Vacía la cola y detiene el listener; los logs posteriores vuelven a escribirse directamente."""
+    global _log_queue, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener, _log_queue = None, None
+        logging.getLogger("etl_app").handlers.clear()
+
+def get_log_queue():
+    return _log_queue
+
+def setup_logging(log_queue=None):
     """
     Configures the logging system to log to both a file and the console.
     Ensures that handlers are not duplicated if called multiple times.
+    With a log queue (from start_log_listener, or passed to a worker process) records are only
+    enqueued and the listener in the parent does the formatting and writing.
     """
     logger = logging.getLogger("etl_app")
     logger.setLevel(logging.INFO)
@@ -12,16 +88,15 @@ def setup_logging():
     if logger.hasHandlers():
         return logger
 
-    formatter = logging.Formatter('%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    log_queue = log_queue or _log_queue
+    if log_queue is not None:
+        handlers = [logging.handlers.QueueHandler(log_queue)]
+    else:
+        handlers = _build_output_handlers()
 
-    file_handler = logging.FileHandler('etl_process_en.log', encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-
-    stream_handler = logging.StreamHandler(sys.stdout)
-    stream_handler.setLevel(logging.INFO)
-    stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+    sampling_filter = SamplingFilter(int(os.getenv("LOG_SAMPLE_EVERY", 1)))
+    for handler in handlers:
+        handler.addFilter(sampling_filter)
+        logger.addHandler(handler)
 
-    return logger
\ No newline at end of file
+    return logger
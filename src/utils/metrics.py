@@ -0,0 +1,175 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_PREFIX = "colombia_sync_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels_key, extra=()):
+    pairs = list(labels_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas de latencia del proceso actual. Cada proceso (principal y workers)
+    tiene su propio registro; al terminar, los workers lo vuelcan a disco y el principal los fusiona.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def reset(self):
+        """Vacía el registro; los workers lo llaman al arrancar para no heredar valores del padre."""
+        with self._lock:
+            self.counters, self.histograms = {}, {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0, "max": 0.0}
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorador que registra la duración de cada llamada en el histograma 'name'."""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer(name, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.counters.items()],
+                "histograms": [{"name": name, "labels": dict(labels), **histogram} for (name, labels), histogram in self.histograms.items()]
+            }
+
+    def merge_dict(self, data):
+        """Suma en este registro los valores volcados por otro proceso."""
+        with self._lock:
+            for counter in data.get("counters", []):
+                key = (counter["name"], _labels_key(counter["labels"]))
+                self.counters[key] = self.counters.get(key, 0) + counter["value"]
+            for entry in data.get("histograms", []):
+                key = (entry["name"], _labels_key(entry["labels"]))
+                histogram = self.histograms.setdefault(key, {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0, "max": 0.0})
+                histogram["buckets"] = [a + b for a, b in zip(histogram["buckets"], entry["buckets"])]
+                histogram["count"] += entry["count"]
+                histogram["sum"] += entry["sum"]
+                histogram["max"] = max(histogram["max"], entry["max"])
+
+    def dump(self, file_path):
+        """Vuelca el registro de este proceso a un JSON para que lo fusione el proceso principal."""
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+
+    def timing_summary(self):
+        """Histogramas ordenados por tiempo total, para saber dónde se fue el tiempo de la ejecución."""
+        rows = [
+            {
+                "name": name, "labels": dict(labels), "count": h["count"], "total_seconds": round(h["sum"], 3),
+                "mean_seconds": round(h["sum"] / h["count"], 4) if h["count"] else 0.0, "max_seconds": round(h["max"], 3)
+            }
+            for (name, labels), h in self.histograms.items()
+        ]
+        return sorted(rows, key=lambda row: row["total_seconds"], reverse=True)
+
+    def write_summary_json(self, file_path, **extra):
+        summary = {**extra, "timing_summary": self.timing_summary(), **self.to_dict()}
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, file_path):
+        """Escribe las métricas en formato textfile de Prometheus (node_exporter textfile collector)."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                        cumulative += count
+                        lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                    lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {histogram['sum']}")
+                    lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(labels)} {histogram['count']}")
+        # Se escribe a un temporal y se renombra para que el collector nunca lea un archivo a medias.
+        part_path = f"{file_path}.part"
+        with open(part_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(part_path, file_path)
+
+metrics = MetricsRegistry()
+
+def collect_run_metrics(dumps_folder, output_folder, logger, **extra):
+    """
+    Fusiona en el registro del proceso principal los volcados de los workers (dumps_folder) y escribe
+    el resumen JSON y el textfile de Prometheus de la ejecución en output_folder.
+    """
+    if os.path.isdir(dumps_folder):
+        for filename in sorted(os.listdir(dumps_folder)):
+            if filename.endswith(".json"):
+                with open(os.path.join(dumps_folder, filename), "r", encoding="utf-8") as f:
+                    metrics.merge_dict(json.load(f))
+
+    os.makedirs(output_folder, exist_ok=True)
+    summary_path = os.path.join(output_folder, f"run_metrics_{time.strftime('%Y-%m-%d_%H%M%S')}.json")
+    prometheus_path = os.path.join(output_folder, "colombia_sync.prom")
+    metrics.write_summary_json(summary_path, **extra)
+    metrics.write_prometheus(prometheus_path)
+
+    logger.info("Resumen de tiempos por etapa (top 10 por tiempo total):")
+    for row in metrics.timing_summary()[:10]:
+        labels = ", ".join(f"{key}={value}" for key, value in row["labels"].items())
+        logger.info(f"  {row['name']}{f' [{labels}]' if labels else ''}: {row['total_seconds']}s en {row['count']} llamadas (media {row['mean_seconds']}s, máx {row['max_seconds']}s)")
+    logger.info(f"Métricas de la ejecución escritas en '{summary_path}' y '{prometheus_path}'.")
+    return summary_path
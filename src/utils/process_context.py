@@ -0,0 +1,26 @@
+import multiprocessing
+import os
+
+WORKER_START_METHODS = ("fork", "spawn", "forkserver")
+
+# Con forkserver estos módulos se importan una sola vez en el servidor y cada worker se bifurca
+# desde él ya cargado, sin heredar el resto del proceso principal (pandas, boto3, psycopg2...).
+FORKSERVER_PRELOAD = [
+    "playwright.async_api",
+    "src.functions.scraping_functions",
+    "src.functions.sync_orchestrator",
+]
+
+def get_worker_context():
+    """
+    Contexto de multiprocessing para los workers (scraping y pool del ETL), según WORKER_START_METHOD.
+    Sin definir se usa el método por defecto de la plataforma. Las colas que se pasan a los workers
+    deben crearse con este mismo contexto.
+    """
+    method = os.getenv("WORKER_START_METHOD", "").strip().lower() or None
+    if method and method not in WORKER_START_METHODS:
+        raise ValueError(f"Unknown WORKER_START_METHOD '{method}'. Valid methods: {', '.join(WORKER_START_METHODS)}.")
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return context
@@ -0,0 +1,229 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from src.utils.constants import PATHS
+
+PROFILE_MODES = ("deterministic", "sampling")
+PROFILE_MODE_ENV = "SYNC_PROFILE"
+PROFILE_DIR_ENV = "SYNC_PROFILE_DIR"
+DEFAULT_SAMPLING_INTERVAL_MS = 5
+
+# Sesiones activas en este proceso; al anidar, la exterior se pausa mientras corre la interior
+# (así el bucle de corrección tiene su propio perfil sin duplicar tiempo en el del proceso principal).
+_active_sessions = []
+
+def _is_event_loop_wait(filename, funcname):
+    """El bucle de asyncio espera en selectors.*.select: ahí está el tiempo de await sobre Playwright."""
+    return funcname == "select" and filename.endswith("selectors.py")
+
+def _frame_key(code):
+    return f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+
+def get_profile_mode():
+    mode = os.getenv(PROFILE_MODE_ENV, "").strip().lower()
+    return mode if mode in PROFILE_MODES else None
+
+def start_profiling_run(mode):
+    """
+    Activa el perfilado para esta ejecución y los procesos que lance, vía variables de entorno
+    (se heredan tanto con fork como con spawn). Devuelve la carpeta de perfiles de la ejecución.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfilado no soportado: '{mode}'. Opciones: {', '.join(PROFILE_MODES)}")
+    run_dir = os.path.join(os.getenv("PROFILE_DIR", PATHS["profiles_path"]), time.strftime("%Y-%m-%d_%H%M%S"))
+    os.makedirs(run_dir, exist_ok=True)
+    os.environ[PROFILE_MODE_ENV] = mode
+    os.environ[PROFILE_DIR_ENV] = run_dir
+    return run_dir
+
+class _DeterministicSession:
+    def __init__(self, name, output_base):
+        self.name = name
+        self.output_base = output_base
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def pause(self):
+        self.profiler.disable()
+
+    def resume(self):
+        self.profiler.enable()
+
+    def stop(self, wall_seconds):
+        self.profiler.disable()
+        self.profiler.dump_stats(f"{self.output_base}.prof")
+        stats = pstats.Stats(self.profiler)
+        wait_seconds = sum(
+            cumulative for (filename, _, funcname), (_, _, _, cumulative, _) in stats.stats.items()
+            if _is_event_loop_wait(filename, funcname)
+        )
+        return {"async_wait_seconds": round(wait_seconds, 3)}
+
+class _SamplingSession:
+    """Muestrea la pila del hilo que abrió la sesión desde un hilo en segundo plano."""
+    def __init__(self, name, output_base):
+        self.name = name
+        self.output_base = output_base
+        self.interval = int(os.getenv("PROFILE_INTERVAL_MS", DEFAULT_SAMPLING_INTERVAL_MS)) / 1000
+        self.thread_id = threading.get_ident()
+        self.self_samples = Counter()
+        self.cumulative_samples = Counter()
+        self.total_samples = 0
+        self.wait_samples = 0
+        self._paused = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sampler-{name}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._paused.is_set():
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.total_samples += 1
+            top = frame.f_code
+            if _is_event_loop_wait(top.co_filename, top.co_name):
+                self.wait_samples += 1
+            self.self_samples[_frame_key(top)] += 1
+            seen = set()
+            while frame is not None:
+                key = _frame_key(frame.f_code)
+                if key not in seen:
+                    seen.add(key)
+                    self.cumulative_samples[key] += 1
+                frame = frame.f_back
+
+    def start(self):
+        self._thread.start()
+
+    def pause(self):
+        self._paused.set()
+
+    def resume(self):
+        self._paused.clear()
+
+    def stop(self, wall_seconds):
+        self._stop.set()
+        self._thread.join()
+        async_wait_seconds = wall_seconds * self.wait_samples / self.total_samples if self.total_samples else 0.0
+        data = {
+            "interval_seconds": self.interval,
+            "total_samples": self.total_samples,
+            "wait_samples": self.wait_samples,
+            "self_samples": dict(self.self_samples),
+            "cumulative_samples": dict(self.cumulative_samples),
+        }
+        with open(f"{self.output_base}.samples.json", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        return {"async_wait_seconds": round(async_wait_seconds, 3)}
+
+@contextmanager
+def profile_process(name, logger=None):
+    """
+    Perfila el bloque si la ejecución se lanzó con --profile; si no, no hace nada.
+    Escribe <name>_<pid>.prof (determinista) o <name>_<pid>.samples.json (muestreo) y un
+    <name>_<pid>.meta.json con el tiempo de pared, la CPU del proceso y el tiempo esperando en el
+    bucle de asyncio (await sobre Playwright/red), para separarlo de la CPU de nuestro código.
+    """
+    mode = get_profile_mode()
+    run_dir = os.getenv(PROFILE_DIR_ENV)
+    if not mode or not run_dir:
+        yield
+        return
+
+    os.makedirs(run_dir, exist_ok=True)
+    output_base = os.path.join(run_dir, f"{name}_{os.getpid()}")
+    session_class = _DeterministicSession if mode == "deterministic" else _SamplingSession
+    session = session_class(name, output_base)
+    outer = _active_sessions[-1] if _active_sessions else None
+    if outer:
+        outer.pause()
+    _active_sessions.append(session)
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    session.start()
+    try:
+        yield
+    finally:
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+        meta = {"name": name, "pid": os.getpid(), "mode": mode, "wall_seconds": round(wall_seconds, 3), "cpu_seconds": round(cpu_seconds, 3)}
+        try:
+            meta.update(session.stop(wall_seconds))
+            with open(f"{output_base}.meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2)
+            if logger:
+                logger.info(f"Perfil '{name}' escrito en '{output_base}' (pared {meta['wall_seconds']}s, CPU {meta['cpu_seconds']}s, espera async {meta['async_wait_seconds']}s).")
+        except Exception as e:
+            if logger:
+                logger.error(f"No se pudo escribir el perfil '{name}': {e}")
+        finally:
+            _active_sessions.remove(session)
+            if outer:
+                outer.resume()
+
+def _merge_sampling_top(files, top_n):
+    self_samples, cumulative_samples = Counter(), Counter()
+    total = 0
+    for file_path in files:
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self_samples.update(data["self_samples"])
+        cumulative_samples.update(data["cumulative_samples"])
+        total += data["total_samples"]
+    lines = [f"{total} muestras en total."]
+    for title, counter in (("propias (función en la cima de la pila)", self_samples), ("acumuladas (función en cualquier punto de la pila)", cumulative_samples)):
+        lines.append(f"\nTop {top_n} por muestras {title}:")
+        for key, count in counter.most_common(top_n):
+            lines.append(f"{count:>10} {count / total * 100 if total else 0:6.2f}%  {key}")
+    return "\n".join(lines)
+
+def _merge_deterministic_top(files, top_n):
+    stream = io.StringIO()
+    stats = pstats.Stats(*files, stream=stream)
+    stats.strip_dirs()
+    for sort_key in ("tottime", "cumulative"):
+        stream.write(f"\nTop {top_n} por {sort_key}:\n")
+        stats.sort_stats(sort_key).print_stats(top_n)
+    return stream.getvalue()
+
+def write_profile_summary(run_dir=None, top_n=30):
+    """
+    Combina los perfiles de todos los procesos de la ejecución en profile_summary.txt:
+    una tabla pared/CPU/espera async por perfil y el top-N de funciones combinado.
+    """
+    run_dir = run_dir or os.getenv(PROFILE_DIR_ENV)
+    if not run_dir or not os.path.isdir(run_dir):
+        return None
+    filenames = sorted(os.listdir(run_dir))
+    metas = []
+    for filename in filenames:
+        if filename.endswith(".meta.json"):
+            with open(os.path.join(run_dir, filename), "r", encoding="utf-8") as f:
+                metas.append(json.load(f))
+
+    lines = [f"{'Perfil':<28}{'PID':>8}{'Pared (s)':>12}{'CPU (s)':>12}{'Espera async (s)':>18}"]
+    for meta in metas:
+        lines.append(f"{meta['name']:<28}{meta['pid']:>8}{meta['wall_seconds']:>12}{meta['cpu_seconds']:>12}{meta['async_wait_seconds']:>18}")
+
+    prof_files = [os.path.join(run_dir, name) for name in filenames if name.endswith(".prof")]
+    sample_files = [os.path.join(run_dir, name) for name in filenames if name.endswith(".samples.json")]
+    if prof_files:
+        lines.append(_merge_deterministic_top(prof_files, top_n))
+    if sample_files:
+        lines.append(_merge_sampling_top(sample_files, top_n))
+
+    summary_path = os.path.join(run_dir, "profile_summary.txt")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return summary_path
@@ -0,0 +1,103 @@
+import numpy as np
+
+# Formato habitual de SIPI: oficina (2 letras) + año (4 dígitos) + '/' + consecutivo (7 dígitos), p. ej. 'SD2019/0012345'.
+# Se empaqueta en decimal como ((oficina * 10^4) + año) * 10^7 + consecutivo, de modo que el orden de los códigos
+# coincide con el orden de los strings. Cualquier otro formato recibe un código negativo de una tabla de respaldo.
+YEAR_FACTOR = 10 ** 4
+SEQUENCE_FACTOR = 10 ** 7
+UNKNOWN_CODE = np.iinfo(np.int64).min
+
+def sorted_unique(codes):
+    """Códigos ordenados y sin repetidos (sort + máscara; np.unique es bastante más lento con int64 grandes)."""
+    codes = np.sort(codes)
+    if len(codes) < 2:
+        return codes
+    return codes[np.concatenate(([True], codes[1:] != codes[:-1]))]
+
+def isin_sorted(sorted_codes, codes):
+    """Máscara de 'codes' presentes en 'sorted_codes' (ordenado y sin repetidos), por búsqueda binaria."""
+    if not len(sorted_codes):
+        return np.zeros(len(codes), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_codes, codes), len(sorted_codes) - 1)
+    return sorted_codes[positions] == codes
+
+class RequestNumberCodec:
+    """
+    Codificación reversible de 'request_number' en int64 para guardar conjuntos como arrays de NumPy
+    (8 bytes por clave) y compararlos con searchsorted/setdiff1d en lugar de sets de strings.
+    Los códigos de la tabla de respaldo dependen del orden de llegada: solo son comparables entre
+    arrays codificados con la misma instancia.
+    """
+    def __init__(self):
+        self._fallback_codes = {}
+        self._fallback_values = []
+
+    @property
+    def fallback_size(self):
+        return len(self._fallback_values)
+
+    @staticmethod
+    def _pack(value):
+        if len(value) != 14 or value[6] != "/":
+            return None
+        office, year, sequence = value[:2], value[2:6], value[7:]
+        if not (office.isascii() and office.isupper() and office.isalpha() and year.isdigit() and sequence.isdigit() and year.isascii() and sequence.isascii()):
+            return None
+        office_index = (ord(office[0]) - 65) * 26 + ord(office[1]) - 65
+        return (office_index * YEAR_FACTOR + int(year)) * SEQUENCE_FACTOR + int(sequence)
+
+    def encode(self, value, extend=True):
+        """
+        Código int64 de 'value'. Un formato irregular se añade a la tabla de respaldo; con extend=False
+        uno que no esté ya en la tabla devuelve UNKNOWN_CODE (útil para solo consultar pertenencia).
+        """
+        value = str(value)
+        code = self._pack(value)
+        if code is not None:
+            return code
+        code = self._fallback_codes.get(value)
+        if code is None:
+            if not extend:
+                return UNKNOWN_CODE
+            self._fallback_values.append(value)
+            code = self._fallback_codes[value] = -len(self._fallback_values)
+        return code
+
+    def encode_many(self, values, extend=True, chunk_size=65536):
+        """
+        Versión vectorizada de encode: el formato habitual se valida y empaqueta sobre la matriz de code points
+        (por bloques de 'chunk_size' para acotar la memoria temporal); solo los irregulares pasan por encode.
+        """
+        values = values if isinstance(values, (list, np.ndarray)) else list(values)
+        codes = np.empty(len(values), dtype=np.int64)
+        for start in range(0, len(values), chunk_size):
+            block = values[start:start + chunk_size]
+            # Con 15 posiciones, la última solo es distinta de 0 si el valor tiene más de 14 caracteres.
+            points = np.array(block, dtype="U15").view(np.uint32).reshape(len(block), 15)
+            letters = (points[:, :2] - 65).astype(np.int64)
+            digits = (points - 48).astype(np.int64)
+            regular = (
+                (points[:, 14] == 0) & (points[:, 6] == 47)
+                & (letters.astype(np.uint64) <= 25).all(axis=1)
+                & (digits[:, 2:6].astype(np.uint64) <= 9).all(axis=1)
+                & (digits[:, 7:14].astype(np.uint64) <= 9).all(axis=1)
+            )
+            office_index = letters[:, 0] * 26 + letters[:, 1]
+            year = digits[:, 2:6] @ (10 ** np.arange(3, -1, -1, dtype=np.int64))
+            sequence = digits[:, 7:14] @ (10 ** np.arange(6, -1, -1, dtype=np.int64))
+            block_codes = (office_index * YEAR_FACTOR + year) * SEQUENCE_FACTOR + sequence
+            for i in np.flatnonzero(~regular).tolist():
+                block_codes[i] = self.encode(block[i], extend)
+            codes[start:start + len(block)] = block_codes
+        return codes
+
+    def decode(self, code):
+        code = int(code)
+        if code < 0:
+            return self._fallback_values[-code - 1]
+        office_year, sequence = divmod(code, SEQUENCE_FACTOR)
+        office_index, year = divmod(office_year, YEAR_FACTOR)
+        return f"{chr(65 + office_index // 26)}{chr(65 + office_index % 26)}{year:04d}/{sequence:07d}"
+
+    def decode_many(self, codes):
+        return [self.decode(code) for code in codes.tolist()]
@@ -0,0 +1,152 @@
+import atexit
+import logging
+import multiprocessing.util
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+logger = logging.getLogger("etl_app")
+
+class RollbarReporter:
+    """
+    Envía a Rollbar desde un hilo en segundo plano para no bloquear el bucle de asyncio con
+    llamadas HTTP. En el hilo que reporta solo se calcula la huella y se encola:
+    - las excepciones repetidas (mismo tipo y línea de origen) o mensajes idénticos dentro de
+      'dedupe_window' segundos se cuentan en vez de enviarse;
+    - como máximo 'rate_limit' envíos por 'rate_window' segundos; el resto se descarta y se cuenta;
+    - al salir del proceso se vacía la cola y se envía un resumen de lo suprimido.
+    Como en la versión original (con rollbar.init comentado), no se envía nada salvo que rollbar ya esté
+    inicializado en el proceso o que se active explícitamente con ROLLBAR_ENABLED=true y ROLLBAR_TOKEN;
+    ROLLBAR_ENDPOINT permite apuntar a un endpoint local.
+    Los límites se leen de ROLLBAR_DEDUPE_WINDOW, ROLLBAR_RATE_LIMIT y ROLLBAR_RATE_WINDOW.
+    """
+    batch_size = 20
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._enabled = False
+
+    def _ensure_started(self):
+        # Los hilos no sobreviven a un fork: cada proceso arranca su propio hilo de envío.
+        if self._pid == os.getpid():
+            return self._enabled
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._enabled
+            self.dedupe_window = int(os.getenv("ROLLBAR_DEDUPE_WINDOW", 300))
+            self.rate_limit = int(os.getenv("ROLLBAR_RATE_LIMIT", 20))
+            self.rate_window = int(os.getenv("ROLLBAR_RATE_WINDOW", 60))
+            self._queue = queue.Queue()
+            self._seen = {}
+            self._suppressed = Counter()
+            self._sent_times = deque()
+            self._dropped = 0
+            self._closed = False
+            self._enabled = self._init_rollbar()
+            if self._enabled:
+                self._thread = threading.Thread(target=self._run, name="rollbar-reporter", daemon=True)
+                self._thread.start()
+                # atexit cubre el proceso principal; Finalize los workers de multiprocessing, que no ejecutan atexit.
+                atexit.register(self.close)
+                multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+            self._pid = os.getpid()
+        return self._enabled
+
+    def _init_rollbar(self):
+        # rollbar (y requests) se importan solo si hay algo que reportar.
+        rollbar = sys.modules.get("rollbar")
+        if rollbar and rollbar.SETTINGS.get("access_token"):
+            self._rollbar = rollbar
+            return True
+        access_token = os.getenv("ROLLBAR_TOKEN")
+        if os.getenv("ROLLBAR_ENABLED", "false").lower() not in ("1", "true", "yes") or not access_token:
+            return False
+        import rollbar
+        self._rollbar = rollbar
+        settings = {"handler": "blocking"}
+        if os.getenv("ROLLBAR_ENDPOINT"):
+            settings["endpoint"] = os.getenv("ROLLBAR_ENDPOINT")
+        rollbar.init(access_token=access_token, environment=os.getenv("ENV_STAGE", "production"), **settings)
+        return True
+
+    def _admit(self, fingerprint):
+        """Decide si se envía el evento; si no, lo cuenta como repetido o descartado."""
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.get(fingerprint)
+            if seen and now - seen["first_seen"] < self.dedupe_window:
+                seen["repeats"] += 1
+                self._suppressed[fingerprint] += 1
+                return None
+            while self._sent_times and now - self._sent_times[0] >= self.rate_window:
+                self._sent_times.popleft()
+            if len(self._sent_times) >= self.rate_limit:
+                self._dropped += 1
+                return None
+            self._sent_times.append(now)
+            self._seen[fingerprint] = {"first_seen": now, "repeats": 0}
+            # Al reabrir la ventana, el primer envío indica cuántas repeticiones se suprimieron antes.
+            return {"suppressed_repeats": seen["repeats"]} if seen and seen["repeats"] else {}
+
+    def report_exc_info(self, exc_info=None, extra_data=None):
+        if not self._ensure_started() or self._closed:
+            return
+        exc_info = exc_info or sys.exc_info()
+        if exc_info[0] is None:
+            return
+        frames = traceback.extract_tb(exc_info[2])
+        origin = f"{frames[-1].filename}:{frames[-1].lineno}" if frames else ""
+        fingerprint = ("exc", f"{exc_info[0].__module__}.{exc_info[0].__qualname__}", origin)
+        admitted = self._admit(fingerprint)
+        if admitted is not None:
+            self._queue.put(("exc", exc_info, {**(extra_data or {}), **admitted}))
+
+    def report_message(self, message, level="error", extra_data=None):
+        if not self._ensure_started() or self._closed:
+            return
+        admitted = self._admit(("message", level, message))
+        if admitted is not None:
+            self._queue.put(("message", (message, level), {**(extra_data or {}), **admitted}))
+
+    def _send(self, kind, payload, extra_data):
+        try:
+            if kind == "exc":
+                self._rollbar.report_exc_info(payload, extra_data=extra_data or None)
+            else:
+                message, level = payload
+                self._rollbar.report_message(message, level, extra_data=extra_data or None)
+        except Exception as e:
+            logger.warning(f"No se pudo enviar el evento a Rollbar: {e}")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    return
+                self._send(*item)
+
+    def close(self, timeout=10):
+        """Vacía la cola, detiene el hilo y envía un resumen de los eventos suprimidos."""
+        if self._pid != os.getpid() or not self._enabled or self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        with self._lock:
+            suppressed, dropped = self._suppressed.copy(), self._dropped
+        if suppressed or dropped:
+            self._send("message", (f"Rollbar: {sum(suppressed.values())} eventos repetidos y {dropped} descartados por límite de envío (PID {os.getpid()})", "warning"),
+                       {"top_repeated": [{"fingerprint": " | ".join(key), "repeats": count} for key, count in suppressed.most_common(10)]})
+
+reporter = RollbarReporter()
@@ -0,0 +1,210 @@
+import hashlib
+import heapq
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from src.utils.etl_ledger import file_checksum
+from src.utils.intermediate_format import find_range_file
+
+RANGES_FOLDER = "ranges"
+MARKERS_FOLDER = "shards"
+
+# Modelo de coste en "páginas de resultados": cada búsqueda cuesta lo mismo que unas SEARCH_COST_PAGES páginas
+# (navegación, diálogo de estados, pausa) más las páginas de 200 resultados que devuelve. El plan parte cada
+# tramo para quedar por debajo del límite de SIPI, así que un rango completo se estima en EXPECTED_FILL del
+# límite y uno recortado (el último de cada tramo) en proporción a los días que cubre.
+RECORD_LIMIT = 2000
+RECORDS_PER_PAGE = 200
+SEARCH_COST_PAGES = 3
+EXPECTED_FILL = 0.5
+
+def parse_shard(value):
+    """'i/N' -> (i, N), con 1 <= i <= N."""
+    shard, separator, shards = str(value).partition("/")
+    if not separator or not shard.strip().isdigit() or not shards.strip().isdigit():
+        raise ValueError(f"Invalid shard '{value}': expected 'i/N', e.g. '1/4'.")
+    shard, shards = int(shard), int(shards)
+    if not 1 <= shard <= shards:
+        raise ValueError(f"Invalid shard '{value}': i must be between 1 and N.")
+    return shard, shards
+
+def estimate_task_cost(task):
+    """Coste esperado de una tarea de build_scraping_plan, en páginas de resultados."""
+    coverage = 1.0 if task["kind"] == "niza" else min(task["span_days"] / task["nominal_days"], 1.0)
+    return SEARCH_COST_PAGES + math.ceil(RECORD_LIMIT * EXPECTED_FILL * coverage / RECORDS_PER_PAGE)
+
+def assign_shards(tasks, shards, cost=estimate_task_cost):
+    """
+    Reparte las tareas en 'shards' grupos de coste parecido (LPT: de la más cara a la más barata, cada una al
+    grupo con menos carga; los empates se resuelven por posición). Es determinista: el mismo plan da el mismo
+    reparto en todos los nodos. Cada grupo conserva el orden del plan.
+    """
+    costs = [cost(task) for task in tasks]
+    loads = [(0, shard) for shard in range(shards)]
+    assigned = [[] for _ in range(shards)]
+    for index in sorted(range(len(tasks)), key=lambda i: (-costs[i], i)):
+        load, shard = heapq.heappop(loads)
+        assigned[shard].append(index)
+        heapq.heappush(loads, (load + costs[index], shard))
+    return [[tasks[index] for index in sorted(indexes)] for indexes in assigned]
+
+def plan_fingerprint(tasks, shards):
+    """Huella del plan y del número de shards; el merge solo acepta marcas con la huella de su propio plan."""
+    payload = json.dumps({"shards": shards, "tasks": [task["id"] for task in tasks]}).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+def marker_name(shard, shards):
+    return f"shard_{shard}_of_{shards}.json"
+
+class SharedLocation:
+    """
+    Carpeta común a todos los shards: un directorio local (o montado) o una URL s3://bucket/prefijo.
+    Guarda los archivos de rangos en ranges/ y la marca de finalización de cada shard en shards/.
+    """
+    def __init__(self, destination, logger):
+        self.destination = destination
+        self.logger = logger
+        self.is_s3 = destination.startswith("s3://")
+        if self.is_s3:
+            from src.gateways.s3_gateway import S3Manager
+            self.bucket, _, prefix = destination[len("s3://"):].partition("/")
+            self.prefix = prefix.strip("/")
+            self.s3 = S3Manager(bucket_name=self.bucket, logger=logger)
+
+    def _key(self, folder, name=None):
+        parts = [part for part in (self.prefix, folder, name) if part]
+        return "/".join(parts)
+
+    def put_file(self, file_path, folder):
+        if self.is_s3:
+            if not self.s3.upload_file(file_path, self._key(folder)):
+                raise RuntimeError(f"Could not upload '{file_path}' to '{self.destination}'.")
+            return
+        target_folder = os.path.join(self.destination, folder)
+        os.makedirs(target_folder, exist_ok=True)
+        # Copia a un temporal y renombra: los demás nodos nunca ven un archivo a medio escribir.
+        target_path = os.path.join(target_folder, os.path.basename(file_path))
+        shutil.copyfile(file_path, f"{target_path}.part")
+        os.replace(f"{target_path}.part", target_path)
+
+    def get_file(self, folder, name, local_path):
+        if self.is_s3:
+            if not self.s3.download_file(self._key(folder, name), local_path):
+                raise RuntimeError(f"Could not download '{name}' from '{self.destination}'.")
+            return
+        shutil.copyfile(os.path.join(self.destination, folder, name), local_path)
+
+    def list_names(self, folder):
+        if self.is_s3:
+            prefix = self._key(folder) + "/"
+            return sorted(key[len(prefix):] for key in self.s3.list_keys(prefix))
+        folder_path = os.path.join(self.destination, folder)
+        if not os.path.isdir(folder_path):
+            return []
+        return sorted(name for name in os.listdir(folder_path) if not name.endswith(".part"))
+
+    def put_json(self, folder, name, data):
+        local_folder = tempfile.mkdtemp()
+        try:
+            local_path = os.path.join(local_folder, name)
+            with open(local_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.put_file(local_path, folder)
+        finally:
+            shutil.rmtree(local_folder, ignore_errors=True)
+
+    def get_json(self, folder, name):
+        """Contenido de folder/name, o None si no existe."""
+        if name not in self.list_names(folder):
+            return None
+        local_folder = tempfile.mkdtemp()
+        try:
+            local_path = os.path.join(local_folder, name)
+            self.get_file(folder, name, local_path)
+            with open(local_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        finally:
+            shutil.rmtree(local_folder, ignore_errors=True)
+
+def complete_shard(location, shard, shards, tasks, fingerprint, source_folder, case_status, logger):
+    """
+    Sube a la carpeta común los archivos de rangos de las tareas del shard y, solo después, su marca de
+    finalización (con el checksum de cada archivo y las tareas sin archivo). Devuelve la marca.
+    """
+    files, missing = [], []
+    for task in tasks:
+        file_path = find_range_file(os.path.join(source_folder, task["id"]))
+        if not file_path:
+            # Sin resultados, por encima del límite de 2000 o fallida tras los reintentos, como en una ejecución normal.
+            missing.append(task["id"])
+            continue
+        location.put_file(file_path, RANGES_FOLDER)
+        files.append({"name": os.path.basename(file_path), "size_bytes": os.path.getsize(file_path), "sha256": file_checksum(file_path)})
+
+    marker = {
+        "shard": shard, "shards": shards, "plan_fingerprint": fingerprint, "case_status": case_status,
+        "completed_at": datetime.now().isoformat(timespec="seconds"),
+        "tasks": len(tasks), "files": files, "missing_tasks": missing
+    }
+    location.put_json(MARKERS_FOLDER, marker_name(shard, shards), marker)
+    logger.info(f"Shard {shard}/{shards}: {len(files)} range files uploaded to '{location.destination}' ({len(missing)} tasks without file).")
+    return marker
+
+def wait_for_shards(location, shards, fingerprint, logger, timeout_seconds=0, poll_seconds=30):
+    """
+    Espera (hasta timeout_seconds; 0 = una sola comprobación) a que estén las N marcas con la huella del plan
+    'fingerprint' y las devuelve ordenadas. Una marca de otro plan (de una ejecución anterior en el mismo
+    SHARD_DEST) cuenta como pendiente: el shard puede estar sobrescribiéndola.
+    """
+    expected = {marker_name(shard, shards): shard for shard in range(1, shards + 1)}
+    markers = {}
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        present = set(location.list_names(MARKERS_FOLDER))
+        stale = {}
+        for name in expected:
+            if name in markers or name not in present:
+                continue
+            marker = location.get_json(MARKERS_FOLDER, name)
+            if marker and marker["plan_fingerprint"] == fingerprint:
+                markers[name] = marker
+            elif marker:
+                stale[expected[name]] = marker["plan_fingerprint"]
+        pending = [shard for name, shard in expected.items() if name not in markers]
+        if not pending:
+            break
+        if time.monotonic() >= deadline:
+            details = ", ".join(f"{shard}/{shards}" + (f" (plan {stale[shard]})" if shard in stale else "") for shard in pending)
+            hint = " Use the same SHARD_PLAN_DATE and case status on every node and a new SHARD_DEST for each backfill." if stale else ""
+            raise RuntimeError(f"Shards not completed with plan {fingerprint} in '{location.destination}': {details}.{hint}")
+        logger.info(
+            f"Esperando a {len(pending)} de {shards} shards con el plan {fingerprint} ({', '.join(map(str, pending))})"
+            + (f"; {len(stale)} con marca de otro plan" if stale else "") + "..."
+        )
+        time.sleep(min(poll_seconds, max(deadline - time.monotonic(), 0)))
+    return [markers[name] for name in expected]
+
+def collect_shards(location, shards, fingerprint, target_folder, logger, timeout_seconds=0, poll_seconds=30):
+    """
+    Espera a que los N shards terminen con el plan 'fingerprint' y descarga sus archivos de rangos en
+    target_folder, verificando cada checksum. Devuelve las marcas.
+    """
+    markers = wait_for_shards(location, shards, fingerprint, logger, timeout_seconds, poll_seconds)
+
+    os.makedirs(target_folder, exist_ok=True)
+    downloaded = 0
+    for marker in markers:
+        for entry in marker["files"]:
+            target_path = os.path.join(target_folder, entry["name"])
+            location.get_file(RANGES_FOLDER, entry["name"], target_path)
+            if file_checksum(target_path) != entry["sha256"]:
+                raise RuntimeError(f"Checksum mismatch for '{entry['name']}' from shard {marker['shard']}/{shards}.")
+            downloaded += 1
+
+    missing = sum(len(marker["missing_tasks"]) for marker in markers)
+    logger.info(f"Merge de {shards} shards (plan {fingerprint}): {downloaded} archivos de rangos descargados en '{target_folder}', {missing} tareas sin archivo.")
+    return markers
@@ -0,0 +1,125 @@
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+from datetime import datetime
+from src.utils.intermediate_format import list_range_files
+
+MANIFEST_NAME = "manifest.json"
+RANGE_START_YEAR = re.compile(r"^\d{2}_\d{2}_(\d{4})_")
+
+def _partition_for(filename):
+    """Partición dentro del snapshot: 'niza' o 'year=AAAA' según el inicio del rango."""
+    if filename.startswith("niza_"):
+        return "niza"
+    match = RANGE_START_YEAR.match(filename)
+    return f"year={match.group(1)}" if match else "other"
+
+def _sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _split_s3_url(url):
+    bucket, _, key = url[len("s3://"):].partition("/")
+    return bucket, key.strip("/")
+
+def create_snapshot(source_folder, destination, case_status, logger):
+    """
+    Archiva todos los archivos de rangos de source_folder en un único .tar.gz particionado
+    (niza/ y year=AAAA/) con un manifest.json. destination es un directorio local o una URL s3://bucket/prefijo.
+    Devuelve la ruta local o la URL del snapshot.
+    """
+    range_files = list_range_files(source_folder)
+    if not range_files:
+        logger.warning(f"No range files found in '{source_folder}'. No snapshot will be created.")
+        return None
+
+    snapshot_name = f"snapshot_{case_status.lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.tar.gz"
+    is_s3 = destination.startswith("s3://")
+    local_folder = tempfile.mkdtemp() if is_s3 else destination
+    os.makedirs(local_folder, exist_ok=True)
+    snapshot_path = os.path.join(local_folder, snapshot_name)
+
+    manifest = {"created_at": datetime.now().isoformat(timespec="seconds"), "case_status": case_status, "files": []}
+    with tarfile.open(snapshot_path, "w:gz") as tar:
+        for file_path in range_files:
+            filename = os.path.basename(file_path)
+            partition = _partition_for(filename)
+            tar.add(file_path, arcname=f"{partition}/{filename}")
+            manifest["files"].append({
+                "name": filename, "partition": partition,
+                "size_bytes": os.path.getsize(file_path), "sha256": _sha256(file_path)
+            })
+        manifest_bytes = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        manifest_info = tarfile.TarInfo(MANIFEST_NAME)
+        manifest_info.size = len(manifest_bytes)
+        tar.addfile(manifest_info, io.BytesIO(manifest_bytes))
+
+    logger.info(f"Snapshot with {len(range_files)} range files written to '{snapshot_path}'.")
+    if not is_s3:
+        return snapshot_path
+
+    from src.gateways.s3_gateway import S3Manager
+    bucket, prefix = _split_s3_url(destination)
+    try:
+        if not S3Manager(bucket_name=bucket, logger=logger).upload_file(snapshot_path, prefix):
+            return None
+    finally:
+        shutil.rmtree(local_folder, ignore_errors=True)
+    return f"s3://{bucket}/{prefix}/{snapshot_name}" if prefix else f"s3://{bucket}/{snapshot_name}"
+
+def restore_snapshot(snapshot, target_folder, logger):
+    """
+    Extrae los archivos de rangos de un snapshot (ruta local o URL s3://) en target_folder, sin particiones.
+    Verifica el checksum de cada archivo contra el manifest. Devuelve el manifest.
+    target_folder debe estar vacío (o no existir): no se mezclan los rangos del snapshot con los de otra
+    ejecución. Si la extracción falla, se borran los archivos ya extraídos.
+    """
+    if os.path.isdir(target_folder) and os.listdir(target_folder):
+        raise RuntimeError(
+            f"Cannot restore snapshot into '{target_folder}': the folder is not empty (it may hold an unfinished run "
+            f"kept for resuming). Finish that run or remove the folder first."
+        )
+    download_folder = None
+    if snapshot.startswith("s3://"):
+        from src.gateways.s3_gateway import S3Manager
+        bucket, key = _split_s3_url(snapshot)
+        download_folder = tempfile.mkdtemp()
+        local_path = os.path.join(download_folder, os.path.basename(key))
+        if not S3Manager(bucket_name=bucket, logger=logger).download_file(key, local_path):
+            raise RuntimeError(f"Could not download snapshot '{snapshot}'.")
+        snapshot = local_path
+
+    extracted = []
+    try:
+        os.makedirs(target_folder, exist_ok=True)
+        with tarfile.open(snapshot, "r:gz") as tar:
+            manifest = json.load(tar.extractfile(MANIFEST_NAME))
+            expected = {entry["name"]: entry["sha256"] for entry in manifest["files"]}
+            for member in tar.getmembers():
+                filename = os.path.basename(member.name)
+                if not member.isfile() or filename not in expected:
+                    continue
+                target_path = os.path.join(target_folder, filename)
+                extracted.append(target_path)
+                with tar.extractfile(member) as source, open(target_path, "wb") as target:
+                    shutil.copyfileobj(source, target)
+                if _sha256(target_path) != expected[filename]:
+                    raise RuntimeError(f"Checksum mismatch for '{filename}' in snapshot '{snapshot}'.")
+        logger.info(f"Restored {len(expected)} range files from snapshot '{snapshot}' into '{target_folder}'.")
+        return manifest
+    except Exception:
+        for target_path in extracted:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+        raise
+    finally:
+        if download_folder:
+            shutil.rmtree(download_folder, ignore_errors=True)
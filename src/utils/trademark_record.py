@@ -0,0 +1,77 @@
+import sys
+from src.utils.intermediate_format import RAW_COLUMNS
+
+NORMALIZED_COLUMNS = ("request_number", "registry_number", "denomination", "logo_url", "logo", "filing_date", "expiration_date", "status", "holder", "niza_class", "gazette_number", "updated_at", "badger_country")
+
+# Columnas con pocos valores distintos: en los registros se internan (una sola copia de cada texto) y en
+# los DataFrames de los lotes se guardan como 'category' (un código por fila en lugar de un puntero a un str).
+LOW_CARDINALITY_COLUMNS = ("status", "niza_class", "gazette_number", "updated_at", "badger_country", "source_file")
+
+def intern_value(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class Record:
+    """
+    Registro con __slots__ (sin __dict__ por instancia). Los campos de FIELDS que faltan quedan en ""
+    y los de INTERNED_FIELDS se internan. get() y to_dict() permiten usarlo donde se esperaba un dict.
+    """
+    __slots__ = ()
+    FIELDS = ()
+    INTERNED_FIELDS = ()
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            value = values.get(field, "")
+            setattr(self, field, intern_value(value) if field in self.INTERNED_FIELDS else value)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def values(self):
+        return [getattr(self, field) for field in self.FIELDS]
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{field}={getattr(self, field)!r}' for field in self.FIELDS)})"
+
+class ScrapedRecord(Record):
+    """Fila tal como sale de la tabla de resultados de SIPI (las columnas de los archivos de rangos)."""
+    FIELDS = tuple(RAW_COLUMNS)
+    INTERNED_FIELDS = frozenset(("status", "niza_class", "gazette_number"))
+    __slots__ = FIELDS
+
+class TrademarkRecord(Record):
+    """Registro normalizado, con las columnas que se escriben en la BD."""
+    FIELDS = NORMALIZED_COLUMNS
+    INTERNED_FIELDS = frozenset(LOW_CARDINALITY_COLUMNS)
+    __slots__ = FIELDS
+
+def records_to_columns(records, fields=NORMALIZED_COLUMNS):
+    """{columna: lista de valores} a partir de una lista de registros, para construir un DataFrame sin dicts intermedios."""
+    return {field: [getattr(record, field) for record in records] for field in fields}
+
+def encode_categoricals(df, columns=LOW_CARDINALITY_COLUMNS):
+    """
+    Convierte a 'category' (en el sitio) las columnas de poca cardinalidad de df. Solo las que no tienen
+    nulos, para que un None siga llegando como NULL a la BD y como '' a la comparación.
+    """
+    for col in columns:
+        if col in df.columns and df[col].dtype != "category" and df[col].notna().all():
+            df[col] = df[col].astype("category")
+    return df
+
+def decode_categoricals(df):
+    """Devuelve las columnas 'category' de df (en el sitio) a objetos str, antes de pasarlas a psycopg2."""
+    for col in df.columns:
+        if df[col].dtype == "category":
+            df[col] = df[col].astype(object)
+    return df